@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+from src.eventsManifest import filterCompleteEventsFiles, isEventsFileComplete
+from src.fetchQueue import EncounterTarget, FetchPriority, FetchQueue
+from src.processEvents import (
+    FightEventsFile,
+    PhaseAbilityTransition,
+    aggregatePhaseTimeStatistics,
+    compilePhaseTriggers,
+    createEventsCache,
+    finalizeEncounterDataFrame,
+    getFightEventsFiles,
+    loadEncounterFights,
+    loadFightEventsFiles,
+)
+from src.utility import getAccessToken
+
+
+def computeCastConfidenceIntervals(
+    dataFrame: pd.DataFrame, abilityIDs: List[int], confidence: float = 0.95, minCount: int = 5
+) -> pd.DataFrame:
+    """Computes confidence intervals of the mean phaseTime for each `abilityID`, `phase`, `type`, `castIndex` group of
+    the abilities of interest.
+
+    Args:
+        dataFrame (pd.DataFrame): DataFrame returned by `createEncounterDataFrame`.
+        abilityIDs (List[int]): Abilities of interest, or all abilities if empty.
+        confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+        minCount (int, optional): Groups with fewer casts than this are left out. Defaults to 5.
+
+    Returns:
+        pd.DataFrame: Groups with `count`, `mean`, `lower`, `upper`, and `width` columns.
+    """
+    columns = ["abilityID", "phase", "type", "castIndex", "count", "mean", "lower", "upper", "width"]
+    if dataFrame.empty:
+        return pd.DataFrame(columns=columns)
+
+    if abilityIDs:
+        dataFrame = dataFrame[dataFrame["abilityID"].isin(abilityIDs)]
+
+    intervals = aggregatePhaseTimeStatistics(dataFrame, max(minCount, 2), confidence)
+    intervals["width"] = intervals["upper"] - intervals["lower"]
+    return intervals[columns]
+
+
+def fetchAndSaveEventsUntilConverged(
+    target: EncounterTarget,
+    abilityIDs: List[int],
+    maxIntervalWidth: float = 2.0,
+    confidence: float = 0.95,
+    minCount: int = 5,
+    batchSize: int = 10,
+    maxFights: int = 0,
+    priority: FetchPriority = FetchPriority(underSampledEncountersFirst=False),
+    phaseAbilities: List[PhaseAbilityTransition] = [],
+    ignorePhaseTransitions: bool = False,
+    minPercentage: float = 100.0,
+) -> pd.DataFrame:
+    """Alternates fetching batches of fights with analyzing them, and stops fetching once the confidence interval of
+    every cast of the abilities of interest is narrow enough. Fights are fetched in priority order, and only newly
+    fetched fights are parsed after each batch. The phase arguments match `createEncounterDataFrame` so the intervals
+    describe the same phases the encounter will be analyzed with.
+
+    Args:
+        target (EncounterTarget): Encounter to fetch events for.
+        abilityIDs (List[int]): Abilities whose cast times should converge, or all abilities if empty.
+        maxIntervalWidth (float, optional): Largest acceptable confidence interval width in seconds. Defaults to 2.0.
+        confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+        minCount (int, optional): Casts seen fewer times than this are not required to converge, but every ability of
+            interest needs at least one cast seen this many times. Defaults to 5.
+        batchSize (int, optional): Number of fights to fetch between analyses. Defaults to 10.
+        maxFights (int, optional): Upper limit on the number of fights to fetch, 0 for no limit. Defaults to 0.
+        priority (FetchPriority, optional): Order to fetch fights in. Defaults to
+            FetchPriority(underSampledEncountersFirst=False).
+        phaseAbilities (List[PhaseAbilityTransition], optional): See `createEncounterDataFrame`.
+        ignorePhaseTransitions (bool, optional): See `createEncounterDataFrame`.
+        minPercentage (float, optional): See `createEncounterDataFrame`.
+
+    Returns:
+        pd.DataFrame: Confidence intervals from the last analysis, see `computeCastConfidenceIntervals`.
+    """
+    fights = loadEncounterFights(target.zoneID, target.encounterID, target.difficulty, target.dungeonEncounterID)
+    eventsFiles: Dict[str, FightEventsFile] = {
+        str(eventsFile.path): eventsFile
+        for eventsFile in getFightEventsFiles(
+            target.zoneID,
+            target.encounterID,
+            target.difficulty,
+            fights,
+            target.dungeonEncounterID,
+            phaseAbilities,
+            ignorePhaseTransitions,
+            minPercentage,
+        )
+    }
+
+    phaseTriggers = compilePhaseTriggers(phaseAbilities)
+    cache = createEventsCache(target.zoneID, target.encounterID, target.difficulty, target.dungeonEncounterID)
+
+    def loadEvents(paths: List[str]) -> pd.DataFrame:
+        batchEvents = loadFightEventsFiles([eventsFiles[path] for path in paths], phaseTriggers, cache=cache)
+        return finalizeEncounterDataFrame(batchEvents)
+
+    completePaths = filterCompleteEventsFiles([eventsFile.path for eventsFile in eventsFiles.values()])
+    frames = [loadEvents([str(path) for path in completePaths])]
+    frames = [frame for frame in frames if not frame.empty]
+    queue = FetchQueue([target], priority)
+    token = getAccessToken()
+    fetched = 0
+
+    while True:
+        encounter = pd.concat(frames) if frames else pd.DataFrame()
+        intervals = computeCastConfidenceIntervals(encounter, abilityIDs, confidence, minCount)
+        widest = intervals["width"].max() if not intervals.empty else np.inf
+        # Abilities without any cast seen `minCount` times have no intervals yet, and haven't converged
+        missingAbilityIDs = sorted(set(abilityIDs) - set(intervals["abilityID"].tolist()))
+        print(f"{fetched} fights fetched, {len(intervals)} casts, widest interval {widest:.2f}s")
+        if missingAbilityIDs:
+            missing = ", ".join(str(abilityID) for abilityID in missingAbilityIDs)
+            print(f"Abilities without a cast seen {minCount} times yet: {missing}")
+        if not intervals.empty and not missingAbilityIDs and widest <= maxIntervalWidth:
+            print(f"Converged after fetching {fetched} fights")
+            break
+
+        batchPaths: List[str] = []
+        while len(batchPaths) < batchSize and (maxFights <= 0 or fetched < maxFights):
+            task = queue.pop()
+            if task is None:
+                break
+            path = str(task.getEventsFilePath())
+            if path not in eventsFiles:
+                continue  # Excluded from the analysis, don't spend points on it
+            if task.fetch(token):
+                fetched += 1
+                if isEventsFileComplete(eventsFiles[path].path):
+                    batchPaths.append(path)
+
+        if not batchPaths:
+            print(f"Stopping without converging after fetching {fetched} fights")
+            break
+        batchFrame = loadEvents(batchPaths)
+        if not batchFrame.empty:
+            frames.append(batchFrame)
+
+    return intervals
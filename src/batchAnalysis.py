@@ -0,0 +1,270 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+from tabulate import tabulate
+
+from src.enums import DifficultyType
+from src.eventsDecoder import EventFilter
+from src.masterData import getAbilityNames
+from src.phasePlots import plotPhaseTimeStatistics
+from src.phaseReport import buildPhaseTimeReport, formatAverageCastTimes, savePhaseTimeReport
+from src.processEvents import PhaseAbilityTransition, aggregatePhaseTimeStatistics, createEncounterDataFrame
+from src.profiling import profiled
+from src.utility import getAnalysisPath, writeFileAtomic, writeJsonAtomic
+
+
+@dataclass
+class EncounterAnalysis:
+    """Declarative configuration of an encounter to analyze, the arguments of `createEncounterDataFrame`.
+
+    Attributes:
+        name (str): Name shown in the run summary.
+        zoneID (int): WarcraftLogs API zone ID for the raid or dungeon.
+        encounterID (int): Encounter ID for the boss.
+        difficulty (DifficultyType): Difficulty fights were filtered by.
+        dungeonEncounterID (int): The WarcraftLogs dungeon encounter ID if the boss is in a dungeon, otherwise 0.
+        dropAbilities (List[int]): Ability IDs to drop from the data frame.
+        phaseAbilities (List[PhaseAbilityTransition]): Phase triggers, see `createEncounterDataFrame`.
+        ignorePhaseTransitions (bool): Whether to ignore phase transitions from WarcraftLogs API fights.
+        minPercentage (float): Skip fights where the boss had more health remaining than this percentage.
+        eventFilter (EventFilter | None): Events to keep, see `createEncounterDataFrame`.
+    """
+
+    name: str
+    zoneID: int
+    encounterID: int
+    difficulty: DifficultyType
+    dungeonEncounterID: int = 0
+    dropAbilities: List[int] = field(default_factory=list)
+    phaseAbilities: List[PhaseAbilityTransition] = field(default_factory=list)
+    ignorePhaseTransitions: bool = False
+    minPercentage: float = 100.0
+    eventFilter: EventFilter | None = None
+
+    def getFileName(self) -> str:
+        if self.difficulty == DifficultyType.Dungeon:
+            return f"{self.zoneID}_{self.dungeonEncounterID}_{self.encounterID}_{self.difficulty}"
+        return f"{self.zoneID}_{self.encounterID}_{self.difficulty}"
+
+    def createDataFrame(self, workers: int = 1) -> pd.DataFrame:
+        return createEncounterDataFrame(
+            self.zoneID,
+            self.encounterID,
+            self.difficulty,
+            self.dungeonEncounterID,
+            self.dropAbilities,
+            self.phaseAbilities,
+            self.ignorePhaseTransitions,
+            self.minPercentage,
+            workers,
+            eventFilter=self.eventFilter,
+        )
+
+    @classmethod
+    def fromJson(cls, data: Dict[str, Any]) -> "EncounterAnalysis":
+        difficulty = data["difficulty"]
+        return cls(
+            name=data.get("name") or "",
+            zoneID=data["zoneID"],
+            encounterID=data["encounterID"],
+            difficulty=DifficultyType[difficulty] if isinstance(difficulty, str) else DifficultyType(difficulty),
+            dungeonEncounterID=data.get("dungeonEncounterID", 0),
+            dropAbilities=data.get("dropAbilities", []),
+            phaseAbilities=[
+                PhaseAbilityTransition(
+                    phaseAbility["abilityID"],
+                    phaseAbility["abilityType"],
+                    phaseAbility["castIndex"],
+                    phaseAbility.get("offset", 0),
+                    [tuple(alternative) for alternative in phaseAbility.get("alternatives", [])],
+                )
+                for phaseAbility in data.get("phaseAbilities", [])
+            ],
+            ignorePhaseTransitions=data.get("ignorePhaseTransitions", False),
+            minPercentage=data.get("minPercentage", 100.0),
+            eventFilter=EventFilter(**data["eventFilter"]) if data.get("eventFilter") else None,
+        )
+
+
+def loadEncounterAnalyses(path: Path) -> List[EncounterAnalysis]:
+    """Loads encounter configurations from a JSON list of `EncounterAnalysis` attributes. Difficulties are given by
+    name, e.g. "Mythic", phase abilities by their attributes, e.g.
+    {"abilityID": 1227734, "abilityType": "cast", "castIndex": 0}, and event filters by theirs, e.g.
+    {"eventTypes": ["cast"], "maxTime": 300}.
+
+    Args:
+        path (Path): Configuration file path.
+
+    Returns:
+        List[EncounterAnalysis]: Encounters in file order.
+    """
+    with open(path) as configurationFile:
+        return [EncounterAnalysis.fromJson(data) for data in json.load(configurationFile)]
+
+
+@dataclass
+class EncounterAnalysisResult:
+    """Outcome and timing of one encounter of a batch run.
+
+    Attributes:
+        name (str): Name of the encounter's `EncounterAnalysis`.
+        fileName (str): Base name of the encounter's output files.
+        events (int): Number of events in the encounter's DataFrame.
+        groups (int): Number of (abilityID, phase, type, castIndex) groups in the statistics.
+        loadSeconds (float): Time spent creating the DataFrame.
+        aggregateSeconds (float): Time spent aggregating and writing the statistics.
+        error (str): Error message if the encounter could not be analyzed, otherwise empty.
+    """
+
+    name: str
+    fileName: str
+    events: int = 0
+    groups: int = 0
+    loadSeconds: float = 0.0
+    aggregateSeconds: float = 0.0
+    error: str = ""
+
+
+@profiled()
+def analyzeEncounter(
+    analysis: EncounterAnalysis,
+    outputPath: Path,
+    formats: List[str],
+    minCount: int,
+    confidence: float | None,
+    plots: bool = False,
+) -> EncounterAnalysisResult:
+    """Creates an encounter's DataFrame and writes its statistics report in each format, along with its average cast
+    times table and optionally its charts. Runs in worker processes when analyzing encounters in parallel. Any error
+    is recorded in the result instead of raised, so one broken encounter doesn't abort the batch."""
+    result = EncounterAnalysisResult(analysis.name, analysis.getFileName())
+    try:
+        writeEncounterAnalysis(analysis, result, outputPath, formats, minCount, confidence, plots)
+    except (FileNotFoundError, LookupError) as e:
+        result.error = str(e)
+    except Exception as e:
+        # e.g. a truncated fights file or an unwritable output path
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def writeEncounterAnalysis(
+    analysis: EncounterAnalysis,
+    result: EncounterAnalysisResult,
+    outputPath: Path,
+    formats: List[str],
+    minCount: int,
+    confidence: float | None,
+    plots: bool,
+):
+    """Analyzes an encounter for `analyzeEncounter`, filling in the result as each step completes."""
+    startTime = time.perf_counter()
+    dataFrame = analysis.createDataFrame()
+    loadedTime = time.perf_counter()
+    result.loadSeconds = loadedTime - startTime
+    result.events = len(dataFrame)
+    if dataFrame.empty:
+        return
+
+    phaseTimeStatistics = aggregatePhaseTimeStatistics(dataFrame, minCount, confidence)
+    abilityNames = getAbilityNames(dataFrame["fightCode"].unique())
+    report = buildPhaseTimeReport(phaseTimeStatistics, abilityNames)
+    for reportFormat in formats:
+        savePhaseTimeReport(report, outputPath / f"{result.fileName}.{reportFormat}")
+    writeFileAtomic(outputPath / f"{result.fileName}.txt", formatAverageCastTimes(report).encode())
+    if plots:
+        # Encounters are already analyzed in parallel, so each one renders its charts in its own process
+        plotPhaseTimeStatistics(
+            phaseTimeStatistics,
+            outputPath / result.fileName,
+            abilityNames,
+            workers=1,
+            title=analysis.name or result.fileName,
+        )
+    result.groups = len(report)
+    result.aggregateSeconds = time.perf_counter() - loadedTime
+
+
+@profiled()
+def runBatchAnalysis(
+    analyses: List[EncounterAnalysis],
+    outputPath: Path | None = None,
+    formats: List[str] | None = None,
+    minCount: int = 0,
+    confidence: float | None = None,
+    workers: int = 0,
+    plots: bool = False,
+) -> List[EncounterAnalysisResult]:
+    """Analyzes several encounters concurrently, one encounter per worker process, and writes every encounter's
+    statistics in one run. Each encounter reuses its events cache, so only events files fetched since the last run are
+    parsed. Encounters whose fights file is missing or empty are reported and skipped. A `summary.json` with the timing
+    of each encounter is written next to the results.
+
+    Args:
+        analyses (List[EncounterAnalysis]): Encounters to analyze.
+        outputPath (Path | None, optional): Directory to write results to. Defaults to `temp/analysis`.
+        formats (List[str] | None, optional): Report formats to write, any of "json", "csv", and "parquet". Defaults to
+            ["json"].
+        minCount (int, optional): Throw out aggregated statistics where the count is less than this value. Defaults to
+            0.
+        confidence (float | None, optional): If specified, adds confidence intervals at this level. Defaults to None.
+        workers (int, optional): Number of worker processes, 0 for one per CPU, 1 to analyze in this process. Defaults
+            to 0.
+        plots (bool, optional): Whether to also render each encounter's charts into a directory named after its
+            results, see `plotPhaseTimeStatistics`. Defaults to False.
+
+    Returns:
+        List[EncounterAnalysisResult]: Results in the order of the analyses.
+    """
+    outputPath = outputPath or getAnalysisPath()
+    formats = formats or ["json"]
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    startTime = time.perf_counter()
+    arguments = (outputPath, formats, minCount, confidence, plots)
+
+    results: List[EncounterAnalysisResult | None] = [None] * len(analyses)
+    if workers > 1 and len(analyses) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(analyses))) as executor:
+                futures = {
+                    executor.submit(analyzeEncounter, analysis, *arguments): index
+                    for index, analysis in enumerate(analyses)
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    print(f"Analyzed {results[futures[future]].name}")
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Parallel analysis failed, analyzing serially: {e}")
+    for index, analysis in enumerate(analyses):
+        if results[index] is None:
+            results[index] = analyzeEncounter(analysis, *arguments)
+            print(f"Analyzed {analysis.name}")
+
+    totalSeconds = time.perf_counter() - startTime
+    writeJsonAtomic(
+        outputPath / "summary.json",
+        {
+            "totalSeconds": totalSeconds,
+            "encounters": [{**asdict(analysis), **asdict(result)} for analysis, result in zip(analyses, results)],
+        },
+    )
+    print(
+        tabulate(
+            [
+                [result.name, result.events, result.groups, result.loadSeconds, result.aggregateSeconds, result.error]
+                for result in results
+            ],
+            headers=["Encounter", "Events", "Groups", "Load (s)", "Aggregate (s)", "Error"],
+            floatfmt=".2f",
+        )
+    )
+    print(f"Analyzed {len(analyses)} encounters in {totalSeconds:.1f} seconds, results in {outputPath}")
+    return results
@@ -0,0 +1,303 @@
+import contextlib
+import gc
+import hashlib
+import io
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List
+
+import pandas as pd
+from tabulate import tabulate
+
+from src.phaseReport import buildPhaseTimeReport
+from src.phaseStatistics import aggregateEncounterStatisticsInBatches
+from src.processEvents import (
+    EventColumns,
+    PhaseAbilityTransition,
+    aggregatePhaseTimeStatistics,
+    appendFightEvent,
+    createEncounterDataFrame,
+    finalizeEncounterDataFrame,
+    getFightEventsFiles,
+    loadEncounterFights,
+)
+from src.syntheticData import FIRST_BOSS_ABILITY_ID, SyntheticEncounter, generateSyntheticEncounter
+from src.utility import getBenchmarksPath, getProjectRoot, setProjectRoot, writeJsonAtomic
+
+BENCHMARK_SCALES: Dict[str, SyntheticEncounter] = {
+    "small": SyntheticEncounter(fights=10, eventsPerFight=2000),
+    "medium": SyntheticEncounter(fights=40, eventsPerFight=10000),
+    "large": SyntheticEncounter(fights=120, eventsPerFight=30000),
+}
+BASELINE_FILE_NAME = "baseline.json"
+LATEST_FILE_NAME = "latest.json"
+ENCOUNTER_FILE_NAME = "encounter.json"
+# A stage regressed when it is this much slower than its baseline, and by more than timer noise
+DEFAULT_REGRESSION_TOLERANCE = 0.25
+MIN_REGRESSION_SECONDS = 0.01
+
+
+@dataclass
+class BenchmarkStage:
+    """A processing stage to time. Each run gets the encounter and its DataFrame, created once per scale, and returns
+    the stage's output, whose digest is compared with the baseline's and with the other stages of its output group.
+
+    Attributes:
+        name (str): Name in results and the baseline.
+        run (Callable[[SyntheticEncounter, pd.DataFrame], pd.DataFrame]): Runs the stage.
+        outputGroup (str): Stages with the same output group compute the same output in different ways, and must
+            return identical outputs. Empty if the stage has no equivalent.
+    """
+
+    name: str
+    run: Callable[[SyntheticEncounter, pd.DataFrame], pd.DataFrame]
+    outputGroup: str = ""
+
+
+@dataclass
+class BenchmarkResult:
+    """Timing and output of a stage at one scale.
+
+    Attributes:
+        scale (str): Key of `BENCHMARK_SCALES`.
+        stage (str): Name of the stage.
+        rows (int): Number of rows of the stage's output.
+        seconds (float): Fastest run.
+        medianSeconds (float): Median run.
+        digest (str): SHA-256 of the stage's output.
+        baselineSeconds (float | None): Fastest run of the baseline, None if the stage has no baseline.
+        regression (bool): Whether the stage is slower than its baseline by more than the tolerance.
+        outputChanged (bool): Whether the output differs from the baseline's.
+        outputMismatch (bool): Whether the output differs from the first stage of its output group in the same run.
+    """
+
+    scale: str
+    stage: str
+    rows: int
+    seconds: float
+    medianSeconds: float
+    digest: str
+    baselineSeconds: float | None = None
+    regression: bool = False
+    outputChanged: bool = False
+    outputMismatch: bool = False
+
+
+def getDataFrameDigest(dataFrame: pd.DataFrame) -> str:
+    """Hashes a DataFrame's columns, dtypes, and values in row order, so equal digests mean identical outputs."""
+    columns = [[str(column), str(dtype)] for column, dtype in dataFrame.dtypes.items()]
+    digest = hashlib.sha256(json.dumps(columns).encode())
+    digest.update(pd.util.hash_pandas_object(dataFrame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def runAppendFightEvent(encounter: SyntheticEncounter, dataFrame: pd.DataFrame) -> pd.DataFrame:
+    fights = loadEncounterFights(encounter.zoneID, encounter.encounterID, encounter.difficulty)
+    eventsFiles = getFightEventsFiles(encounter.zoneID, encounter.encounterID, encounter.difficulty, fights)
+    allFightEvents = EventColumns()
+    for eventsFile in eventsFiles:
+        appendFightEvent(
+            eventsFile.path,
+            allFightEvents,
+            eventsFile.phaseTransitions,
+            eventsFile.fightCode,
+            eventsFile.fightID,
+            eventsFile.pullID,
+        )
+    return finalizeEncounterDataFrame(allFightEvents)
+
+
+def runCreateEncounterDataFrame(encounter: SyntheticEncounter, dataFrame: pd.DataFrame) -> pd.DataFrame:
+    return createEncounterDataFrame(encounter.zoneID, encounter.encounterID, encounter.difficulty, useCache=False)
+
+
+def runCreateEncounterDataFrameCached(encounter: SyntheticEncounter, dataFrame: pd.DataFrame) -> pd.DataFrame:
+    return createEncounterDataFrame(encounter.zoneID, encounter.encounterID, encounter.difficulty)
+
+
+def runCreateEncounterDataFrameWithPhaseAbilities(
+    encounter: SyntheticEncounter, dataFrame: pd.DataFrame
+) -> pd.DataFrame:
+    # The second boss ability is cast in the second phase, so its first cast starts a phase
+    phaseAbilities = [PhaseAbilityTransition(FIRST_BOSS_ABILITY_ID + 1, "cast", 0)]
+    return createEncounterDataFrame(
+        encounter.zoneID, encounter.encounterID, encounter.difficulty, phaseAbilities=phaseAbilities
+    )
+
+
+def runAggregatePhaseTimeStatistics(encounter: SyntheticEncounter, dataFrame: pd.DataFrame) -> pd.DataFrame:
+    return aggregatePhaseTimeStatistics(dataFrame, 3, 0.95)
+
+
+def runAggregateEncounterStatisticsInBatches(encounter: SyntheticEncounter, dataFrame: pd.DataFrame) -> pd.DataFrame:
+    return aggregateEncounterStatisticsInBatches(
+        encounter.zoneID, encounter.encounterID, encounter.difficulty, minCount=3, confidence=0.95, batchFights=8
+    )
+
+
+def runBuildPhaseTimeReport(encounter: SyntheticEncounter, dataFrame: pd.DataFrame) -> pd.DataFrame:
+    return buildPhaseTimeReport(aggregatePhaseTimeStatistics(dataFrame, 3))
+
+
+BENCHMARK_STAGES = [
+    BenchmarkStage("appendFightEvent", runAppendFightEvent, "encounterDataFrame"),
+    BenchmarkStage("createEncounterDataFrame", runCreateEncounterDataFrame, "encounterDataFrame"),
+    BenchmarkStage("createEncounterDataFrame (cached)", runCreateEncounterDataFrameCached, "encounterDataFrame"),
+    BenchmarkStage("createEncounterDataFrame (phase abilities)", runCreateEncounterDataFrameWithPhaseAbilities),
+    BenchmarkStage("aggregatePhaseTimeStatistics", runAggregatePhaseTimeStatistics, "phaseTimeStatistics"),
+    BenchmarkStage(
+        "aggregateEncounterStatisticsInBatches", runAggregateEncounterStatisticsInBatches, "phaseTimeStatistics"
+    ),
+    BenchmarkStage("buildPhaseTimeReport", runBuildPhaseTimeReport),
+]
+
+
+def prepareBenchmarkData(encounter: SyntheticEncounter):
+    """Generates the encounter below the project root, unless it was already generated with the same attributes."""
+    encounterFilePath = getProjectRoot() / ENCOUNTER_FILE_NAME
+    attributes = json.dumps(asdict(encounter), sort_keys=True)
+    if encounterFilePath.exists() and encounterFilePath.read_text() == attributes:
+        return
+    generateSyntheticEncounter(encounter)
+    encounterFilePath.write_text(attributes)
+
+
+def runBenchmarkStage(
+    scale: str, stage: BenchmarkStage, encounter: SyntheticEncounter, dataFrame: pd.DataFrame, repeats: int
+) -> BenchmarkResult:
+    """Runs a stage once to warm up and take its output, then times it `repeats` times."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        output = stage.run(encounter, dataFrame)
+        times = []
+        for _ in range(repeats):
+            gc.collect()
+            startTime = time.perf_counter()
+            stage.run(encounter, dataFrame)
+            times.append(time.perf_counter() - startTime)
+    return BenchmarkResult(
+        scale, stage.name, len(output), min(times), statistics.median(times), getDataFrameDigest(output)
+    )
+
+
+def runBenchmarks(
+    scales: List[str] = ["small", "medium"],
+    repeats: int = 3,
+    updateBaseline: bool = False,
+    tolerance: float = DEFAULT_REGRESSION_TOLERANCE,
+    stages: List[BenchmarkStage] = BENCHMARK_STAGES,
+) -> List[BenchmarkResult]:
+    """Times each processing stage on generated encounters of several scales and compares the timings and outputs with
+    a saved baseline. Encounters are generated once into `temp/benchmarks/data/{scale}`, which is used as the project
+    root while benchmarking, so fetched data is never read or modified. Results are saved to `latest.json`, and the
+    baseline to `baseline.json`, both in `temp/benchmarks`.
+
+    Outputs are checked in every run, including the first: stages of the same output group must return identical
+    outputs, and every stage must return the output of the baseline unless the baseline is being updated. Slower
+    stages are only reported.
+
+    Args:
+        scales (List[str], optional): Keys of `BENCHMARK_SCALES`. Defaults to ["small", "medium"].
+        repeats (int, optional): Number of timed runs of each stage, the fastest is compared. Defaults to 3.
+        updateBaseline (bool, optional): Whether to save these results as the baseline, e.g. after an intended change
+            of outputs. The first run always saves a baseline. Defaults to False.
+        tolerance (float, optional): Fraction a stage may be slower than its baseline before it is reported as a
+            regression. Defaults to 0.25.
+        stages (List[BenchmarkStage], optional): Stages to run. Defaults to `BENCHMARK_STAGES`.
+
+    Returns:
+        List[BenchmarkResult]: Results by scale and stage.
+
+    Raises:
+        RuntimeError: If any output differs from its output group or, unless updating the baseline, from the
+            baseline. Results are still saved to `latest.json`, but not as the baseline.
+    """
+    benchmarksPath = getBenchmarksPath()
+    baselineFilePath = benchmarksPath / BASELINE_FILE_NAME
+    baseline: Dict[str, Dict[str, Dict]] = {}
+    if baselineFilePath.exists():
+        with open(baselineFilePath) as baselineFile:
+            baseline = json.load(baselineFile)
+
+    results: List[BenchmarkResult] = []
+    for scale in scales:
+        encounter = BENCHMARK_SCALES[scale]
+        previousRoot = setProjectRoot(benchmarksPath / "data" / scale)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                prepareBenchmarkData(encounter)
+                dataFrame = createEncounterDataFrame(encounter.zoneID, encounter.encounterID, encounter.difficulty)
+            groupDigests: Dict[str, str] = {}
+            for stage in stages:
+                result = runBenchmarkStage(scale, stage, encounter, dataFrame, repeats)
+                if stage.outputGroup:
+                    groupDigest = groupDigests.setdefault(stage.outputGroup, result.digest)
+                    result.outputMismatch = result.digest != groupDigest
+                stageBaseline = baseline.get(scale, {}).get(stage.name)
+                if stageBaseline is not None:
+                    result.baselineSeconds = stageBaseline["seconds"]
+                    result.regression = (
+                        result.seconds > result.baselineSeconds * (1.0 + tolerance)
+                        and result.seconds - result.baselineSeconds > MIN_REGRESSION_SECONDS
+                    )
+                    result.outputChanged = result.digest != stageBaseline["digest"]
+                results.append(result)
+                print(f"Benchmarked {stage.name} on {scale} data in {result.seconds:.3f} seconds")
+        finally:
+            setProjectRoot(previousRoot)
+
+    writeJsonAtomic(benchmarksPath / LATEST_FILE_NAME, [asdict(result) for result in results])
+    failures = [
+        result for result in results if result.outputMismatch or (result.outputChanged and not updateBaseline)
+    ]
+    if (updateBaseline or not baseline) and not failures:
+        for result in results:
+            baseline.setdefault(result.scale, {})[result.stage] = {
+                "seconds": result.seconds,
+                "digest": result.digest,
+                "rows": result.rows,
+            }
+        writeJsonAtomic(baselineFilePath, baseline)
+        print(f"Saved the baseline to {baselineFilePath}")
+
+    def formatOutput(result: BenchmarkResult) -> str:
+        if result.outputMismatch:
+            return "MISMATCH"
+        return "CHANGED" if result.outputChanged else "same"
+
+    def formatChange(result: BenchmarkResult) -> str:
+        if result.baselineSeconds is None:
+            return "new"
+        change = f"{result.seconds / result.baselineSeconds - 1.0:+.0%}"
+        return f"{change} REGRESSION" if result.regression else change
+
+    print(
+        tabulate(
+            [
+                [
+                    result.scale,
+                    result.stage,
+                    result.rows,
+                    result.seconds,
+                    result.baselineSeconds,
+                    formatChange(result),
+                    formatOutput(result),
+                ]
+                for result in results
+            ],
+            headers=["Scale", "Stage", "Rows", "Best (s)", "Baseline (s)", "Change", "Output"],
+            floatfmt=".3f",
+        )
+    )
+    regressions = sum(result.regression for result in results)
+    changedOutputs = sum(result.outputChanged for result in results)
+    mismatches = sum(result.outputMismatch for result in results)
+    print(
+        f"{regressions} regressions, {changedOutputs} changed outputs, and {mismatches} mismatched outputs in "
+        f"{len(results)} benchmarks"
+    )
+    if failures:
+        failed = ", ".join(f"{result.stage} on {result.scale} data ({formatOutput(result)})" for result in failures)
+        raise RuntimeError(f"Benchmark outputs differ: {failed}")
+    return results
@@ -0,0 +1,148 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+from scipy import stats
+
+# Samples smaller than this use the t-distribution, larger samples the normal distribution
+T_DISTRIBUTION_MAX_COUNT = 30
+# Upper limit on the number of resampled values drawn at once, bounding memory to ~8 MB of indices per batch
+BOOTSTRAP_BATCH_ELEMENTS = 2**21
+# Upper limit on the number of resampled values per process pool task
+BOOTSTRAP_TASK_ELEMENTS = 2**24
+
+
+def computeConfidenceBounds(
+    counts: np.ndarray, means: np.ndarray, standardDeviations: np.ndarray, confidence: float = 0.95
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes confidence intervals of many means at once from their sample sizes and sample standard deviations.
+    Quantiles are computed for the whole array of degrees of freedom in one call.
+
+    Args:
+        counts (np.ndarray): Sample sizes.
+        means (np.ndarray): Sample means.
+        standardDeviations (np.ndarray): Sample standard deviations (ddof=1).
+        confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Lower and upper bounds, NaN for samples of fewer than 2 values.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    means = np.asarray(means, dtype=np.float64)
+    standardDeviations = np.asarray(standardDeviations, dtype=np.float64)
+    quantile = (1.0 + confidence) / 2.0
+
+    valid = counts >= 2
+    scores = np.full(counts.shape, np.nan)
+    useT = valid & (counts < T_DISTRIBUTION_MAX_COUNT)
+    scores[useT] = stats.t.ppf(quantile, df=counts[useT] - 1)
+    scores[valid & ~useT] = stats.norm.ppf(quantile)
+
+    margins = scores * standardDeviations / np.sqrt(np.where(valid, counts, 1.0))
+    return means - margins, means + margins
+
+
+@dataclass
+class BootstrapTask:
+    """Groups of equal size to bootstrap in one process pool task.
+
+    Attributes:
+        samples (np.ndarray): One row of values per group.
+        resamples (int): Number of resamples per group.
+        confidence (float): Confidence level of the intervals.
+        seed (np.random.SeedSequence): Seed of the task's random generator.
+    """
+
+    samples: np.ndarray
+    resamples: int
+    confidence: float
+    seed: np.random.SeedSequence
+
+
+def bootstrapMeans(task: BootstrapTask) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes percentile bootstrap intervals of the mean of each row. Runs in worker processes when bootstrapping in
+    parallel."""
+    random = np.random.default_rng(task.seed)
+    groupCount, size = task.samples.shape
+    lower = np.empty(groupCount)
+    upper = np.empty(groupCount)
+    alpha = (1.0 - task.confidence) / 2.0
+    rowsPerBatch = max(1, BOOTSTRAP_BATCH_ELEMENTS // (task.resamples * size))
+    for start in range(0, groupCount, rowsPerBatch):
+        batch = task.samples[start : start + rowsPerBatch]
+        # Index the flattened batch, drawing 32-bit indices is faster than 64-bit ones
+        indices = random.integers(0, size, size=(len(batch), task.resamples, size), dtype=np.int32)
+        indices += (np.arange(len(batch), dtype=np.int32) * size)[:, np.newaxis, np.newaxis]
+        means = batch.ravel()[indices].mean(axis=2)
+        lower[start : start + len(batch)], upper[start : start + len(batch)] = np.quantile(
+            means, [alpha, 1.0 - alpha], axis=1
+        )
+    return lower, upper
+
+
+def bootstrapConfidenceBounds(
+    values: np.ndarray,
+    groupCodes: np.ndarray,
+    groupCount: int,
+    confidence: float = 0.95,
+    resamples: int = 1000,
+    workers: int = 1,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes percentile bootstrap confidence intervals of the mean of each group, which don't assume the values are
+    normally distributed. Groups of equal size are resampled together as one array, split into tasks that run across a
+    process pool. Tasks don't depend on the number of workers, so the intervals are the same for any number of workers.
+
+    Args:
+        values (np.ndarray): Values of all groups.
+        groupCodes (np.ndarray): Group of each value, from 0 to `groupCount` - 1.
+        groupCount (int): Number of groups.
+        confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+        resamples (int, optional): Number of resamples per group. Defaults to 1000.
+        workers (int, optional): Number of worker processes, 0 for one per CPU, 1 to bootstrap in this process.
+            Defaults to 1.
+        seed (int, optional): Seed of the random resampling. Defaults to 0.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Lower and upper bounds of each group, NaN for groups of fewer than 2 values.
+    """
+    order = np.argsort(groupCodes, kind="stable")
+    sortedValues = np.asarray(values, dtype=np.float64)[order]
+    counts = np.bincount(groupCodes, minlength=groupCount)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    taskSamples: List[np.ndarray] = []
+    taskGroups: List[np.ndarray] = []
+    for size in np.unique(counts[counts >= 2]):
+        groups = np.flatnonzero(counts == size)
+        samples = sortedValues[offsets[groups][:, np.newaxis] + np.arange(size)]
+        rowsPerTask = max(1, BOOTSTRAP_TASK_ELEMENTS // (resamples * int(size)))
+        for start in range(0, len(groups), rowsPerTask):
+            taskSamples.append(samples[start : start + rowsPerTask])
+            taskGroups.append(groups[start : start + rowsPerTask])
+    tasks = [
+        BootstrapTask(samples, resamples, confidence, taskSeed)
+        for samples, taskSeed in zip(taskSamples, np.random.SeedSequence(seed).spawn(len(taskSamples)))
+    ]
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    results = None
+    if workers > 1 and len(tasks) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+                results = list(executor.map(bootstrapMeans, tasks))
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Parallel bootstrapping failed, bootstrapping serially: {e}")
+    if results is None:
+        results = [bootstrapMeans(task) for task in tasks]
+
+    lower = np.full(groupCount, np.nan)
+    upper = np.full(groupCount, np.nan)
+    for groups, (taskLower, taskUpper) in zip(taskGroups, results):
+        lower[groups] = taskLower
+        upper[groups] = taskUpper
+    return lower, upper
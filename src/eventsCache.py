@@ -0,0 +1,272 @@
+import io
+import os
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from src.eventsDecoder import DecodedEvents
+from src.utility import writeFileAtomic
+
+EVENTS_CACHE_VERSION = 3
+INDEX_FILE_NAME = "index.npz"
+# Columns stored in one .npy file each per generation, in the order of `DecodedEvents`
+EVENT_COLUMN_DTYPES = {
+    "timestamps": np.int64,
+    "typeCodes": np.int32,
+    "sourceIDs": np.int32,
+    "targetIDs": np.int32,
+    "abilityIDs": np.int32,
+    "melee": bool,
+}
+TYPE_CATEGORIES_COLUMN = "typeCategories"
+# Saving rewrites every entry into one generation when there would be more generations than this
+MAX_GENERATIONS = 32
+# Generations no index references are only deleted by other processes once they are this old, since a process saving
+# the cache writes its generation before its index
+ORPHANED_GENERATION_SECONDS = 3600
+
+
+class EventsCache:
+    """Decoded events of the events files in an encounter's events directory, consolidated into one .npy file per
+    column and an index of each file's offset into the columns. Columns are memory-mapped, so loading only reads the
+    index, fights are slices of the columns that are read from disk when used, and processes analyzing the same
+    encounter share the page cache.
+
+    Entries are keyed by file name and only used while the file's modification time and size are unchanged, so events
+    files that are fetched again are decoded again. Phases are not cached, so any phase configuration can use the same
+    entries. Each save appends the entries added since the last save as a new generation of column files before
+    replacing the index, so readers never see a partially written cache and saving costs time proportional to the new
+    entries. Generations are compacted into one when there are too many or when most of their rows belong to replaced
+    entries.
+
+    Several processes may share a cache. Each only deletes the generations it loaded or wrote itself once its index
+    no longer references them, and generations deleted by another process are written again on the next save."""
+
+    def __init__(self, eventsPath: Path, cachePath: Path):
+        self.eventsPath = eventsPath
+        self.path = cachePath
+        self.entries: Dict[str, Tuple[int, int, DecodedEvents]] = {}
+        # (generation, offset) of each entry stored in the column files, entries added since the last save are missing
+        self.locations: Dict[str, Tuple[str, int]] = {}
+        self.generationLengths: Dict[str, int] = {}
+        # Generations loaded or written by this instance, the only ones it deletes once they are unreferenced
+        self.generations: Set[str] = set()
+        self.modified = False
+        if (self.path / INDEX_FILE_NAME).exists():
+            try:
+                self.load()
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable events cache {self.path}: {e}")
+                self.entries = {}
+                self.locations = {}
+                self.generationLengths = {}
+                self.generations = set()
+
+    def load(self):
+        with np.load(self.path / INDEX_FILE_NAME) as index:
+            if int(index["version"]) != EVENTS_CACHE_VERSION:
+                return
+            names = index["names"].tolist()
+            modifiedTimes = index["modifiedTimes"].tolist()
+            sizes = index["sizes"].tolist()
+            startTimes = index["startTimes"].tolist()
+            generations = index["generations"].tolist()
+            offsets = index["offsets"].tolist()
+            lengths = index["lengths"].tolist()
+
+        columnsByGeneration = {}
+        for generation in set(generations):
+            try:
+                columnsByGeneration[generation] = self.loadGeneration(generation)
+            except FileNotFoundError:
+                # Deleted by another process, its entries are decoded again
+                print(f"Ignoring missing generation {generation} of events cache {self.path}")
+        for index, name in enumerate(names):
+            if generations[index] not in columnsByGeneration:
+                continue
+            columns, typeCategories = columnsByGeneration[generations[index]]
+            decodedEvents = self.createEntryEvents(
+                columns, typeCategories, startTimes[index], offsets[index], lengths[index]
+            )
+            self.entries[name] = (modifiedTimes[index], sizes[index], decodedEvents)
+            self.locations[name] = (generations[index], offsets[index])
+        self.generationLengths = {
+            generation: len(columns["timestamps"]) for generation, (columns, _) in columnsByGeneration.items()
+        }
+        self.generations = set(columnsByGeneration)
+
+    def loadGeneration(self, generation: str) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        if not generation:
+            # Generations without any events have no files, empty files can't be memory-mapped
+            columns = {column: np.empty(0, dtype=dtype) for column, dtype in EVENT_COLUMN_DTYPES.items()}
+            return columns, np.empty(0, dtype=np.str_)
+        columns = {
+            column: np.load(self.path / f"{column}.{generation}.npy", mmap_mode="r") for column in EVENT_COLUMN_DTYPES
+        }
+        return columns, np.load(self.path / f"{TYPE_CATEGORIES_COLUMN}.{generation}.npy")
+
+    @staticmethod
+    def createEntryEvents(
+        columns: Dict[str, np.ndarray], typeCategories: np.ndarray, startTime: int, offset: int, length: int
+    ) -> DecodedEvents:
+        return DecodedEvents(
+            startTime=startTime,
+            timestamps=columns["timestamps"][offset : offset + length],
+            typeCodes=columns["typeCodes"][offset : offset + length],
+            typeCategories=typeCategories,
+            sourceIDs=columns["sourceIDs"][offset : offset + length],
+            targetIDs=columns["targetIDs"][offset : offset + length],
+            abilityIDs=columns["abilityIDs"][offset : offset + length],
+            melee=columns["melee"][offset : offset + length],
+        )
+
+    def get(self, eventsFilePath: Path, stat: os.stat_result | None = None) -> DecodedEvents | None:
+        """Gets the decoded events of a file, or None if the file is not cached or changed since it was cached. Cached
+        events are read-only views of the memory-mapped columns."""
+        entry = self.entries.get(eventsFilePath.name)
+        if entry is None:
+            return None
+        stat = stat or eventsFilePath.stat()
+        modifiedTime, size, decodedEvents = entry
+        if modifiedTime != stat.st_mtime_ns or size != stat.st_size:
+            return None
+        return decodedEvents
+
+    def put(self, eventsFilePath: Path, decodedEvents: DecodedEvents, stat: os.stat_result):
+        """Caches the decoded events of a file. The file should be stat'ed before it is decoded."""
+        self.entries[eventsFilePath.name] = (stat.st_mtime_ns, stat.st_size, decodedEvents)
+        self.locations.pop(eventsFilePath.name, None)
+        self.modified = True
+
+    def isGenerationStored(self, generation: str) -> bool:
+        return not generation or all(
+            (self.path / f"{column}.{generation}.npy").exists()
+            for column in list(EVENT_COLUMN_DTYPES) + [TYPE_CATEGORIES_COLUMN]
+        )
+
+    def deleteGenerations(self, referenced: Set[str]):
+        """Deletes the column files of generations no longer referenced by the index, if this instance loaded or wrote
+        them, or if no process has written them for `ORPHANED_GENERATION_SECONDS`, e.g. after another process's index
+        replaced the one referencing them. Generations other processes just wrote aren't indexed yet, and are kept."""
+        orphanedTime = time.time() - ORPHANED_GENERATION_SECONDS
+        for columnFilePath in self.path.glob("*.npy"):
+            generation = columnFilePath.name.split(".")[-2]
+            if generation in referenced:
+                continue
+            try:
+                if generation in self.generations or columnFilePath.stat().st_mtime < orphanedTime:
+                    # Processes that loaded the generation keep reading it through their open memory maps
+                    columnFilePath.unlink(missing_ok=True)
+            except OSError as e:
+                print(f"Could not delete events cache file {columnFilePath}: {e}")
+
+    def writeGeneration(self, decodedEvents: List[DecodedEvents]) -> Tuple[str, np.ndarray]:
+        """Writes decoded events into a new generation of column files, one entry at a time, so memory use doesn't
+        depend on the number of events.
+
+        Returns:
+            Tuple[str, np.ndarray]: The generation, empty if there are no events, and the offset of each entry.
+        """
+        offsets = np.zeros(len(decodedEvents) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(decoded) for decoded in decodedEvents])
+        if offsets[-1] == 0:
+            return "", offsets[:-1]
+
+        # Entries have their own type categories, recode them into the union of all categories
+        typeCategories = np.unique(
+            np.concatenate([np.empty(0, dtype=np.str_)] + [decoded.typeCategories for decoded in decodedEvents])
+        )
+        typeCodeMappings = {}
+        for decoded in decodedEvents:
+            if id(decoded.typeCategories) not in typeCodeMappings:
+                mapping = np.searchsorted(typeCategories, decoded.typeCategories).astype(np.int32)
+                typeCodeMappings[id(decoded.typeCategories)] = mapping
+
+        def getColumn(decoded: DecodedEvents, column: str) -> np.ndarray:
+            if column == "typeCodes":
+                return typeCodeMappings[id(decoded.typeCategories)][decoded.typeCodes]
+            return getattr(decoded, column)
+
+        # Column files are only read once an index references them, so they don't need to be written atomically
+        self.path.mkdir(parents=True, exist_ok=True)
+        generation = uuid.uuid4().hex[:12]
+        for column, dtype in EVENT_COLUMN_DTYPES.items():
+            values = np.lib.format.open_memmap(
+                self.path / f"{column}.{generation}.npy", mode="w+", dtype=dtype, shape=(int(offsets[-1]),)
+            )
+            for decoded, offset in zip(decodedEvents, offsets):
+                values[offset : offset + len(decoded)] = getColumn(decoded, column)
+            values.flush()
+            del values
+        buffer = io.BytesIO()
+        np.save(buffer, typeCategories.astype(np.str_))
+        writeFileAtomic(self.path / f"{TYPE_CATEGORIES_COLUMN}.{generation}.npy", buffer.getvalue())
+        return generation, offsets[:-1]
+
+    def save(self):
+        """Saves the cache if entries were added, dropping entries of events files that no longer exist. Saved entries
+        are read from the memory-mapped columns afterwards, releasing the memory of their decoded events."""
+        if not self.modified:
+            return
+        entries = {name: entry for name, entry in self.entries.items() if (self.eventsPath / name).exists()}
+        # Entries of generations another process deleted are written again from their memory maps, which stay
+        # readable after the files are deleted
+        storedGenerations = {
+            generation
+            for generation in {generation for generation, _ in self.locations.values()}
+            if self.isGenerationStored(generation)
+        }
+        locations = {
+            name: location
+            for name, location in self.locations.items()
+            if name in entries and location[0] in storedGenerations
+        }
+
+        liveLengths: Counter[str] = Counter()
+        for name, (generation, _) in locations.items():
+            liveLengths[generation] += len(entries[name][2])
+        liveLength = sum(liveLengths.values())
+        storedLength = sum(self.generationLengths.get(generation, 0) for generation in liveLengths)
+        compact = len(liveLengths) >= MAX_GENERATIONS or storedLength - liveLength > liveLength
+        if compact:
+            locations = {}
+        names = [name for name in entries if name not in locations]
+
+        generation, offsets = self.writeGeneration([entries[name][2] for name in names])
+        columns, typeCategories = self.loadGeneration(generation)
+        for name, offset in zip(names, offsets.tolist()):
+            modifiedTime, size, decoded = entries[name]
+            decoded = self.createEntryEvents(columns, typeCategories, decoded.startTime, offset, len(decoded))
+            entries[name] = (modifiedTime, size, decoded)
+            locations[name] = (generation, offset)
+
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            version=np.int64(EVENTS_CACHE_VERSION),
+            names=np.array(list(entries), dtype=np.str_),
+            modifiedTimes=np.array([modifiedTime for modifiedTime, _, _ in entries.values()], dtype=np.int64),
+            sizes=np.array([size for _, size, _ in entries.values()], dtype=np.int64),
+            startTimes=np.array([decoded.startTime for _, _, decoded in entries.values()], dtype=np.int64),
+            generations=np.array([locations[name][0] for name in entries], dtype=np.str_),
+            offsets=np.array([locations[name][1] for name in entries], dtype=np.int64),
+            lengths=np.array([len(decoded) for _, _, decoded in entries.values()], dtype=np.int64),
+        )
+        self.path.mkdir(parents=True, exist_ok=True)
+        writeFileAtomic(self.path / INDEX_FILE_NAME, buffer.getvalue())
+
+        generations = {generation for generation, _ in locations.values()}
+        self.generations.add(generation)
+        self.deleteGenerations(generations)
+        self.generations = generations
+        self.generationLengths = {
+            generation: length for generation, length in self.generationLengths.items() if generation in generations
+        }
+        self.generationLengths[generation] = len(columns["timestamps"])
+        self.entries = entries
+        self.locations = locations
+        self.modified = False
@@ -0,0 +1,225 @@
+import json
+import re
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Tuple
+
+import numpy as np
+
+from src.profiling import profiled
+
+# Events files are written with indent=2, so each event starts at four spaces and its own fields are at six spaces,
+# while the fields of nested objects such as classResources are indented further and never match
+EVENT_START = b"\n    {"
+START_TIME_PATTERN = re.compile(rb'^\{\n  "startTime": (-?\d+)(?=,?\n)')
+# The API returns these fields first and in this order, which lets one scan read them all
+EVENT_FIELDS_PATTERN = re.compile(
+    rb'\n    \{\n      "timestamp": (-?\d+),\n      "type": "([^"\\]*)",\n      "sourceID": (-?\d+),'
+    rb'\n      "targetID": (-?\d+),\n      "abilityGameID": (-?\d+)(?=,?\n)'
+)
+INTEGER_FIELD_PATTERNS = {
+    field: re.compile(rb'\n      "' + field.encode() + rb'": (-?\d+)(?=,?\n)')
+    for field in ["timestamp", "sourceID", "targetID", "abilityGameID"]
+}
+TYPE_PATTERN = re.compile(rb'\n      "type": "([^"\\]*)"(?=,?\n)')
+MELEE = b'\n      "melee": true'
+MELEE_PATTERN = re.compile(re.escape(MELEE) + rb"(?=,?\n)")
+
+
+@dataclass
+class DecodedEvents:
+    """The fields of a fight's events used for analysis, as arrays in file order.
+
+    Attributes:
+        startTime (int): Start time of the fight or dungeon pull.
+        timestamps (np.ndarray): int64 event timestamps.
+        typeCodes (np.ndarray): int32 index of each event's type in `typeCategories`.
+        typeCategories (np.ndarray): Event types as strings.
+        sourceIDs (np.ndarray): int32 source actor IDs.
+        targetIDs (np.ndarray): int32 target actor IDs.
+        abilityIDs (np.ndarray): int32 ability IDs.
+        melee (np.ndarray): Whether each event is a melee event.
+    """
+
+    startTime: int
+    timestamps: np.ndarray
+    typeCodes: np.ndarray
+    typeCategories: np.ndarray
+    sourceIDs: np.ndarray
+    targetIDs: np.ndarray
+    abilityIDs: np.ndarray
+    melee: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def types(self) -> np.ndarray:
+        """Event types as strings, created on each access."""
+        return self.typeCategories[self.typeCodes]
+
+    def select(self, mask: np.ndarray) -> "DecodedEvents":
+        return DecodedEvents(
+            self.startTime,
+            self.timestamps[mask],
+            self.typeCodes[mask],
+            self.typeCategories,
+            self.sourceIDs[mask],
+            self.targetIDs[mask],
+            self.abilityIDs[mask],
+            self.melee[mask],
+        )
+
+    def selectTypes(self, eventTypes: Collection[str]) -> np.ndarray:
+        """Gets a mask of the events with one of the given types, without creating their type strings."""
+        return np.isin(self.typeCodes, np.flatnonzero(np.isin(self.typeCategories, list(eventTypes))))
+
+
+def encodeTypes(types: List[str] | List[bytes] | tuple) -> Tuple[np.ndarray, np.ndarray]:
+    """Encodes event types as int32 codes into their sorted unique strings."""
+    if len(types) == 0:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.str_)
+    categories, codes = np.unique(np.array(types), return_inverse=True)
+    return codes.reshape(-1).astype(np.int32), categories.astype(np.str_)
+
+
+def decodeEventsJson(eventData: Dict[str, Any]) -> DecodedEvents:
+    """Decodes events that were already parsed with `json.load`."""
+    events: List[Dict[str, Any]] = eventData["events"]
+    count = len(events)
+    typeCodes, typeCategories = encodeTypes([event["type"] for event in events])
+    return DecodedEvents(
+        startTime=eventData["startTime"],
+        timestamps=np.fromiter((event["timestamp"] for event in events), dtype=np.int64, count=count),
+        typeCodes=typeCodes,
+        typeCategories=typeCategories,
+        sourceIDs=np.fromiter((event["sourceID"] for event in events), dtype=np.int32, count=count),
+        targetIDs=np.fromiter((event["targetID"] for event in events), dtype=np.int32, count=count),
+        abilityIDs=np.fromiter((event["abilityGameID"] for event in events), dtype=np.int32, count=count),
+        melee=np.fromiter((bool(event.get("melee")) for event in events), dtype=bool, count=count),
+    )
+
+
+def toIntegerArray(values: List[bytes] | tuple, dtype: Any) -> np.ndarray:
+    return np.array(list(map(int, values)), dtype=dtype)
+
+
+def decodeEventsBytes(contents: bytes) -> DecodedEvents | None:
+    """Extracts only the used fields of each event from an indent=2 events file, without creating an object per event.
+    Events are read with a single scan when their fields are in the order the API returns them, otherwise each field is
+    scanned separately.
+
+    Args:
+        contents (bytes): Events file contents.
+
+    Returns:
+        DecodedEvents | None: None if the file doesn't have the expected layout, or an event is missing a field.
+    """
+    startTimeMatch = START_TIME_PATTERN.match(contents)
+    if startTimeMatch is None:
+        return None
+
+    count = contents.count(EVENT_START)
+    rows = EVENT_FIELDS_PATTERN.findall(contents)
+    if len(rows) == count:
+        columns = list(zip(*rows)) if count else [()] * 5
+        timestamps, types, sourceIDs, targetIDs, abilityIDs = columns
+    else:
+        timestamps, sourceIDs, targetIDs, abilityIDs = [
+            pattern.findall(contents) for pattern in INTEGER_FIELD_PATTERNS.values()
+        ]
+        types = TYPE_PATTERN.findall(contents)
+        if any(len(values) != count for values in [timestamps, types, sourceIDs, targetIDs, abilityIDs]):
+            return None
+
+    melee = np.zeros(count, dtype=bool)
+    if MELEE in contents:
+        # A melee field belongs to the last event started before it
+        eventIndex = -1
+        position = 0
+        for match in MELEE_PATTERN.finditer(contents):
+            eventIndex += contents.count(EVENT_START, position, match.start())
+            position = match.start()
+            melee[eventIndex] = True
+
+    typeCodes, typeCategories = encodeTypes(types)
+    return DecodedEvents(
+        startTime=int(startTimeMatch.group(1)),
+        timestamps=toIntegerArray(timestamps, np.int64),
+        typeCodes=typeCodes,
+        typeCategories=typeCategories,
+        sourceIDs=toIntegerArray(sourceIDs, np.int32),
+        targetIDs=toIntegerArray(targetIDs, np.int32),
+        abilityIDs=toIntegerArray(abilityIDs, np.int32),
+        melee=melee,
+    )
+
+
+@dataclass
+class EventFilter:
+    """Selects which decoded events of each fight become rows of an encounter DataFrame. The predicates are applied to
+    the decoded columns, before phases are assigned or any row is created, so only matching events are kept in memory.
+    Phase ability triggers still see every event of a fight, and cast indices count only the kept events.
+
+    Attributes:
+        abilityIDs (List[int] | None): Keep only these abilities, None for all abilities.
+        dropAbilityIDs (List[int]): Drop these abilities.
+        eventTypes (List[str] | None): Keep only these event types, None for all types.
+        sourceIDs (List[int] | None): Keep only events from these actors, None for all actors.
+        targetIDs (List[int] | None): Keep only events targeting these actors, None for all actors.
+        minTime (float | None): Drop events earlier than this many seconds after the fight or dungeon pull start.
+        maxTime (float | None): Drop events later than this many seconds after the fight or dungeon pull start.
+    """
+
+    abilityIDs: List[int] | None = None
+    dropAbilityIDs: List[int] = field(default_factory=list)
+    eventTypes: List[str] | None = None
+    sourceIDs: List[int] | None = None
+    targetIDs: List[int] | None = None
+    minTime: float | None = None
+    maxTime: float | None = None
+
+    def withDroppedAbilities(self, abilityIDs: Collection[int]) -> "EventFilter":
+        return replace(self, dropAbilityIDs=sorted(set(self.dropAbilityIDs) | set(abilityIDs)))
+
+    def mask(self, events: DecodedEvents) -> np.ndarray:
+        """Gets a mask of the events matching every predicate."""
+        mask = np.ones(len(events), dtype=bool)
+        if self.abilityIDs is not None:
+            mask &= np.isin(events.abilityIDs, self.abilityIDs)
+        if self.dropAbilityIDs:
+            mask &= ~np.isin(events.abilityIDs, self.dropAbilityIDs)
+        if self.eventTypes is not None:
+            mask &= events.selectTypes(self.eventTypes)
+        if self.sourceIDs is not None:
+            mask &= np.isin(events.sourceIDs, self.sourceIDs)
+        if self.targetIDs is not None:
+            mask &= np.isin(events.targetIDs, self.targetIDs)
+        if self.minTime is not None:
+            mask &= events.timestamps >= events.startTime + self.minTime * 1000.0
+        if self.maxTime is not None:
+            mask &= events.timestamps <= events.startTime + self.maxTime * 1000.0
+        return mask
+
+
+@profiled()
+def decodeEventsFile(eventsFilePath: Path, eventFilter: EventFilter | None = None) -> DecodedEvents:
+    """Decodes the fields of an events file used for analysis, keeping only the events matching the filter. Files that
+    don't have the indent=2 layout are parsed with `json.loads`.
+
+    Args:
+        eventsFilePath (Path): Events file path.
+        eventFilter (EventFilter | None, optional): Events to keep, None for all events. Defaults to None.
+
+    Returns:
+        DecodedEvents: Matching events in file order.
+    """
+    contents = eventsFilePath.read_bytes()
+    decoded = decodeEventsBytes(contents)
+    if decoded is None:
+        decoded = decodeEventsJson(json.loads(contents))
+
+    if eventFilter is None:
+        return decoded
+    mask = eventFilter.mask(decoded)
+    return decoded if mask.all() else decoded.select(mask)
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+from src.utility import writeJsonAtomic
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+@dataclass
+class EventsFileEntry:
+    """Integrity and coverage information for a complete events file.
+
+    Attributes:
+        size (int): File size in bytes.
+        sha256 (str): SHA-256 checksum of the file contents.
+        eventCount (int): Number of events in the file.
+        startTime (int): Start time of the fight or dungeon pull.
+        firstTimestamp (int): Timestamp of the first event, 0 if there are no events.
+        lastTimestamp (int): Timestamp of the last event, 0 if there are no events.
+    """
+
+    size: int
+    sha256: str
+    eventCount: int
+    startTime: int
+    firstTimestamp: int
+    lastTimestamp: int
+
+
+class EventsManifest:
+    """Records the events files in an encounter's events directory that were completely written, so that complete
+    files can be recognized from their size without parsing them. Several processes may record files in the same
+    directory, so saving merges this process's new entries into the manifest on disk instead of replacing it."""
+
+    def __init__(self, eventsPath: Path):
+        self.path = eventsPath / MANIFEST_FILE_NAME
+        # Names of the entries recorded since the last save
+        self.recorded: Set[str] = set()
+        self.entries, self.modifiedTime = self.readEntries()
+
+    def readEntries(self) -> Tuple[Dict[str, EventsFileEntry], int]:
+        """Reads the manifest on disk.
+
+        Returns:
+            Tuple[Dict[str, EventsFileEntry], int]: Its entries and modification time, or no entries and 0 if it
+            doesn't exist.
+        """
+        try:
+            with open(self.path) as manifestFile:
+                modifiedTime = os.fstat(manifestFile.fileno()).st_mtime_ns
+                entries = {name: EventsFileEntry(**entry) for name, entry in json.load(manifestFile).items()}
+        except FileNotFoundError:
+            return {}, 0
+        return entries, modifiedTime
+
+    def refresh(self):
+        """Reads entries another process saved since this manifest was loaded, keeping unsaved entries."""
+        try:
+            modifiedTime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if modifiedTime == self.modifiedTime:
+            return
+        entries, self.modifiedTime = self.readEntries()
+        entries.update({name: self.entries[name] for name in self.recorded})
+        self.entries = entries
+
+    def save(self):
+        """Merges the entries recorded since the last save into the manifest on disk and writes it."""
+        if not self.recorded:
+            return
+        entries, _ = self.readEntries()
+        entries.update({name: self.entries[name] for name in self.recorded})
+        writeJsonAtomic(self.path, {name: asdict(entry) for name, entry in entries.items()})
+        self.entries = entries
+        self.modifiedTime = self.path.stat().st_mtime_ns
+        self.recorded.clear()
+
+    def record(self, eventsFilePath: Path, eventData: Dict[str, Any], contents: bytes):
+        events = eventData["events"]
+        self.recorded.add(eventsFilePath.name)
+        self.entries[eventsFilePath.name] = EventsFileEntry(
+            size=len(contents),
+            sha256=hashlib.sha256(contents).hexdigest(),
+            eventCount=len(events),
+            startTime=eventData["startTime"],
+            firstTimestamp=events[0]["timestamp"] if events else 0,
+            lastTimestamp=events[-1]["timestamp"] if events else 0,
+        )
+
+    def isComplete(self, eventsFilePath: Path) -> bool:
+        entry = self.entries.get(eventsFilePath.name)
+        return entry is not None and eventsFilePath.exists() and eventsFilePath.stat().st_size == entry.size
+
+    def verify(self, eventsFilePath: Path) -> bool:
+        """Checks the file's checksum against the manifest, which requires reading the whole file."""
+        entry = self.entries.get(eventsFilePath.name)
+        if entry is None or not self.isComplete(eventsFilePath):
+            return False
+        return hashlib.sha256(eventsFilePath.read_bytes()).hexdigest() == entry.sha256
+
+    def recordExisting(self, eventsFilePath: Path) -> bool:
+        """Parses an events file written before the manifest existed and records it if it is valid JSON.
+
+        Returns:
+            bool: False if the file is missing or truncated.
+        """
+        try:
+            contents = eventsFilePath.read_bytes()
+            eventData = json.loads(contents)
+        except (OSError, json.JSONDecodeError):
+            return False
+        self.record(eventsFilePath, eventData, contents)
+        return True
+
+
+manifests: Dict[Path, EventsManifest] = {}
+
+
+def getEventsManifest(eventsPath: Path) -> EventsManifest:
+    """Gets the manifest for an events directory, loading it once per process."""
+    if eventsPath not in manifests:
+        manifests[eventsPath] = EventsManifest(eventsPath)
+    return manifests[eventsPath]
+
+
+def writeEventsFile(eventsFilePath: Path, eventData: Dict[str, Any]):
+    """Writes an events file atomically and records it in its directory's manifest.
+
+    Args:
+        eventsFilePath (Path): Events file path from `getEventsFilePath` or `getEventsFilePathForDungeon`.
+        eventData (Dict[str, Any]): Events file contents, with at least `startTime` and `events`.
+    """
+    contents = writeJsonAtomic(eventsFilePath, eventData)
+    manifest = getEventsManifest(eventsFilePath.parent)
+    manifest.record(eventsFilePath, eventData, contents)
+    manifest.save()
+
+
+def isEventsFileComplete(eventsFilePath: Path, save: bool = True) -> bool:
+    """Checks whether an events file was completely written. Files written before the manifest existed are parsed
+    once and recorded if they are valid, so later checks only compare file sizes.
+
+    Args:
+        eventsFilePath (Path): Events file path.
+        save (bool, optional): Whether to save the manifest when the file is recorded. Pass False when checking many
+            files and save each manifest once afterwards. Defaults to True.
+
+    Returns:
+        bool: False if the file is missing, truncated, or was modified after it was recorded.
+    """
+    if not eventsFilePath.exists():
+        return False
+    manifest = getEventsManifest(eventsFilePath.parent)
+    if eventsFilePath.name not in manifest.entries:
+        # Another process may have written the file since the manifest was loaded
+        manifest.refresh()
+    if eventsFilePath.name in manifest.entries:
+        return manifest.isComplete(eventsFilePath)
+    if manifest.recordExisting(eventsFilePath):
+        if save:
+            manifest.save()
+        return True
+    return False
+
+
+def filterCompleteEventsFiles(eventsFilePaths: List[Path]) -> List[Path]:
+    """Returns the existing events files that are complete, printing the ones that are skipped as incomplete. Files
+    written before the manifest existed are all recorded before each manifest is saved once."""
+    complete = []
+    manifestPaths: Set[Path] = set()
+    for eventsFilePath in eventsFilePaths:
+        if not eventsFilePath.exists():
+            continue
+        manifestPaths.add(eventsFilePath.parent)
+        if isEventsFileComplete(eventsFilePath, save=False):
+            complete.append(eventsFilePath)
+        else:
+            print(f"Skipping incomplete events file: {eventsFilePath}")
+    for eventsPath in manifestPaths:
+        getEventsManifest(eventsPath).save()
+    return complete
@@ -0,0 +1,246 @@
+import heapq
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+from src.enums import DifficultyType
+from src.eventsManifest import MANIFEST_FILE_NAME, isEventsFileComplete
+from src.fightSelection import FightSelection, isKill
+from src.profiling import profiled
+from src.fetchReports import fetchAndSaveDungeonPullEvents, fetchAndSaveFightEvents
+from src.utility import (
+    getAccessToken,
+    getEventsFilePath,
+    getEventsFilePathForDungeon,
+    getEventsPath,
+    getEventsPathForDungeon,
+    getFightsFilePath,
+)
+
+
+@dataclass(frozen=True)
+class EncounterTarget:
+    """A raid encounter, or a boss in a dungeon when dungeonEncounterID is set, to fetch events for.
+
+    Attributes:
+        zoneID (int): WarcraftLogs API zone ID for the raid or dungeon.
+        encounterID (int): Encounter ID for the boss (Translates to dungeonEncounterID in game).
+        difficulty (DifficultyType): Difficulty type fights were filtered by.
+        dungeonEncounterID (int): The WarcraftLogs dungeon encounter ID if the boss is in a dungeon, otherwise 0.
+    """
+
+    zoneID: int
+    encounterID: int
+    difficulty: DifficultyType
+    dungeonEncounterID: int = 0
+
+    def getFightsFilePath(self) -> Path:
+        if self.difficulty == DifficultyType.Dungeon:
+            return getFightsFilePath(self.zoneID, self.difficulty, self.dungeonEncounterID)
+        return getFightsFilePath(self.zoneID, self.difficulty, self.encounterID)
+
+    def getEventsPath(self) -> Path:
+        if self.difficulty == DifficultyType.Dungeon:
+            return getEventsPathForDungeon(self.zoneID, self.dungeonEncounterID, self.encounterID)
+        return getEventsPath(self.zoneID, self.difficulty, self.encounterID)
+
+    def getEventsFilePath(self, code: str, fightID: int, pullID: int = -1) -> Path:
+        if self.difficulty == DifficultyType.Dungeon:
+            return getEventsFilePathForDungeon(
+                self.zoneID, self.dungeonEncounterID, self.encounterID, code, fightID, pullID
+            )
+        return getEventsFilePath(self.zoneID, self.difficulty, self.encounterID, code, fightID)
+
+    def countSampledFights(self) -> int:
+        eventsPath = self.getEventsPath()
+        if not eventsPath.is_dir():
+            return 0
+        return sum(1 for path in eventsPath.glob("*.json") if path.name != MANIFEST_FILE_NAME)
+
+
+@dataclass
+class FetchPriority:
+    """Configures the order events are fetched in. Enabled criteria are applied in the order of the attributes, with
+    earlier criteria taking precedence.
+
+    Attributes:
+        killsFirst (bool): Fetch kills before wipes.
+        lowestPercentageFirst (bool): Fetch fights with the lowest boss health percentage first.
+        highestKeystoneFirst (bool): Fetch dungeon runs with the highest keystone level first.
+        newestReportsFirst (bool): Fetch fights from the most recent reports first.
+        underSampledEncountersFirst (bool): When fetching for several encounters, fetch the next fight from the
+            encounter with the fewest fights already fetched.
+    """
+
+    killsFirst: bool = True
+    lowestPercentageFirst: bool = True
+    highestKeystoneFirst: bool = True
+    newestReportsFirst: bool = True
+    underSampledEncountersFirst: bool = True
+
+
+@dataclass
+class FetchTask:
+    target: EncounterTarget
+    fightObject: Dict[str, Any]
+    pullID: int = -1
+    sortKey: Tuple = field(default=(), compare=False)
+
+    def makeSortKey(self, priority: FetchPriority) -> Tuple:
+        key = []
+        if priority.killsFirst:
+            key.append(0 if isKill(self.fightObject) else 1)
+        if priority.lowestPercentageFirst:
+            key.append(self.fightObject.get("fightPercentage") or 0.0)
+        if priority.highestKeystoneFirst:
+            key.append(-(self.fightObject.get("keystoneLevel") or 0))
+        if priority.newestReportsFirst:
+            key.append(-(self.fightObject.get("reportStartTime") or 0))
+        return tuple(key)
+
+    def getEventsFilePath(self) -> Path:
+        return self.target.getEventsFilePath(self.fightObject["code"], self.fightObject["id"], self.pullID)
+
+    def fetch(self, accessToken: str, overwriteExisting: bool = False) -> bool:
+        target = self.target
+        if target.difficulty == DifficultyType.Dungeon:
+            return fetchAndSaveDungeonPullEvents(
+                accessToken,
+                target.zoneID,
+                target.encounterID,
+                target.dungeonEncounterID,
+                self.fightObject,
+                self.pullID,
+                overwriteExisting,
+            )
+        return fetchAndSaveFightEvents(
+            accessToken, target.zoneID, target.encounterID, target.difficulty, self.fightObject, overwriteExisting
+        )
+
+
+def buildFetchTasks(
+    target: EncounterTarget,
+    priority: FetchPriority,
+    overwriteExisting: bool = False,
+    codes: Set[str] | None = None,
+    fightSelection: FightSelection | None = None,
+) -> List[FetchTask]:
+    """Creates tasks for each fight, or each matching dungeon pull, in the target's fights file that still needs its
+    events fetched, sorted by priority.
+
+    Args:
+        target (EncounterTarget): Encounter to create tasks for.
+        priority (FetchPriority): Priority to sort the tasks by.
+        overwriteExisting (bool, optional): Whether to include fights that already have an events file. Defaults to
+            False.
+        codes (Set[str] | None, optional): If specified, only fights from these reports are included. Defaults to None.
+        fightSelection (FightSelection | None, optional): If specified, only fights it matches are included. Defaults
+            to None.
+
+    Returns:
+        List[FetchTask]: Tasks sorted from most to least valuable.
+    """
+    fightsFilePath = target.getFightsFilePath()
+    if not fightsFilePath.exists():
+        print(f"No fights file for {target}")
+        return []
+
+    with open(fightsFilePath) as fightsFile:
+        fightObjects = json.load(fightsFile)
+
+    tasks: List[FetchTask] = []
+    for fightObject in fightObjects:
+        if not fightObject.get("id"):
+            continue
+        if codes is not None and fightObject["code"] not in codes:
+            continue
+        if fightSelection and not fightSelection.matches(fightObject):
+            continue
+        if target.difficulty == DifficultyType.Dungeon:
+            for pullID, pull in enumerate(fightObject.get("dungeonPulls") or [], start=1):
+                if pull.get("encounterID") == target.encounterID:
+                    tasks.append(FetchTask(target, fightObject, pullID))
+        else:
+            tasks.append(FetchTask(target, fightObject))
+
+    if not overwriteExisting:
+        tasks = [task for task in tasks if not isEventsFileComplete(task.getEventsFilePath())]
+    for task in tasks:
+        task.sortKey = task.makeSortKey(priority)
+    tasks.sort(key=lambda task: task.sortKey)
+    return tasks
+
+
+class FetchQueue:
+    """Orders event fetching across encounters by priority. When under-sampled encounters are preferred, the next task
+    is taken from the encounter with the fewest fetched fights, otherwise tasks from all encounters are merged by
+    their sort keys."""
+
+    def __init__(
+        self,
+        targets: List[EncounterTarget],
+        priority: FetchPriority = FetchPriority(),
+        overwriteExisting: bool = False,
+        codes: Set[str] | None = None,
+        fightSelection: FightSelection | None = None,
+    ):
+        self.priority = priority
+        self.tasks: Dict[EncounterTarget, List[FetchTask]] = {}
+        self.heap: List[Tuple[Any, ...]] = []
+        for targetIndex, target in enumerate(targets):
+            targetTasks = buildFetchTasks(target, priority, overwriteExisting, codes, fightSelection)
+            if not targetTasks:
+                continue
+            targetTasks.reverse()  # pop from the end
+            self.tasks[target] = targetTasks
+            sampled = target.countSampledFights() if priority.underSampledEncountersFirst else 0
+            heapq.heappush(self.heap, (sampled, targetTasks[-1].sortKey, targetIndex, target))
+
+    def __len__(self) -> int:
+        return sum(len(targetTasks) for targetTasks in self.tasks.values())
+
+    def pop(self) -> FetchTask | None:
+        if not self.heap:
+            return None
+        sampled, _, targetIndex, target = heapq.heappop(self.heap)
+        targetTasks = self.tasks[target]
+        task = targetTasks.pop()
+        if targetTasks:
+            if self.priority.underSampledEncountersFirst:
+                sampled += 1
+            heapq.heappush(self.heap, (sampled, targetTasks[-1].sortKey, targetIndex, target))
+        return task
+
+
+@profiled()
+def fetchAndSaveEventsPrioritized(
+    targets: List[EncounterTarget],
+    priority: FetchPriority = FetchPriority(),
+    overwriteExisting: bool = False,
+    maxFights: int = 0,
+    fightSelection: FightSelection | None = None,
+):
+    """Fetches and saves events for several encounters, most valuable fights first. When the hourly points budget runs
+    out, the current request waits for the points reset and the queue continues where it left off. Since fights with
+    an events file are skipped, rerunning after an interruption resumes with the remaining queue.
+
+    Args:
+        targets (List[EncounterTarget]): Encounters to fetch events for.
+        priority (FetchPriority, optional): Order to fetch fights in. Defaults to FetchPriority().
+        overwriteExisting (bool, optional): Whether to overwrite existing events files. Defaults to False.
+        maxFights (int, optional): Upper limit on the number of fights to fetch, 0 for no limit. Defaults to 0.
+        fightSelection (FightSelection | None, optional): If specified, fights it doesn't match are skipped. Defaults to
+            None.
+    """
+    queue = FetchQueue(targets, priority, overwriteExisting, fightSelection=fightSelection)
+    print(f"Queued {len(queue)} fights across {len(queue.tasks)} encounters")
+
+    token = getAccessToken()
+    fetched = 0
+    while (task := queue.pop()) is not None:
+        if task.fetch(token, overwriteExisting):
+            fetched += 1
+        if 0 < maxFights <= fetched:
+            print(f"Hit fight limit of {maxFights}, stopping")
+            break
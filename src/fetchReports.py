@@ -1,21 +1,32 @@
 import asyncio
 import json
 import time
+from bisect import bisect_right
+from dataclasses import dataclass
 from pathlib import Path
 from gql import Client, gql
 from gql.transport.aiohttp import AIOHTTPTransport
 from gql.transport.requests import RequestsHTTPTransport
-from gql.transport.exceptions import TransportServerError
+from gql.transport.exceptions import TransportQueryError, TransportServerError
 from src.enums import DifficultyType, KillType
-from typing import Any, Callable, Dict, List, Set
+from src.eventsManifest import getEventsManifest, isEventsFileComplete, writeEventsFile
+from src.fightSelection import FightSelection
+from src.masterData import createReportMasterData, saveReportMasterData
+from src.profiling import profiled
+from typing import Any, Callable, Dict, List, Set, Tuple
 from functools import partial
 
 from src.utility import (
     getAccessToken,
     getEventsFilePath,
     getEventsFilePathForDungeon,
+    getEventsPath,
+    getFightsCheckedFilePath,
     getFightsFilePath,
+    getMasterDataFilePath,
+    getQueryComplexityFilePath,
     getReportsFilePath,
+    writeJsonAtomic,
 )
 
 rateLimitQuery = """
@@ -69,6 +80,7 @@ query (
 ) {
     reportData {
         report(code: $code) {
+            startTime
             fights(
                 difficulty: $difficulty
                 encounterID: $encounterID
@@ -76,6 +88,7 @@ query (
             ) {
                 id
                 startTime
+                kill
                 fightPercentage
                 phaseTransitions {
                     id
@@ -95,6 +108,7 @@ query (
 ) {
     reportData {
         report(code: $code) {
+            startTime
             fights(
                 difficulty: $difficulty
                 encounterID: $encounterID
@@ -142,6 +156,48 @@ query(
     }
 }"""
 
+fetchMasterDataQuery = """
+query($code: String) {
+    reportData {
+        report(code: $code) {
+            masterData(translate: true) {
+                actors {
+                    id
+                    gameID
+                    name
+                    type
+                    subType
+                    petOwner
+                }
+                abilities {
+                    gameID
+                    name
+                    icon
+                    type
+                }
+            }
+            fights {
+                id
+                enemyNPCs {
+                    id
+                }
+                enemyPets {
+                    id
+                }
+                friendlyNPCs {
+                    id
+                }
+                friendlyPets {
+                    id
+                }
+            }
+        }
+    }
+}"""
+
+# Matches the limit in fetchEventsQuery
+EVENTS_PAGE_LIMIT = 10000
+
 nextPointsResetTime = 0.0
 
 
@@ -187,6 +243,18 @@ def sleepUntilPointsReset(
     return None
 
 
+def fetchRateLimitData(accessToken: str) -> Dict[str, Any]:
+    """Fetches the hourly points limit, points spent this hour, and seconds until the points reset.
+
+    Args:
+        accessToken (str): WarcraftLogs API access token.
+
+    Returns:
+        Dict[str, Any]: Rate limit data with `limitPerHour`, `pointsSpentThisHour`, and `pointsResetIn`.
+    """
+    return executeQueryWithRetry(accessToken, rateLimitQuery, {})["rateLimitData"]
+
+
 resetTimeLock = asyncio.Lock()
 
 
@@ -216,13 +284,16 @@ async def sleepUntilPointsResetAsync(e: TransportServerError, accessToken: str,
     raise e
 
 
+@profiled()
 def executeQueryWithRetry(accessToken: str, query: str, variables: Dict[str, Any]) -> Any:
     client = makeClient(accessToken, False)
     try:
         return client.execute(gql(query), variables)
     except TransportServerError as e:
-        if not sleepUntilPointsReset(e, accessToken, partial(executeQueryWithRetry, accessToken, query, variables)):
+        result = sleepUntilPointsReset(e, accessToken, partial(executeQueryWithRetry, accessToken, query, variables))
+        if not result:
             raise
+        return result
 
 
 async def executeQueryWithRetryAsync(accessToken: str, client: Client, query: str, variables: Dict[str, Any]) -> Any:
@@ -235,6 +306,62 @@ async def executeQueryWithRetryAsync(accessToken: str, client: Client, query: st
         return await sleepUntilPointsResetAsync(e, accessToken, retry_callback)
 
 
+def getReportEndTimes(reports: Dict[str, Any]) -> Dict[str, float]:
+    return {code: times["endTime"] for code, times in reports.get("reports", {}).items()}
+
+
+def loadCheckedEndTimes(zoneID: int, difficulty: DifficultyType, encounterID: int) -> Dict[str, float]:
+    checkedFilePath = getFightsCheckedFilePath(zoneID, difficulty, encounterID)
+    if not checkedFilePath.exists():
+        return {}
+    with open(checkedFilePath) as checkedFile:
+        return json.load(checkedFile)
+
+
+def saveCheckedEndTimes(zoneID: int, difficulty: DifficultyType, encounterID: int, checkedEndTimes: Dict[str, float]):
+    writeJsonAtomic(getFightsCheckedFilePath(zoneID, difficulty, encounterID), checkedEndTimes)
+
+
+def getCodesToDiscover(
+    codes: List[str],
+    results: List[Dict[str, Any]],
+    reportEndTimes: Dict[str, float],
+    checkedEndTimes: Dict[str, float],
+) -> Tuple[List[str], Set[str]]:
+    """Finds the reports that fight discovery needs to query: reports not in the fights file yet, and reports whose end
+    time advanced since their fights were last discovered because they were still being logged. Reports discovered
+    before end times were recorded are treated as checked at their current end time.
+
+    Args:
+        codes (List[str]): Report codes from the reports file.
+        results (List[Dict[str, Any]]): Entries from the fights file.
+        reportEndTimes (Dict[str, float]): Latest known end time of each report.
+        checkedEndTimes (Dict[str, float]): End time of each report when its fights were last discovered, updated in
+            place for legacy reports.
+
+    Returns:
+        Tuple[List[str], Set[str]]: Codes to query, and the subset whose existing fights entries should be replaced.
+    """
+    seenCodes: Set[str] = {r["code"] for r in results}
+    codesToFetch: List[str] = []
+    staleCodes: Set[str] = set()
+    for code in codes:
+        if code not in seenCodes:
+            codesToFetch.append(code)
+            continue
+        endTime = reportEndTimes.get(code)
+        if endTime is None:
+            continue
+        if code not in checkedEndTimes:
+            checkedEndTimes[code] = endTime
+        elif endTime > checkedEndTimes[code]:
+            codesToFetch.append(code)
+            staleCodes.add(code)
+    if staleCodes:
+        print(f"Rechecking {len(staleCodes)} reports that were updated since their fights were found")
+    return codesToFetch, staleCodes
+
+
 async def fetchSingleReport(
     sem: asyncio.Semaphore, token: str, code: str, encounterID: int, difficulty: DifficultyType, killType: KillType
 ) -> List[Dict[str, Any]]:
@@ -253,7 +380,8 @@ async def fetchSingleReport(
             print(f"[{code}] error: {e}")
             return []  # skip this code
 
-    fights = data["reportData"]["report"]["fights"]
+    report = data["reportData"]["report"]
+    fights = report["fights"]
     out = []
     if not fights:
         out.append({"code": code})
@@ -267,6 +395,8 @@ async def fetchSingleReport(
                         "code": code,
                         "id": fid,
                         "startTime": st,
+                        "reportStartTime": report.get("startTime"),
+                        "kill": fight.get("kill"),
                         "fightPercentage": fight["fightPercentage"],
                         "phaseTransitions": fight["phaseTransitions"] or None,
                     }
@@ -275,6 +405,7 @@ async def fetchSingleReport(
     return out
 
 
+@profiled()
 def fetchAndSaveFightsAsync(
     zoneID: int,
     encounterID: int,
@@ -291,7 +422,8 @@ def fetchAndSaveFightsAsync(
         raise FileNotFoundError(f"No reports file for zoneID: {zoneID}")
 
     with open(reportsFilePath) as f:
-        codes: List[str] = json.load(f)["codes"]
+        reports = json.load(f)
+        codes: List[str] = reports["codes"]
 
     fightsFilePath = getFightsFilePath(zoneID, difficulty, encounterID)
     results = []
@@ -299,19 +431,24 @@ def fetchAndSaveFightsAsync(
         with open(fightsFilePath) as f:
             results = json.load(f)
 
-    seenCodes: Set[str] = set()
-    if not overwriteExisting:
-        seenCodes = {r["code"] for r in results}
-    codesToFetch = [c for c in codes if c not in seenCodes]
+    reportEndTimes = getReportEndTimes(reports)
+    checkedEndTimes = {} if overwriteExisting else loadCheckedEndTimes(zoneID, difficulty, encounterID)
+    codesToFetch, staleCodes = getCodesToDiscover(codes, results, reportEndTimes, checkedEndTimes)
     token = getAccessToken()
 
     async def runner():
+        nonlocal results
         sem = asyncio.Semaphore(max_concurrency)
         tasks = [fetchSingleReport(sem, token, code, encounterID, difficulty, killType) for code in codesToFetch]
         all_batches = await asyncio.gather(*tasks)
         # flatten and respect foundFightLimit
         count = 0
-        for batch in all_batches:
+        for code, batch in zip(codesToFetch, all_batches):
+            if not batch:
+                continue
+            if code in staleCodes:
+                results = [r for r in results if r["code"] != code]
+            checkedEndTimes[code] = reportEndTimes.get(code, 0.0)
             for item in batch:
                 results.append(item)
                 if "id" in item:
@@ -322,8 +459,8 @@ def fetchAndSaveFightsAsync(
 
     asyncio.run(runner())
 
-    with open(fightsFilePath, "w") as f:
-        json.dump(results, f, indent=2)
+    writeJsonAtomic(fightsFilePath, results)
+    saveCheckedEndTimes(zoneID, difficulty, encounterID, checkedEndTimes)
 
 
 def fetchReports(
@@ -345,16 +482,19 @@ def fetchReports(
     return executeQueryWithRetry(accessToken, fetchReportsQuery, variables)
 
 
+@profiled()
 def fetchAndSaveReports(
     zoneID: int,
     reportLimit: int = 100,
     maxPages: int = 10,
     startTime: float = -1.0,
     reportsFilePath: Path | None = None,
-):
-    """Fetches reports codes and saves them to file. If a matching reports file exists, it will be loaded so that
-    duplicate codes are not recorded. If startTime is not specified and a matching reports file exists, it will use the
-    saved start time to limit the fetched reports to have occurred after this time.
+    refreshWindow: float = 43200000.0,
+) -> List[str]:
+    """Fetches reports codes and saves them to file along with each report's start and end time. If a matching reports
+    file exists, it will be loaded so that duplicate codes are not recorded. If startTime is not specified and a
+    matching reports file exists, it will use the saved start time to limit the fetched reports to have occurred after
+    this time, reaching back by refreshWindow so that reports that were still being logged get their end times updated.
 
     Args:
         zoneID (int): WarcraftLogs API zone ID for the raid or dungeon.
@@ -363,23 +503,33 @@ def fetchAndSaveReports(
         startTime (float, optional): Reports will be filtered to have occurred after this time. Defaults to -1.0.
         reportsFilePath (Path | None, optional): If specified, uses this file for report codes, otherwise defaulting to
             the default report file path for the zoneID. Defaults to None.
+        refreshWindow (float, optional): Milliseconds before the saved start time to refetch reports from. Defaults to
+            43200000.0 (12 hours).
+
+    Returns:
+        List[str]: Codes that were not already in the reports file.
     """
 
     token = getAccessToken()
     page = 1
     reportCodes = []
+    newReportCodes: List[str] = []
+    reportTimes: Dict[str, Dict[str, float]] = {}
+    queryStartTime = startTime
 
     if reportsFilePath == None:
         reportsFilePath = getReportsFilePath(zoneID)
     if reportsFilePath.exists():
         with open(reportsFilePath) as reportsFile:
             lastData = json.load(reportsFile)
+            reportTimes = lastData.get("reports", {})
             maybeReportCodes = lastData.get("codes")
             if maybeReportCodes:
                 reportCodes = maybeReportCodes
                 print(f"Loaded: {len(reportCodes)} codes from {reportsFilePath}")
                 if startTime == -1.0:
                     startTime = lastData.get("startTime", 0.0)
+                    queryStartTime = max(0.0, startTime - refreshWindow) if startTime > 0 else startTime
                     print(f"Using last saved start time: {startTime}")
 
     maxStartTime = startTime
@@ -387,7 +537,7 @@ def fetchAndSaveReports(
     while page <= maxPages:
         try:
             print(f"Fetching page {page}...")
-            result = fetchReports(token, page, zoneID, reportLimit, startTime)
+            result = fetchReports(token, page, zoneID, reportLimit, queryStartTime)
 
             reportData = result["reportData"]
             reports = reportData["reports"]["data"]
@@ -396,8 +546,10 @@ def fetchAndSaveReports(
             for report in reports:
                 maxStartTime = max(maxStartTime, report["startTime"])
                 code = report["code"]
+                reportTimes[code] = {"startTime": report["startTime"], "endTime": report["endTime"]}
                 if not code in reportCodes:
                     reportCodes.append(report["code"])
+                    newReportCodes.append(report["code"])
 
             if not result["reportData"]["reports"]["has_more_pages"]:
                 print("No more pages.")
@@ -408,12 +560,11 @@ def fetchAndSaveReports(
             print(f"An unexpected error occurred: {e}")
             break
 
-    with open(reportsFilePath, "w") as reportsFile:
-        json.dump(
-            {"zoneID": zoneID, "lastPage": page, "codes": reportCodes, "startTime": maxStartTime},
-            reportsFile,
-            indent=2,
-        )
+    writeJsonAtomic(
+        reportsFilePath,
+        {"zoneID": zoneID, "lastPage": page, "codes": reportCodes, "startTime": maxStartTime, "reports": reportTimes},
+    )
+    return newReportCodes
 
 
 def fetchFightFromReport(accessToken: str, code: str, fightID: int) -> Dict[str, Any]:
@@ -479,6 +630,7 @@ def fetchDungeonFightsFromReport(accessToken: str, code: str, dungeonEncounterID
     return executeQueryWithRetry(accessToken, fetchDungeonFightsFromReportQuery, variables)
 
 
+@profiled()
 def fetchAndSaveFights(
     zoneID: int,
     encounterID: int,
@@ -487,9 +639,10 @@ def fetchAndSaveFights(
     overwriteExisting: bool = False,
     foundFightLimit: int = 0,
     reportsFilePath: Path | None = None,
-):
+) -> List[str]:
     """Fetches fights for raid encounters from a list of report IDs and saves the fight IDs to the fights directory as
-    a single file.
+    a single file. Reports already in the fights file are only queried again if their end time advanced since their
+    fights were found.
 
     Args:
         zoneID (int): WarcraftLogs API zone ID for the raid.
@@ -500,6 +653,9 @@ def fetchAndSaveFights(
         foundFightLimit (int, optional): Upper limit on the number of fights to fetch. Defaults to 0.
         reportsFilePath (Path | None, optional): If specified, uses this file for report codes, otherwise defaulting to
             the default report file path for the zoneID. Defaults to None.
+
+    Returns:
+        List[str]: Codes whose fights were fetched.
     """
 
     if reportsFilePath == None:
@@ -518,14 +674,14 @@ def fetchAndSaveFights(
         with open(fightsFilePath) as fightsFile:
             results = json.load(fightsFile)
 
-    seenCodes: Set[str] = {r["code"] for r in results}
+    reportEndTimes = getReportEndTimes(reports)
+    checkedEndTimes = {} if overwriteExisting else loadCheckedEndTimes(zoneID, difficulty, encounterID)
+    codesToFetch, staleCodes = getCodesToDiscover(codes, results, reportEndTimes, checkedEndTimes)
 
     count = 0
+    fetchedCodes: List[str] = []
     token = getAccessToken()
-    for code in codes:
-        if code in seenCodes:
-            continue
-
+    for code in codesToFetch:
         print(f"Fetching fights for code: {code}...")
         try:
             result = fetchFightsFromReport(token, code, encounterID, difficulty, killType)
@@ -533,8 +689,13 @@ def fetchAndSaveFights(
             print(f"Error fetching report {code!r}: {e}")
             continue
 
+        reportStartTime = result["reportData"]["report"].get("startTime")
         fightsData = result["reportData"]["report"]["fights"]
         print(f"Found {len(fightsData)} fights")
+        if code in staleCodes:
+            results = [r for r in results if r["code"] != code]
+        checkedEndTimes[code] = reportEndTimes.get(code, 0.0)
+        fetchedCodes.append(code)
 
         if len(fightsData) == 0:
             results.append({"code": code})
@@ -548,31 +709,35 @@ def fetchAndSaveFights(
                             "code": code,
                             "id": fightID,
                             "startTime": startTime,
+                            "reportStartTime": reportStartTime,
+                            "kill": fight.get("kill"),
                             "fightPercentage": fight["fightPercentage"],
                             "phaseTransitions": fight["phaseTransitions"] or None,
                         }
                     )
                     count += 1
-        seenCodes.add(code)
 
         if foundFightLimit > 0 and count >= foundFightLimit:
             print(f"Hit found fight limit of {foundFightLimit}, stopping")
             break
 
-    with open(fightsFilePath, "w") as fightsFile:
-        json.dump(results, fightsFile, indent=2)
+    writeJsonAtomic(fightsFilePath, results)
+    saveCheckedEndTimes(zoneID, difficulty, encounterID, checkedEndTimes)
+    return fetchedCodes
 
 
+@profiled()
 def fetchAndSaveFightsForDungeon(
     zoneID: int,
     dungeonEncounterID: int,
     overwriteExisting: bool = False,
     foundFightLimit: int = 0,
     reportsFilePath: Path | None = None,
-):
+) -> List[str]:
     """Fetches fights for dungeon encounters from a list of report IDs and saves the fights to the fights directory
     as a single file. Each fight entry includes dungeon pulls that are tagged with the actual encounter ID, relative
-    start time, and relative end time.
+    start time, and relative end time. Reports already in the fights file are only queried again if their end time
+    advanced since their fights were found.
 
     Args:
         zoneID (int): WarcraftLogs API zone ID for the dungeon.
@@ -581,6 +746,9 @@ def fetchAndSaveFightsForDungeon(
         foundFightLimit (int, optional): Upper limit on the number of fights to fetch. Defaults to 0.
         reportsFilePath (Path | None, optional): If specified, uses this file for report codes, otherwise defaulting to
             the default report file path for the zoneID. Defaults to None.
+
+    Returns:
+        List[str]: Codes whose fights were fetched.
     """
 
     if reportsFilePath == None:
@@ -599,14 +767,16 @@ def fetchAndSaveFightsForDungeon(
         with open(fightsFilePath) as fightsFile:
             results = json.load(fightsFile)
 
-    seenCodes: Set[str] = {r["code"] for r in results}
+    reportEndTimes = getReportEndTimes(reports)
+    checkedEndTimes = {}
+    if not overwriteExisting:
+        checkedEndTimes = loadCheckedEndTimes(zoneID, DifficultyType.Dungeon, dungeonEncounterID)
+    codesToFetch, staleCodes = getCodesToDiscover(codes, results, reportEndTimes, checkedEndTimes)
 
     count = 0
+    fetchedCodes: List[str] = []
     token = getAccessToken()
-    for code in codes:
-        if code in seenCodes:
-            continue
-
+    for code in codesToFetch:
         print(f"Fetching fights for code: {code}...")
         try:
             result = fetchDungeonFightsFromReport(token, code, dungeonEncounterID)
@@ -614,8 +784,13 @@ def fetchAndSaveFightsForDungeon(
             print(f"Error fetching report {code!r}: {e}")
             break
 
+        reportStartTime = result["reportData"]["report"].get("startTime")
         fightsData = result["reportData"]["report"]["fights"]
         print(f"Found {len(fightsData)} fights")
+        if code in staleCodes:
+            results = [r for r in results if r["code"] != code]
+        checkedEndTimes[code] = reportEndTimes.get(code, 0.0)
+        fetchedCodes.append(code)
 
         if len(fightsData) == 0:
             results.append({"code": code})
@@ -629,19 +804,20 @@ def fetchAndSaveFightsForDungeon(
                             "code": code,
                             "id": fightID,
                             "startTime": startTime,
+                            "reportStartTime": reportStartTime,
                             "keystoneLevel": fight.get("keystoneLevel"),
                             "dungeonPulls": fight.get("dungeonPulls"),
                         }
                     )
                     count += 1
-        seenCodes.add(code)
 
         if foundFightLimit > 0 and count >= foundFightLimit:
             print(f"Hit found fight limit of {foundFightLimit}, stopping")
             break
 
-    with open(fightsFilePath, "w") as fightsFile:
-        json.dump(results, fightsFile, indent=2)
+    writeJsonAtomic(fightsFilePath, results)
+    saveCheckedEndTimes(zoneID, DifficultyType.Dungeon, dungeonEncounterID, checkedEndTimes)
+    return fetchedCodes
 
 
 def fetchEvents(
@@ -679,20 +855,207 @@ def fetchEvents(
     return executeQueryWithRetry(accessToken, fetchEventsQuery, variables)
 
 
+def fetchMasterData(accessToken: str, code: str) -> Dict[str, Any]:
+    """Fetches the actors and abilities of a report, and the enemy and friendly actors of each of its fights.
+
+    Args:
+        accessToken (str): WarcraftLogs API access token.
+        code (str): Report code.
+
+    Returns:
+        Dict[str, Any]: Found master data.
+    """
+    return executeQueryWithRetry(accessToken, fetchMasterDataQuery, {"code": code})
+
+
+def fetchAndSaveMasterData(accessToken: str, code: str, overwriteExisting: bool = False) -> bool:
+    """Fetches and saves a report's master data to `masterData/{code}.json`. Master data is shared by every encounter
+    and difficulty in the report, so it is only fetched once per report.
+
+    Args:
+        accessToken (str): WarcraftLogs API access token.
+        code (str): Report code.
+        overwriteExisting (bool, optional): Whether to overwrite the master data file. Defaults to False.
+
+    Returns:
+        bool: False if fetching the master data failed.
+    """
+    if not overwriteExisting and getMasterDataFilePath(code).exists():
+        return True
+    try:
+        print(f"Fetching master data for code: {code}...")
+        result = fetchMasterData(accessToken, code)
+    except Exception as e:
+        print(f"Error fetching master data for: {code}: {e}")
+        return False
+    saveReportMasterData(createReportMasterData(code, result["reportData"]["report"]))
+    return True
+
+
+@profiled()
+def fetchAndSaveMasterDataForFights(
+    zoneID: int, encounterID: int, difficulty: DifficultyType, overwriteExisting: bool = False
+):
+    """Fetches and saves master data for every report in a fights file that doesn't have it yet.
+
+    Args:
+        zoneID (int): WarcraftLogs API zone ID for the raid or dungeon.
+        encounterID (int): Encounter ID for the boss, or the dungeon encounter ID for dungeons.
+        difficulty (DifficultyType): Difficulty type fights were filtered by.
+        overwriteExisting (bool, optional): Whether to overwrite existing master data files. Defaults to False.
+    """
+    fightsFilePath = getFightsFilePath(zoneID, difficulty, encounterID)
+    if not fightsFilePath.exists():
+        print(f"No fights file for zoneID:{zoneID}, encounterID:{encounterID}, difficulty:{difficulty}")
+        return
+
+    with open(fightsFilePath) as fightsFile:
+        fightObjects = json.load(fightsFile)
+
+    token = getAccessToken()
+    codes = dict.fromkeys(fightObject["code"] for fightObject in fightObjects if fightObject.get("code"))
+    for code in codes:
+        fetchAndSaveMasterData(token, code, overwriteExisting)
+
+
+def fetchAndSaveReportFightsEvents(
+    accessToken: str,
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    fightObjects: List[Dict[str, Any]],
+    overwriteExisting: bool = False,
+) -> bool:
+    """Fetches events for several raid fights from the same report with one paginated events query, then splits the
+    events by fight into each fight's events file.
+
+    Args:
+        accessToken (str): WarcraftLogs API access token.
+        zoneID (int): WarcraftLogs API zone ID for the raid.
+        encounterID (int): Encounter ID for the boss (Translates to dungeonEncounterID in game).
+        difficulty (DifficultyType): Difficulty type fights were filtered by.
+        fightObjects (List[Dict[str, Any]]): Fight entries from the fights file, all with the same report code.
+        overwriteExisting (bool, optional): Whether to overwrite existing events files. Defaults to False.
+
+    Returns:
+        bool: False if fetching the events failed.
+    """
+    if not overwriteExisting:
+        fightObjects = [
+            fightObject
+            for fightObject in fightObjects
+            if not isEventsFileComplete(
+                getEventsFilePath(zoneID, difficulty, encounterID, fightObject["code"], fightObject["id"])
+            )
+        ]
+    if not fightObjects:
+        return True
+
+    code = fightObjects[0]["code"]
+    fightIDs = [fightObject["id"] for fightObject in fightObjects]
+    startTime = 0.0
+    eventsData = []
+    try:
+        print(f"Fetching events for code: {code}, fightIDs: {fightIDs}...")
+        while startTime != None:
+            result = fetchEvents(accessToken, code, fightIDs, True, startTime)
+            currentEventsData = result["reportData"]["report"]["events"]["data"]
+            count = len(currentEventsData)
+            print(f"Found {count} events")
+            if count > 0:
+                eventsData.extend(currentEventsData)
+            startTime = result["reportData"]["report"]["events"]["nextPageTimestamp"]
+
+    except Exception as e:
+        print(f"Error fetching events for: {code}, fightIDs: {fightIDs}: {e}")
+        return False
+
+    # Events carry their fight ID, fall back to the latest fight started before the event
+    fightsByStartTime = sorted(fightObjects, key=lambda fightObject: fightObject["startTime"])
+    fightStartTimes = [fightObject["startTime"] for fightObject in fightsByStartTime]
+    eventsByFight: Dict[int, List[Dict[str, Any]]] = {fightID: [] for fightID in fightIDs}
+    for event in eventsData:
+        fightID = event.get("fight")
+        if fightID not in eventsByFight:
+            fightIndex = max(0, bisect_right(fightStartTimes, event["timestamp"]) - 1)
+            fightID = fightsByStartTime[fightIndex]["id"]
+        eventsByFight[fightID].append(event)
+
+    for fightObject in fightObjects:
+        fightEventsData = eventsByFight[fightObject["id"]]
+        if len(fightEventsData) > 0:
+            eventsFilePath = getEventsFilePath(zoneID, difficulty, encounterID, code, fightObject["id"])
+            writeEventsFile(eventsFilePath, {"startTime": fightObject["startTime"], "events": fightEventsData})
+    return True
+
+
+def fetchAndSaveFightEvents(
+    accessToken: str,
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    fightObject: Dict[str, Any],
+    overwriteExisting: bool = False,
+) -> bool:
+    """Fetches and saves events for a single raid fight from a fights file.
+
+    Args:
+        accessToken (str): WarcraftLogs API access token.
+        zoneID (int): WarcraftLogs API zone ID for the raid.
+        encounterID (int): Encounter ID for the boss (Translates to dungeonEncounterID in game).
+        difficulty (DifficultyType): Difficulty type fights were filtered by.
+        fightObject (Dict[str, Any]): Fight entry from the fights file.
+        overwriteExisting (bool, optional): Whether to overwrite the events file. Defaults to False.
+
+    Returns:
+        bool: False if fetching the events failed.
+    """
+    return fetchAndSaveReportFightsEvents(
+        accessToken, zoneID, encounterID, difficulty, [fightObject], overwriteExisting
+    )
+
+
+def getFightsPerEventsQuery(eventsPath: Path, maxFightsPerQuery: int = 16) -> int:
+    """Estimates how many fights fit in one page of events from the average event count of the fights already saved
+    for an encounter. Fights beyond a page still share queries, but larger batches only add memory and retry cost.
+
+    Args:
+        eventsPath (Path): Events directory of the encounter.
+        maxFightsPerQuery (int, optional): Upper limit on the number of fights per query. Defaults to 16.
+
+    Returns:
+        int: Number of fights to request per events query.
+    """
+    entries = getEventsManifest(eventsPath).entries.values()
+    eventCounts = [entry.eventCount for entry in entries if entry.eventCount > 0]
+    if not eventCounts:
+        return min(4, maxFightsPerQuery)
+    averageEventCount = sum(eventCounts) / len(eventCounts)
+    return max(1, min(maxFightsPerQuery, int(EVENTS_PAGE_LIMIT // averageEventCount)))
+
+
+@profiled()
 def fetchAndSaveEvents(
     zoneID: int,
     encounterID: int,
     difficulty: DifficultyType,
     overwriteExisting: bool = False,
+    fightSelection: FightSelection | None = None,
+    fightsPerQuery: int = 0,
 ):
     """Fetches and saves events for a raid encounter using the fights file corresponding to the zone ID, encounter ID,
-    and difficulty type. Each fight's events are saved in a separate file.
+    and difficulty type. Fights from the same report are fetched together in multi-fight events queries, and each
+    fight's events are saved in a separate file.
 
     Args:
         zoneID (int): WarcraftLogs API zone ID for the dungeon.
         encounterID (int): Encounter ID for the boss (Translates to dungeonEncounterID in game).
         difficulty (DifficultyType): Difficulty type fights were filtered by.
         overwriteExisting (bool, optional): Whether to overwrite the events files. Defaults to False.
+        fightSelection (FightSelection | None, optional): If specified, fights it doesn't match are skipped before any
+            events are requested. Defaults to None.
+        fightsPerQuery (int, optional): Number of fights from the same report to request per events query, 0 to size
+            batches to the events page limit using `getFightsPerEventsQuery`. Defaults to 0.
     """
 
     fightsFilePath = getFightsFilePath(zoneID, difficulty, encounterID)
@@ -705,44 +1068,90 @@ def fetchAndSaveEvents(
         fightObjects = json.load(fightsFile)
 
     token = getAccessToken()
+    if fightsPerQuery <= 0:
+        fightsPerQuery = getFightsPerEventsQuery(getEventsPath(zoneID, difficulty, encounterID))
 
+    fightObjectsByCode: Dict[str, List[Dict[str, Any]]] = {}
     for fightObject in fightObjects:
-        code = fightObject.get("code")
-        fightID = fightObject.get("id")
-        if not fightID:
+        if not fightObject.get("id"):
             continue
+        if fightSelection and not fightSelection.matches(fightObject):
+            continue
+        fightObjectsByCode.setdefault(fightObject["code"], []).append(fightObject)
 
-        fightStartTime = fightObject["startTime"]
-        startTime = 0.0
-        eventsData = []
-
-        eventsFilePath = getEventsFilePath(zoneID, difficulty, encounterID, code, fightID)
-        if not eventsFilePath.exists() or overwriteExisting:
-            try:
-                print(f"Fetching events for code: {code}, fightID: {fightID}...")
-                while startTime != None:
-                    result = fetchEvents(token, code, [fightID], True, startTime)
-                    currentEventsData = result["reportData"]["report"]["events"]["data"]
-                    count = len(currentEventsData)
-                    print(f"Found {count} events")
-                    if count > 0:
-                        eventsData.extend(currentEventsData)
-                    startTime = result["reportData"]["report"]["events"]["nextPageTimestamp"]
-
-            except Exception as e:
-                print(f"Error fetching events for: {code}, fightID: {fightID}: {e}")
-                continue
+    for reportFightObjects in fightObjectsByCode.values():
+        for batchStart in range(0, len(reportFightObjects), fightsPerQuery):
+            fetchAndSaveReportFightsEvents(
+                token,
+                zoneID,
+                encounterID,
+                difficulty,
+                reportFightObjects[batchStart : batchStart + fightsPerQuery],
+                overwriteExisting,
+            )
 
-        if len(eventsData) > 0:
-            with open(eventsFilePath, "w") as eventsFile:
-                json.dump({"startTime": fightStartTime, "events": eventsData}, eventsFile, indent=2)
 
+def fetchAndSaveDungeonPullEvents(
+    accessToken: str,
+    zoneID: int,
+    encounterID: int,
+    dungeonEncounterID: int,
+    fightObject: Dict[str, Any],
+    pullID: int,
+    overwriteExisting: bool = False,
+) -> bool:
+    """Fetches and saves events for a single dungeon pull from a fights file.
+
+    Args:
+        accessToken (str): WarcraftLogs API access token.
+        zoneID (int): WarcraftLogs API zone ID for the dungeon.
+        encounterID (int): Encounter ID for the boss (Translates to dungeonEncounterID in game).
+        dungeonEncounterID (int): The WarcraftLogs dungeon encounter ID (doesn't translate to anything in game?)
+        fightObject (Dict[str, Any]): Fight entry from the fights file.
+        pullID (int): One-based index of the pull in the fight's dungeon pulls.
+        overwriteExisting (bool, optional): Whether to overwrite the events file. Defaults to False.
+
+    Returns:
+        bool: False if fetching the events failed.
+    """
+    code = fightObject["code"]
+    fightID = fightObject["id"]
+    pull = fightObject["dungeonPulls"][pullID - 1]
+    startTime = pull.get("startTime")
+    endTime = pull.get("endTime")
+    eventsData = []
+    eventsFilePath = getEventsFilePathForDungeon(zoneID, dungeonEncounterID, encounterID, code, fightID, pullID)
+    if overwriteExisting or not isEventsFileComplete(eventsFilePath):
+        try:
+            print(f"Fetching events for code: {code}, fightID: {fightID}, pullID: {pullID}...")
+            nextPageTimestamp = startTime
+            while nextPageTimestamp != None:
+                result = fetchEvents(accessToken, code, [fightID], True, nextPageTimestamp, endTime)
+                currentEventsData = result["reportData"]["report"]["events"]["data"]
+                count = len(currentEventsData)
+                print(f"Found {count} events")
+                if count > 0:
+                    eventsData.extend(currentEventsData)
+                nextPageTimestamp = result["reportData"]["report"]["events"]["nextPageTimestamp"]
+
+        except Exception as e:
+            print(f"Error fetching events for: {code}, fightID: {fightID}, pullID: {pullID}: {e}")
+            return False
+
+    if len(eventsData) > 0:
+        writeEventsFile(
+            eventsFilePath, {"startTime": startTime, "endTime": endTime, "pullID": pullID, "events": eventsData}
+        )
+    return True
 
+
+@profiled()
 def fetchAndSaveEventsForDungeon(
     zoneID: int,
     encounterID: int,
     dungeonEncounterID: int,
     overwriteExisting: bool = False,
+    fightSelection: FightSelection | None = None,
 ):
     """Fetches and saves events for a dungeon encounter using the fights file corresponding to the zone ID, encounter
     ID, and dungeon encounter ID. Each fight's events are saved in a separate file.
@@ -752,6 +1161,8 @@ def fetchAndSaveEventsForDungeon(
         encounterID (int): Encounter ID for the boss (Translates to dungeonEncounterID in game).
         dungeonEncounterID (int): The WarcraftLogs dungeon encounter ID (doesn't translate to anything in game?)
         overwriteExisting (bool, optional): Whether to overwrite the events files. Defaults to False.
+        fightSelection (FightSelection | None, optional): If specified, dungeon runs it doesn't match are skipped before
+            any events are requested. Defaults to None.
     """
 
     fightsFilePath = getFightsFilePath(zoneID, DifficultyType.Dungeon, dungeonEncounterID)
@@ -767,44 +1178,72 @@ def fetchAndSaveEventsForDungeon(
     token = getAccessToken()
 
     for fightObject in fightObjects:
-        code = fightObject.get("code")
-        fightID = fightObject.get("id")
-        if not fightID:
+        if not fightObject.get("id"):
+            continue
+        if fightSelection and not fightSelection.matches(fightObject):
             continue
 
         dungeonPulls = fightObject.get("dungeonPulls")
         for pullID, pull in enumerate(dungeonPulls, start=1):
             if pull.get("encounterID") == encounterID:
-                startTime = pull.get("startTime")
-                endTime = pull.get("endTime")
-                eventsData = []
-                eventsFilePath = getEventsFilePathForDungeon(
-                    zoneID, dungeonEncounterID, encounterID, code, fightID, pullID
-                )
-                if not eventsFilePath.exists() or overwriteExisting:
-                    try:
-                        print(f"Fetching events for code: {code}, fightID: {fightID}, pullID: {pullID}...")
-                        nextPageTimestamp = startTime
-                        while nextPageTimestamp != None:
-                            result = fetchEvents(token, code, [fightID], True, nextPageTimestamp, endTime)
-                            currentEventsData = result["reportData"]["report"]["events"]["data"]
-                            count = len(currentEventsData)
-                            print(f"Found {count} events")
-                            if count > 0:
-                                eventsData.extend(currentEventsData)
-                            nextPageTimestamp = result["reportData"]["report"]["events"]["nextPageTimestamp"]
-
-                    except Exception as e:
-                        print(f"Error fetching events for: {code}, fightID: {fightID}, pullID: {pullID}: {e}")
-                        return
+                if not fetchAndSaveDungeonPullEvents(
+                    token, zoneID, encounterID, dungeonEncounterID, fightObject, pullID, overwriteExisting
+                ):
+                    return
+
 
-                if len(eventsData) > 0:
-                    with open(eventsFilePath, "w") as eventsFile:
-                        json.dump(
-                            {"startTime": startTime, "endTime": endTime, "pullID": pullID, "events": eventsData},
-                            eventsFile,
-                            indent=2,
-                        )
+def buildReportsWithFightsQuery(difficulty: DifficultyType, extendedFields: bool = True) -> str:
+    """Builds a query for a page of reports along with their fights. Only the nested fight fields needed for the
+    difficulty are selected, since each selected field adds to the query complexity of every report on the page.
+
+    Args:
+        difficulty (DifficultyType): Difficulty type the fights will be filtered by.
+        extendedFields (bool, optional): Whether to select fight fields that are not saved to fights files
+            (encounterID, name, endTime, keystoneTime). Defaults to True.
+
+    Returns:
+        str: GraphQL query string.
+    """
+    fightFields = ["id", "startTime", "fightPercentage"]
+    if difficulty == DifficultyType.Dungeon:
+        fightFields += ["keystoneLevel", "dungeonPulls { encounterID startTime endTime }"]
+    else:
+        fightFields += ["kill", "phaseTransitions { id startTime }"]
+    if extendedFields:
+        fightFields += ["encounterID", "name", "endTime"]
+        if difficulty == DifficultyType.Dungeon:
+            fightFields += ["keystoneTime"]
+
+    fightSelection = "\n".join(" " * 24 + field for field in fightFields)
+    return f"""
+    query (
+        $page: Int!
+        $zoneID: Int!
+        $encounterID: Int!
+        $difficulty: Int!
+        $killType: KillType!
+        $reportLimit: Int
+        $startTime: Float
+    ) {{
+        reportData {{
+            reports(zoneID: $zoneID, page: $page, limit: $reportLimit, startTime: $startTime) {{
+                current_page
+                data {{
+                    code
+                    startTime
+                    endTime
+                    fights(
+                        encounterID: $encounterID
+                        difficulty: $difficulty
+                        killType: $killType
+                    ) {{
+{fightSelection}
+                    }}
+                }}
+                has_more_pages
+            }}
+        }}
+    }}"""
 
 
 def fetchReportsComplex(
@@ -815,8 +1254,11 @@ def fetchReportsComplex(
     difficulty: DifficultyType,
     killType: KillType,
     reportLimit: int = 0,
+    startTime: float = 0.0,
+    extendedFields: bool = True,
 ) -> Dict[str, Any]:
-    """Currently unused due to high query complexity.
+    """Fetches a page of reports along with their fights in a single request. The query complexity grows with
+    reportLimit, so prefer `fetchReportsWithFights` which sizes reportLimit to stay under the API's complexity limit.
 
     Args:
         accessToken (str): WarcraftLogs API access token.
@@ -826,54 +1268,13 @@ def fetchReportsComplex(
         difficulty (DifficultyType): Difficulty type to filter fights by.
         killType (KillType): Kill type to filter fights by.
         reportLimit (int, optional): Upper limit on the number of reports per page. Defaults to 0.
+        startTime (float, optional): Reports will be filtered to have occurred after this time. Defaults to 0.0.
+        extendedFields (bool, optional): Whether to select fight fields that are not saved to fights files.
+            Defaults to True.
 
     Returns:
         Dict[str, Any]: Found reports
     """
-    query = """
-    query (
-        $page: Int!
-        $zoneID: Int!
-        $encounterID: Int!
-        $difficulty: Int!
-        $killType: KillType!
-        $reportLimit: Int
-    ) {
-        reportData {
-            reports(zoneID: $zoneID, page: $page, limit: $reportLimit) {
-                current_page
-                data {
-                    code
-                    startTime
-                    endTime
-                    fights(
-                        encounterID: $encounterID
-                        difficulty: $difficulty
-                        killType: $killType
-                    ) {
-                        id
-                        encounterID
-                        name
-                        startTime
-                        endTime
-                        kill
-                        fightPercentage
-                        keystoneLevel
-                        keystoneTime
-                        phaseTransitions {
-                            id
-                            startTime
-                        }
-                    }
-                }
-                from
-                to
-                per_page
-                total
-            }
-        }
-    }"""
-
     variables = {
         "page": page,
         "zoneID": zoneID,
@@ -881,6 +1282,244 @@ def fetchReportsComplex(
         "difficulty": difficulty,
         "killType": killType,
         "reportLimit": reportLimit,
+        "startTime": startTime,
     }
 
-    return executeQueryWithRetry(accessToken, query, variables)
+    return executeQueryWithRetry(accessToken, buildReportsWithFightsQuery(difficulty, extendedFields), variables)
+
+
+def isQueryComplexityError(error: Exception) -> bool:
+    return isinstance(error, TransportQueryError) and "complexity" in str(error).lower()
+
+
+@dataclass
+class QueryComplexityPlanner:
+    """Learns the largest reportLimit the API accepts for the reports with fights query. Limits are kept to powers of
+    two so that a rejected page can be split into two half-size pages covering exactly the same reports, and the
+    limit only grows at offsets that stay aligned to the larger page size.
+
+    Attributes:
+        reportLimit (int): Report limit to use for the next query.
+        ceiling (int): Smallest report limit the API has rejected, 0 if none has been rejected yet.
+        maxReportLimit (int): Upper limit on the report limit, regardless of what the API accepts.
+        successesBeforeGrowth (int): Consecutive accepted queries required before probing a larger report limit.
+        consecutiveSuccesses (int): Consecutive accepted queries at the current report limit.
+    """
+
+    reportLimit: int = 16
+    ceiling: int = 0
+    maxReportLimit: int = 64
+    successesBeforeGrowth: int = 3
+    consecutiveSuccesses: int = 0
+
+    @classmethod
+    def load(cls, key: str) -> "QueryComplexityPlanner":
+        plannerFilePath = getQueryComplexityFilePath()
+        if plannerFilePath.exists():
+            with open(plannerFilePath) as plannerFile:
+                saved = json.load(plannerFile).get(key)
+                if saved:
+                    return cls(reportLimit=saved["reportLimit"], ceiling=saved["ceiling"])
+        return cls()
+
+    def save(self, key: str):
+        plannerFilePath = getQueryComplexityFilePath()
+        allSaved = {}
+        if plannerFilePath.exists():
+            with open(plannerFilePath) as plannerFile:
+                allSaved = json.load(plannerFile)
+        allSaved[key] = {"reportLimit": self.reportLimit, "ceiling": self.ceiling}
+        writeJsonAtomic(plannerFilePath, allSaved)
+
+    def onSuccess(self, nextOffset: int):
+        self.consecutiveSuccesses += 1
+        nextLimit = self.reportLimit * 2
+        if (
+            self.consecutiveSuccesses >= self.successesBeforeGrowth
+            and nextOffset % nextLimit == 0
+            and nextLimit <= self.maxReportLimit
+            and (self.ceiling == 0 or nextLimit < self.ceiling)
+        ):
+            self.reportLimit = nextLimit
+            self.consecutiveSuccesses = 0
+
+    def onComplexityError(self):
+        self.ceiling = self.reportLimit if self.ceiling == 0 else min(self.ceiling, self.reportLimit)
+        self.reportLimit = max(1, self.reportLimit // 2)
+        self.consecutiveSuccesses = 0
+
+
+def fetchReportsWithFights(
+    accessToken: str,
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    killType: KillType,
+    maxReports: int = 1000,
+    startTime: float = 0.0,
+    planner: QueryComplexityPlanner | None = None,
+) -> List[Dict[str, Any]]:
+    """Fetches reports along with their fights, sizing each page to stay just under the API's query complexity limit.
+    When a page is rejected for complexity, it is split in half and retried. Only the fight fields saved to fights
+    files are selected.
+
+    Args:
+        accessToken (str): WarcraftLogs API access token.
+        zoneID (int): WarcraftLogs API zone ID for the raid or dungeon.
+        encounterID (int): Encounter ID for the boss or WarcraftLogs dungeon encounter ID if fetching for a dungeon.
+        difficulty (DifficultyType): Difficulty type to filter fights by.
+        killType (KillType): Kill type to filter fights by.
+        maxReports (int, optional): Upper limit on the number of reports to fetch. Defaults to 1000.
+        startTime (float, optional): Reports will be filtered to have occurred after this time. Defaults to 0.0.
+        planner (QueryComplexityPlanner | None, optional): If specified, uses this planner, otherwise loading the saved
+            planner for the difficulty. Defaults to None.
+
+    Returns:
+        List[Dict[str, Any]]: Found reports, each with its code, startTime, endTime, and fights.
+    """
+    plannerKey = f"reportsWithFights_{int(difficulty == DifficultyType.Dungeon)}"
+    if planner is None:
+        planner = QueryComplexityPlanner.load(plannerKey)
+
+    reports: List[Dict[str, Any]] = []
+    seenCodes: Set[str] = set()
+    offset = 0
+    while offset < maxReports:
+        reportLimit = planner.reportLimit
+        page = offset // reportLimit + 1
+        try:
+            print(f"Fetching reports {offset + 1}-{offset + reportLimit} (limit {reportLimit})...")
+            result = fetchReportsComplex(
+                accessToken, page, zoneID, encounterID, difficulty, killType, reportLimit, startTime, False
+            )
+        except Exception as e:
+            if not isQueryComplexityError(e):
+                print(f"An unexpected error occurred: {e}")
+                break
+            if reportLimit == 1:
+                print(f"Single report exceeds query complexity, stopping: {e}")
+                break
+            planner.onComplexityError()
+            print(f"Query too complex, splitting into pages of {planner.reportLimit}")
+            continue
+
+        reportsPage = result["reportData"]["reports"]
+        for report in reportsPage["data"]:
+            if report["code"] not in seenCodes:
+                seenCodes.add(report["code"])
+                reports.append(report)
+
+        offset += reportLimit
+        planner.onSuccess(offset)
+        if not reportsPage["has_more_pages"]:
+            print("No more pages.")
+            break
+
+    planner.save(plannerKey)
+    return reports
+
+
+@profiled()
+def fetchAndSaveReportsAndFights(
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    killType: KillType,
+    maxReports: int = 1000,
+    startTime: float = -1.0,
+    reportsFilePath: Path | None = None,
+):
+    """Fetches reports and their fights with combined queries instead of a separate request per report. New report
+    codes are added to the reports file, and fights from reports not already in the fights file are appended to it
+    in the same format as `fetchAndSaveFights` and `fetchAndSaveFightsForDungeon`.
+
+    Args:
+        zoneID (int): WarcraftLogs API zone ID for the raid or dungeon.
+        encounterID (int): Encounter ID for the boss or WarcraftLogs dungeon encounter ID if fetching for a dungeon.
+        difficulty (DifficultyType): Difficulty type to filter fights by.
+        killType (KillType): Kill type to filter fights by.
+        maxReports (int, optional): Upper limit on the number of reports to fetch. Defaults to 1000.
+        startTime (float, optional): Reports will be filtered to have occurred after this time. If not specified, uses
+            the start time saved in the reports file. Defaults to -1.0.
+        reportsFilePath (Path | None, optional): If specified, uses this file for report codes, otherwise defaulting to
+            the default report file path for the zoneID. Defaults to None.
+    """
+
+    if reportsFilePath == None:
+        reportsFilePath = getReportsFilePath(zoneID)
+
+    reportCodes: List[str] = []
+    reportTimes: Dict[str, Dict[str, float]] = {}
+    savedStartTime = 0.0
+    if reportsFilePath.exists():
+        with open(reportsFilePath) as reportsFile:
+            lastData = json.load(reportsFile)
+            reportCodes = lastData.get("codes") or []
+            reportTimes = lastData.get("reports", {})
+            savedStartTime = lastData.get("startTime", 0.0)
+    if startTime == -1.0:
+        startTime = savedStartTime
+
+    fightsFilePath = getFightsFilePath(zoneID, difficulty, encounterID)
+    results: List[Dict[str, Any]] = []
+    if fightsFilePath.exists():
+        with open(fightsFilePath) as fightsFile:
+            results = json.load(fightsFile)
+    seenCodes: Set[str] = {r["code"] for r in results}
+    checkedEndTimes = loadCheckedEndTimes(zoneID, difficulty, encounterID)
+
+    token = getAccessToken()
+    reports = fetchReportsWithFights(token, zoneID, encounterID, difficulty, killType, maxReports, startTime)
+
+    maxStartTime = max(startTime, savedStartTime)
+    for report in reports:
+        code = report["code"]
+        maxStartTime = max(maxStartTime, report["startTime"])
+        reportTimes[code] = {"startTime": report["startTime"], "endTime": report["endTime"]}
+        if code not in reportCodes:
+            reportCodes.append(code)
+        if code in seenCodes:
+            if report["endTime"] <= checkedEndTimes.setdefault(code, report["endTime"]):
+                continue
+            results = [r for r in results if r["code"] != code]
+        seenCodes.add(code)
+        checkedEndTimes[code] = report["endTime"]
+
+        fightsData = report.get("fights") or []
+        if len(fightsData) == 0:
+            results.append({"code": code})
+        for fight in fightsData:
+            fightID = fight.get("id")
+            fightStartTime = fight.get("startTime")
+            if not fightID or not fightStartTime:
+                continue
+            if difficulty == DifficultyType.Dungeon:
+                results.append(
+                    {
+                        "code": code,
+                        "id": fightID,
+                        "startTime": fightStartTime,
+                        "reportStartTime": report["startTime"],
+                        "keystoneLevel": fight.get("keystoneLevel"),
+                        "dungeonPulls": fight.get("dungeonPulls"),
+                    }
+                )
+            else:
+                results.append(
+                    {
+                        "code": code,
+                        "id": fightID,
+                        "startTime": fightStartTime,
+                        "reportStartTime": report["startTime"],
+                        "kill": fight.get("kill"),
+                        "fightPercentage": fight["fightPercentage"],
+                        "phaseTransitions": fight["phaseTransitions"] or None,
+                    }
+                )
+    print(f"Found {len(reports)} reports")
+
+    writeJsonAtomic(
+        reportsFilePath, {"zoneID": zoneID, "codes": reportCodes, "startTime": maxStartTime, "reports": reportTimes}
+    )
+    writeJsonAtomic(fightsFilePath, results)
+    saveCheckedEndTimes(zoneID, difficulty, encounterID, checkedEndTimes)
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from typing import Any, Dict
+
+
+def isKill(fightObject: Dict[str, Any]) -> bool:
+    """Whether a fights file entry is a kill. Entries saved before `kill` was recorded fall back to a boss health
+    percentage of 0."""
+    kill = fightObject.get("kill")
+    if kill is None:
+        return fightObject.get("fightPercentage") in (None, 0)
+    return bool(kill)
+
+
+def getPhaseReached(fightObject: Dict[str, Any]) -> int:
+    """The number of phases a fight reached, numbered the same way `createEncounterDataFrame` normalizes them."""
+    return max(1, len(fightObject.get("phaseTransitions") or []))
+
+
+@dataclass
+class FightSelection:
+    """Selects which fights in a fights file to fetch events for, so that fights that will never be analyzed don't
+    cost any points.
+
+    Attributes:
+        maxFightPercentage (float): Skip fights where the boss had more health remaining than this percentage. Matches
+            `minPercentage` in `createEncounterDataFrame`.
+        killsOnly (bool): Skip wipes.
+        minPhase (int): Skip fights that did not reach this phase, using the fight's phase transitions.
+        minKeystoneLevel (int): Skip dungeon runs below this keystone level.
+        maxKeystoneLevel (int): Skip dungeon runs above this keystone level, 0 for no limit.
+    """
+
+    maxFightPercentage: float = 100.0
+    killsOnly: bool = False
+    minPhase: int = 0
+    minKeystoneLevel: int = 0
+    maxKeystoneLevel: int = 0
+
+    def matches(self, fightObject: Dict[str, Any]) -> bool:
+        percentage = fightObject.get("fightPercentage")
+        if percentage and percentage > self.maxFightPercentage:
+            return False
+        if self.killsOnly and not isKill(fightObject):
+            return False
+        if self.minPhase > 1 and getPhaseReached(fightObject) < self.minPhase:
+            return False
+        keystoneLevel = fightObject.get("keystoneLevel") or 0
+        if keystoneLevel < self.minKeystoneLevel:
+            return False
+        if self.maxKeystoneLevel > 0 and keystoneLevel > self.maxKeystoneLevel:
+            return False
+        return True
@@ -1,5 +1,9 @@
 import json
 import time
+from typing import List
+
+from src.batchAnalysis import EncounterAnalysis, runBatchAnalysis
+from src.benchmarks import runBenchmarks
 from src.fetchReports import (
     fetchAndSaveEvents,
     fetchAndSaveEventsForDungeon,
@@ -10,8 +14,11 @@ from src.fetchReports import (
     fetchAndSaveFightsAsync,
 )
 from src.enums import DifficultyType, KillType
+from src.fetchQueue import EncounterTarget
 from src.processEvents import PhaseAbilityTransition, createEncounterDataFrame, printPhaseTimeStatistics
+from src.profiling import profiling
 from src.utility import createDirectoriesIfNecessary, getReportsPath
+from src.watch import watchReports
 
 
 def fetchAndSaveFightsAndEventsForManaforgeOmegaMythic():
@@ -50,6 +57,22 @@ def fetchAndSaveFightsAndEventsForManaforgeOmegaHeroic():
     fetchAndSaveEvents(44, 3134, DifficultyType.Heroic)
 
 
+def watchManaforgeOmegaMythic():
+    watchReports(
+        44,
+        [
+            EncounterTarget(44, 3129, DifficultyType.Mythic),
+            EncounterTarget(44, 3131, DifficultyType.Mythic),
+            EncounterTarget(44, 3130, DifficultyType.Mythic),
+            EncounterTarget(44, 3132, DifficultyType.Mythic),
+            EncounterTarget(44, 3122, DifficultyType.Mythic),
+            EncounterTarget(44, 3133, DifficultyType.Mythic),
+            EncounterTarget(44, 3134, DifficultyType.Mythic),
+        ],
+        KillType.Encounters,
+    )
+
+
 def fetchAndSaveFightsAndEventsForSeason3Dungeons():
     fetchAndSaveFightsForDungeon(45, 12830)
     fetchAndSaveFightsForDungeon(45, 62287)
@@ -195,136 +218,144 @@ def getAraKaraDf():
     )
 
 
+def getManaforgeOmegaAnalyses(difficultyType: DifficultyType) -> List[EncounterAnalysis]:
+    soulHuntersBuff = 1242133 if difficultyType == DifficultyType.Heroic else 1245978
+    return [
+        EncounterAnalysis(
+            "Plexus Sentinel",
+            44,
+            3129,
+            difficultyType,
+            phaseAbilities=[
+                # Comment every other phase transition to get phase durations
+                PhaseAbilityTransition(1220618, "applybuff", 0),
+                PhaseAbilityTransition(1220618, "removebuff", 0),
+                PhaseAbilityTransition(1220981, "applybuff", 0),
+                PhaseAbilityTransition(1220981, "removebuff", 0),
+                PhaseAbilityTransition(1220982, "applybuff", 0),
+                PhaseAbilityTransition(1220982, "removebuff", 0),
+            ],
+        ),
+        EncounterAnalysis(
+            "Loom'ithar",
+            44,
+            3131,
+            difficultyType,
+            phaseAbilities=[
+                PhaseAbilityTransition(1228070, "applybuff", 0),
+            ],
+        ),
+        EncounterAnalysis("Soulbinder Naazindhri", 44, 3130, difficultyType),
+        EncounterAnalysis(
+            "Forgeweaver Araz",
+            44,
+            3132,
+            difficultyType,
+            phaseAbilities=[
+                PhaseAbilityTransition(1230231, "cast", 0),
+                PhaseAbilityTransition(1235338, "cast", 0),
+                PhaseAbilityTransition(1230231, "cast", 1),
+                PhaseAbilityTransition(1235338, "cast", 1),
+            ],
+        ),
+        EncounterAnalysis(
+            "The Soul Hunters",
+            44,
+            3122,
+            difficultyType,
+            phaseAbilities=[
+                PhaseAbilityTransition(soulHuntersBuff, "applybuff", 1),
+                PhaseAbilityTransition(soulHuntersBuff, "removebuff", 1),
+                PhaseAbilityTransition(soulHuntersBuff, "applybuff", 3),
+                PhaseAbilityTransition(soulHuntersBuff, "removebuff", 3),
+                PhaseAbilityTransition(soulHuntersBuff, "applybuff", 5),
+                PhaseAbilityTransition(soulHuntersBuff, "removebuff", 5),
+            ],
+            ignorePhaseTransitions=True,
+        ),
+        EncounterAnalysis("Fractillus", 44, 3133, difficultyType),
+        EncounterAnalysis(
+            "Nexus-King Salhadaar",
+            44,
+            3134,
+            difficultyType,
+            phaseAbilities=[
+                PhaseAbilityTransition(1227734, "cast", 0),  # Coalesce Voidwing
+                PhaseAbilityTransition(1228065, "cast", 0),  # Rally the Shadowguard
+                PhaseAbilityTransition(1228265, "applybuff", 0),  # King's Hunger
+                PhaseAbilityTransition(1228265, "removebuff", 0),  # King's Hunger
+            ],
+        ),
+        EncounterAnalysis(
+            "Dimensius",
+            44,
+            3135,
+            difficultyType,
+            phaseAbilities=[
+                PhaseAbilityTransition(1234898, "cast", 0),  # Event Horizon
+                PhaseAbilityTransition(1237689, "removebuff", 0),  # Void Shell
+                PhaseAbilityTransition(1237689, "removebuff", 1),  # Void Shell
+                PhaseAbilityTransition(1245292, "applydebuff", 0),  # Destabilized
+            ],
+            ignorePhaseTransitions=True,
+            minPercentage=30,
+        ),
+    ]
+
+
+def getManaforgeOmegaDf(encounterID: int, difficultyType: DifficultyType):
+    for analysis in getManaforgeOmegaAnalyses(difficultyType):
+        if analysis.encounterID == encounterID:
+            return analysis.createDataFrame()
+    raise LookupError(f"No analysis configured for encounter {encounterID}")
+
+
 def getPlexusSentinelDf(difficultyType: DifficultyType):
-    return createEncounterDataFrame(
-        44,
-        3129,
-        difficultyType,
-        0,
-        [],
-        [
-            # Comment every other phase transition to get phase durations
-            PhaseAbilityTransition(1220618, "applybuff", 0),
-            PhaseAbilityTransition(1220618, "removebuff", 0),
-            PhaseAbilityTransition(1220981, "applybuff", 0),
-            PhaseAbilityTransition(1220981, "removebuff", 0),
-            PhaseAbilityTransition(1220982, "applybuff", 0),
-            PhaseAbilityTransition(1220982, "removebuff", 0),
-        ],
-    )
+    return getManaforgeOmegaDf(3129, difficultyType)
 
 
 def getLoomitharDf(difficultyType: DifficultyType):
-    return createEncounterDataFrame(
-        44,
-        3131,
-        difficultyType,
-        0,
-        [],
-        [
-            PhaseAbilityTransition(1228070, "applybuff", 0),
-        ],
-    )
+    return getManaforgeOmegaDf(3131, difficultyType)
 
 
 def getSoulbinderNaazindhriDf(difficultyType: DifficultyType):
-    return createEncounterDataFrame(44, 3130, difficultyType)
+    return getManaforgeOmegaDf(3130, difficultyType)
 
 
 def getForgeweaverArazDf(difficultyType: DifficultyType):
-    return createEncounterDataFrame(
-        44,
-        3132,
-        difficultyType,
-        0,
-        [],
-        [
-            PhaseAbilityTransition(1230231, "cast", 0),
-            PhaseAbilityTransition(1235338, "cast", 0),
-            PhaseAbilityTransition(1230231, "cast", 1),
-            PhaseAbilityTransition(1235338, "cast", 1),
-        ],
-    )
+    return getManaforgeOmegaDf(3132, difficultyType)
 
 
 def getSoulHuntersDf(difficultyType: DifficultyType):
-    if difficultyType == DifficultyType.Heroic:
-        return createEncounterDataFrame(
-            44,
-            3122,
-            difficultyType,
-            0,
-            [],
-            [
-                PhaseAbilityTransition(1242133, "applybuff", 1),
-                PhaseAbilityTransition(1242133, "removebuff", 1),
-                PhaseAbilityTransition(1242133, "applybuff", 3),
-                PhaseAbilityTransition(1242133, "removebuff", 3),
-                PhaseAbilityTransition(1242133, "applybuff", 5),
-                PhaseAbilityTransition(1242133, "removebuff", 5),
-            ],
-            True,
-        )
-    else:
-        return createEncounterDataFrame(
-            44,
-            3122,
-            difficultyType,
-            0,
-            [],
-            [
-                PhaseAbilityTransition(1245978, "applybuff", 1),
-                PhaseAbilityTransition(1245978, "removebuff", 1),
-                PhaseAbilityTransition(1245978, "applybuff", 3),
-                PhaseAbilityTransition(1245978, "removebuff", 3),
-                PhaseAbilityTransition(1245978, "applybuff", 5),
-                PhaseAbilityTransition(1245978, "removebuff", 5),
-            ],
-            True,
-        )
+    return getManaforgeOmegaDf(3122, difficultyType)
 
 
 def getFractillusDf(difficultyType: DifficultyType):
-    return createEncounterDataFrame(44, 3133, difficultyType)
+    return getManaforgeOmegaDf(3133, difficultyType)
 
 
 def getNexusKingSalhadaarDf(difficultyType: DifficultyType):
-    return createEncounterDataFrame(
-        44,
-        3134,
-        difficultyType,
-        0,
-        [],
-        [
-            PhaseAbilityTransition(1227734, "cast", 0),  # Coalesce Voidwing
-            PhaseAbilityTransition(1228065, "cast", 0),  # Rally the Shadowguard
-            PhaseAbilityTransition(1228265, "applybuff", 0),  # King's Hunger
-            PhaseAbilityTransition(1228265, "removebuff", 0),  # King's Hunger
-        ],
-    )
+    return getManaforgeOmegaDf(3134, difficultyType)
 
 
 def getDimDf(difficultyType: DifficultyType):
-    return createEncounterDataFrame(
-        44,
-        3135,
-        difficultyType,
-        0,
-        [],
-        [
-            PhaseAbilityTransition(1234898, "cast", 0),  # Event Horizon
-            PhaseAbilityTransition(1237689, "removebuff", 0),  # Void Shell
-            PhaseAbilityTransition(1237689, "removebuff", 1),  # Void Shell
-            PhaseAbilityTransition(1245292, "applydebuff", 0),  # Destabilized
-        ],
-        True,
-        30,
+    return getManaforgeOmegaDf(3135, difficultyType)
+
+
+def analyzeManaforgeOmega():
+    runBatchAnalysis(
+        getManaforgeOmegaAnalyses(DifficultyType.Heroic) + getManaforgeOmegaAnalyses(DifficultyType.Mythic),
+        formats=["json", "csv"],
     )
 
 
 if __name__ == "__main__":
     createDirectoriesIfNecessary()
-    #fetchAndSaveReports(44, 100, 20)
-    #fetchAndSaveFights(44, 3134, DifficultyType.Mythic, KillType.Kills, True, 1)
-    fetchAndSaveEvents(44, 3134, DifficultyType.Mythic, True)
-    # printPhaseTimeStatistics(getSoulHuntersDf(DifficultyType.Heroic), False, False, True)
+    # Set enabled=True to time every stage of the run into temp/profiles, captureProfiles=True adds cProfile stats
+    with profiling(enabled=False, memory="rss", captureProfiles=False):
+        #fetchAndSaveReports(44, 100, 20)
+        #fetchAndSaveFights(44, 3134, DifficultyType.Mythic, KillType.Kills, True, 1)
+        fetchAndSaveEvents(44, 3134, DifficultyType.Mythic, True)
+        # printPhaseTimeStatistics(getSoulHuntersDf(DifficultyType.Heroic), False, False, True)
+        # analyzeManaforgeOmega()
+        # runBenchmarks(["small", "medium"])
@@ -0,0 +1,222 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Set
+
+import pandas as pd
+
+from src.utility import getMasterDataFilePath, writeJsonAtomic
+
+
+@dataclass
+class ReportActor:
+    """An actor from a report's master data.
+
+    Attributes:
+        id (int): Report-specific actor ID, matches `sourceID` and `targetID` in events.
+        gameID (int): NPC ID in game, 0 for players.
+        name (str): Actor name.
+        type (str): "Player", "NPC", or "Pet".
+        subType (str): Class for players, "Boss" or "NPC" for NPCs.
+        petOwner (int): Actor ID of the owner of a pet, 0 if the actor is not a pet.
+        disposition (str): "friendly" or "enemy" from the report's fights, "unknown" if the actor is not listed in any.
+    """
+
+    id: int
+    gameID: int
+    name: str
+    type: str
+    subType: str
+    petOwner: int
+    disposition: str
+
+    @property
+    def isBoss(self) -> bool:
+        return self.type == "NPC" and self.subType == "Boss"
+
+
+@dataclass
+class ReportAbility:
+    """An ability from a report's master data.
+
+    Attributes:
+        gameID (int): Spell ID in game, matches `abilityGameID` in events.
+        name (str): Ability name.
+        icon (str): Icon file name.
+        type (int): School of the ability.
+    """
+
+    gameID: int
+    name: str
+    icon: str
+    type: int
+
+
+class ReportMasterData:
+    """Actors and abilities of a single report, used to enrich events without further API calls."""
+
+    def __init__(self, code: str, actors: List[ReportActor], abilities: List[ReportAbility]):
+        self.code = code
+        self.actors: Dict[int, ReportActor] = {actor.id: actor for actor in actors}
+        self.abilities: Dict[int, ReportAbility] = {ability.gameID: ability for ability in abilities}
+
+    def toJson(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "actors": [asdict(actor) for actor in self.actors.values()],
+            "abilities": [asdict(ability) for ability in self.abilities.values()],
+        }
+
+    @classmethod
+    def fromJson(cls, data: Dict[str, Any]) -> "ReportMasterData":
+        return cls(
+            data["code"],
+            [ReportActor(**actor) for actor in data["actors"]],
+            [ReportAbility(**ability) for ability in data["abilities"]],
+        )
+
+
+def createReportMasterData(code: str, report: Dict[str, Any]) -> ReportMasterData:
+    """Creates master data from a `fetchMasterData` response. Dispositions come from the enemy and friendly actor lists
+    of the report's fights, pets not listed in any fight take their owner's disposition.
+
+    Args:
+        code (str): Report code.
+        report (Dict[str, Any]): `reportData.report` from the response.
+
+    Returns:
+        ReportMasterData: Master data of the report.
+    """
+    enemyIDs: Set[int] = set()
+    friendlyIDs: Set[int] = set()
+    for fight in report.get("fights") or []:
+        for key, ids in (
+            ("enemyNPCs", enemyIDs),
+            ("enemyPets", enemyIDs),
+            ("friendlyNPCs", friendlyIDs),
+            ("friendlyPets", friendlyIDs),
+        ):
+            ids.update(actor["id"] for actor in fight.get(key) or [])
+
+    masterData = report.get("masterData") or {}
+    rawActors = masterData.get("actors") or []
+    dispositions: Dict[int, str] = {}
+    for actor in rawActors:
+        if actor["id"] in enemyIDs:
+            dispositions[actor["id"]] = "enemy"
+        elif actor["id"] in friendlyIDs or actor.get("type") == "Player":
+            dispositions[actor["id"]] = "friendly"
+
+    actors: List[ReportActor] = []
+    for actor in rawActors:
+        petOwner = actor.get("petOwner") or 0
+        actors.append(
+            ReportActor(
+                id=actor["id"],
+                gameID=actor.get("gameID") or 0,
+                name=actor.get("name") or "",
+                type=actor.get("type") or "",
+                subType=actor.get("subType") or "",
+                petOwner=petOwner,
+                disposition=dispositions.get(actor["id"], dispositions.get(petOwner, "unknown")),
+            )
+        )
+
+    abilities = [
+        ReportAbility(
+            gameID=ability["gameID"],
+            name=ability.get("name") or "",
+            icon=ability.get("icon") or "",
+            type=int(ability.get("type") or 0),
+        )
+        for ability in masterData.get("abilities") or []
+    ]
+    return ReportMasterData(code, actors, abilities)
+
+
+def saveReportMasterData(masterData: ReportMasterData):
+    writeJsonAtomic(getMasterDataFilePath(masterData.code), masterData.toJson())
+
+
+loadedMasterData: Dict[str, ReportMasterData] = {}
+
+
+def loadReportMasterData(code: str) -> ReportMasterData | None:
+    """Loads a report's master data from the cache, once per process.
+
+    Args:
+        code (str): Report code.
+
+    Returns:
+        ReportMasterData | None: None if the report's master data has not been fetched.
+    """
+    if code not in loadedMasterData:
+        masterDataFilePath = getMasterDataFilePath(code)
+        if masterDataFilePath.exists():
+            with open(masterDataFilePath) as masterDataFile:
+                loadedMasterData[code] = ReportMasterData.fromJson(json.load(masterDataFile))
+        else:
+            return None
+    return loadedMasterData[code]
+
+
+def getAbilityNames(codes: Iterable[str]) -> Dict[int, str]:
+    """Collects ability names from the cached master data of the given reports.
+
+    Args:
+        codes (Iterable[str]): Report codes, reports without cached master data are skipped.
+
+    Returns:
+        Dict[int, str]: Ability name by ability ID.
+    """
+    abilityNames: Dict[int, str] = {}
+    for code in set(codes):
+        masterData = loadReportMasterData(code)
+        if masterData is None:
+            continue
+        for abilityID, ability in masterData.abilities.items():
+            if ability.name:
+                abilityNames.setdefault(abilityID, ability.name)
+    return abilityNames
+
+
+def formatAbility(abilityID: int, abilityNames: Dict[int, str]) -> str:
+    """Formats an ability ID with its name when it is known, e.g. "1227734 (Coalesce Voidwing)"."""
+    name = abilityNames.get(abilityID)
+    return f"{abilityID} ({name})" if name else str(abilityID)
+
+
+def enrichEncounterDataFrame(dataFrame: pd.DataFrame) -> pd.DataFrame:
+    """Adds source actor and ability columns to a DataFrame from `createEncounterDataFrame` using cached master data.
+    Events from reports without cached master data get empty values.
+
+    Args:
+        dataFrame (pd.DataFrame): DataFrame returned by `createEncounterDataFrame`.
+
+    Returns:
+        pd.DataFrame: A copy with `sourceGameID`, `sourceName`, `sourceDisposition`, `sourceIsBoss`, and `abilityName`
+        columns.
+    """
+    enriched = dataFrame.copy()
+    if enriched.empty:
+        for column in ["sourceGameID", "sourceName", "sourceDisposition", "sourceIsBoss", "abilityName"]:
+            enriched[column] = pd.Series(dtype=object)
+        return enriched
+
+    rows = []
+    for code in enriched["fightCode"].unique():
+        masterData = loadReportMasterData(code)
+        if masterData is None:
+            continue
+        for actor in masterData.actors.values():
+            rows.append([code, actor.id, actor.gameID, actor.name, actor.disposition, actor.isBoss])
+    actors = pd.DataFrame(
+        rows, columns=["fightCode", "sourceID", "sourceGameID", "sourceName", "sourceDisposition", "sourceIsBoss"]
+    )
+    enriched = enriched.merge(actors, on=["fightCode", "sourceID"], how="left")
+    enriched.index = dataFrame.index
+    enriched["sourceGameID"] = enriched["sourceGameID"].fillna(0).astype(int)
+    enriched["sourceName"] = enriched["sourceName"].fillna("")
+    enriched["sourceDisposition"] = enriched["sourceDisposition"].fillna("unknown")
+    enriched["sourceIsBoss"] = enriched["sourceIsBoss"].eq(True)
+    enriched["abilityName"] = enriched["abilityID"].map(getAbilityNames(enriched["fightCode"].unique())).fillna("")
+    return enriched
@@ -0,0 +1,193 @@
+import html
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from src.profiling import profiled
+from src.utility import getPlotsPath, writeFileAtomic
+
+CHART_SIZE = (8.0, 5.0)
+CHART_DPI = 100
+# Fixed margins instead of `tight_layout`, which draws every chart an extra time to measure it
+CHART_MARGINS = {"left": 0.08, "right": 0.97, "bottom": 0.1, "top": 0.93}
+# Fast PNG compression, charts are mostly flat colors and barely grow
+PNG_COMPRESS_LEVEL = 1
+# Charts rendered per process pool task, so workers aren't sent one small task per chart
+CHARTS_PER_TASK = 16
+INDEX_FILE_NAME = "index.html"
+
+
+@dataclass
+class AbilityCastTimesChart:
+    """Cast times of one ability, phase, and type, drawn as the average and standard deviation of each cast.
+
+    Attributes:
+        abilityID (int): Ability ID.
+        abilityName (str): Ability name, empty if unknown.
+        phase (int): Phase of the casts.
+        type (str): Event type of the casts.
+        castIndices (np.ndarray): Cast index of each cast.
+        means (np.ndarray): Average phaseTime of each cast.
+        standardDeviations (np.ndarray): Standard deviation of each cast's phaseTime.
+    """
+
+    abilityID: int
+    abilityName: str
+    phase: int
+    type: str
+    castIndices: np.ndarray
+    means: np.ndarray
+    standardDeviations: np.ndarray
+
+    def getFileName(self, chartFormat: str = "png") -> str:
+        return f"{self.abilityID}_{self.phase}_{self.type}.{chartFormat}"
+
+    def getTitle(self) -> str:
+        ability = f"{self.abilityID} ({self.abilityName})" if self.abilityName else str(self.abilityID)
+        return f"Ability: {ability} Phase: {self.phase} Type: {self.type}"
+
+
+def getAbilityCastTimesCharts(
+    phaseTimeStatistics: pd.DataFrame, abilityNames: Dict[int, str] = {}
+) -> List[AbilityCastTimesChart]:
+    """Splits phase time statistics into one chart per ability, phase, and type.
+
+    Args:
+        phaseTimeStatistics (pd.DataFrame): DataFrame returned by `aggregatePhaseTimeStatistics`.
+        abilityNames (Dict[int, str], optional): Ability names from `getAbilityNames`. Defaults to {}.
+
+    Returns:
+        List[AbilityCastTimesChart]: Charts sorted by `abilityID`, `phase`, and `type`.
+    """
+    statistics = phaseTimeStatistics.assign(type=phaseTimeStatistics["type"].astype(str))
+    statistics = statistics.sort_values(["abilityID", "phase", "type", "castIndex"], kind="stable")
+    return [
+        AbilityCastTimesChart(
+            int(abilityID),
+            abilityNames.get(int(abilityID), ""),
+            int(phase),
+            str(type),
+            group["castIndex"].to_numpy(),
+            group["mean"].to_numpy(),
+            group["std"].to_numpy(),
+        )
+        for (abilityID, phase, type), group in statistics.groupby(["abilityID", "phase", "type"], sort=False)
+    ]
+
+
+def renderAbilityCastTimes(chart: AbilityCastTimesChart, chartFilePath: Path):
+    """Renders a chart with the Agg backend into its own figure, which isn't registered with pyplot and is released
+    once rendered, and saves it in the format given by the file extension."""
+    figure = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.errorbar(
+        chart.means,
+        chart.castIndices,
+        xerr=chart.standardDeviations,
+        fmt="o",  # circle marker
+        ecolor="gray",  # error bar color
+        elinewidth=2,
+        capsize=4,  # little bar on end of error line
+        label="Avg ± Std Dev",
+    )
+    axes.set_title(chart.getTitle())
+    axes.set_xlabel("Avg Cast Time (s)")
+    axes.set_ylabel("Cast Index")
+    axes.grid(True)
+    # Later casts have later times, so the upper left corner is empty, and searching for the best location is slow
+    axes.legend(loc="upper left")
+    figure.subplots_adjust(**CHART_MARGINS)
+
+    buffer = io.BytesIO()
+    chartFormat = chartFilePath.suffix[1:].lower()
+    pngOptions = {"compress_level": PNG_COMPRESS_LEVEL} if chartFormat == "png" else None
+    figure.savefig(buffer, format=chartFormat, pil_kwargs=pngOptions)
+    writeFileAtomic(chartFilePath, buffer.getvalue())
+
+
+def renderAbilityCastTimesCharts(charts: List[AbilityCastTimesChart], outputPath: Path, chartFormat: str):
+    """Renders charts into a directory. Runs in worker processes when rendering in parallel."""
+    for chart in charts:
+        renderAbilityCastTimes(chart, outputPath / chart.getFileName(chartFormat))
+
+
+def formatChartsIndex(charts: List[AbilityCastTimesChart], chartFormat: str, title: str) -> str:
+    """Formats an HTML page showing every chart, with a heading per ability."""
+    lines = [
+        "<!DOCTYPE html>",
+        "<html>",
+        f'<head><meta charset="utf-8"><title>{html.escape(title)}</title></head>',
+        "<body>",
+        f"<h1>{html.escape(title)}</h1>",
+    ]
+    previousAbilityID = None
+    for chart in charts:
+        if chart.abilityID != previousAbilityID:
+            ability = f"{chart.abilityID} ({chart.abilityName})" if chart.abilityName else str(chart.abilityID)
+            lines.append(f'<h2 id="{chart.abilityID}">Ability {html.escape(ability)}</h2>')
+            previousAbilityID = chart.abilityID
+        fileName = html.escape(chart.getFileName(chartFormat))
+        lines.append(f'<img src="{fileName}" alt="{html.escape(chart.getTitle())}" loading="lazy">')
+    lines.extend(["</body>", "</html>", ""])
+    return "\n".join(lines)
+
+
+@profiled()
+def plotPhaseTimeStatistics(
+    phaseTimeStatistics: pd.DataFrame,
+    outputPath: Path | None = None,
+    abilityNames: Dict[int, str] = {},
+    chartFormat: str = "png",
+    workers: int = 0,
+    title: str = "Ability cast times",
+) -> Path:
+    """Renders the cast times chart of every ability, phase, and type in phase time statistics, along with an index
+    page showing all of them. Charts are named `{abilityID}_{phase}_{type}.{chartFormat}`, so rendering again replaces
+    them, and are rendered across a process pool in batches.
+
+    Args:
+        phaseTimeStatistics (pd.DataFrame): DataFrame returned by `aggregatePhaseTimeStatistics`.
+        outputPath (Path | None, optional): Directory to write charts to. Defaults to `temp/plots`.
+        abilityNames (Dict[int, str], optional): Ability names from `getAbilityNames`. Defaults to {}.
+        chartFormat (str, optional): Image format supported by matplotlib, e.g. "png" or "svg". Defaults to "png".
+        workers (int, optional): Number of worker processes, 0 for one per CPU, 1 to render in this process. Defaults
+            to 0.
+        title (str, optional): Title of the index page. Defaults to "Ability cast times".
+
+    Returns:
+        Path: Path of the index page.
+    """
+    outputPath = outputPath or getPlotsPath()
+    outputPath.mkdir(parents=True, exist_ok=True)
+    charts = getAbilityCastTimesCharts(phaseTimeStatistics, abilityNames)
+    tasks = [charts[start : start + CHARTS_PER_TASK] for start in range(0, len(charts), CHARTS_PER_TASK)]
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    rendered = False
+    if workers > 1 and len(tasks) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+                list(executor.map(renderAbilityCastTimesCharts, tasks, repeat(outputPath), repeat(chartFormat)))
+            rendered = True
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Parallel rendering failed, rendering serially: {e}")
+    if not rendered:
+        for task in tasks:
+            renderAbilityCastTimesCharts(task, outputPath, chartFormat)
+
+    indexFilePath = outputPath / INDEX_FILE_NAME
+    writeFileAtomic(indexFilePath, formatChartsIndex(charts, chartFormat, title).encode())
+    print(f"Rendered {len(charts)} charts to {outputPath}")
+    return indexFilePath
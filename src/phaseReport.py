@@ -0,0 +1,179 @@
+import io
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.profiling import profiled
+from src.utility import writeFileAtomic
+
+GROUP_KEYS = ["abilityID", "phase", "type"]
+AVERAGE_CAST_TIMES_LABELS = ["Count", "Std Dev", "Avg Cast Time"]
+AVERAGE_CAST_TIMES_LABEL_WIDTH = max(len(label) for label in AVERAGE_CAST_TIMES_LABELS)
+
+
+@profiled()
+def buildPhaseTimeReport(phaseTimeStatistics: pd.DataFrame, abilityNames: Dict[int, str] = {}) -> pd.DataFrame:
+    """Adds the derived report columns to phase time statistics in a single pass over all groups.
+
+    Args:
+        phaseTimeStatistics (pd.DataFrame): DataFrame returned by `aggregatePhaseTimeStatistics`.
+        abilityNames (Dict[int, str], optional): Ability names from `getAbilityNames`. Defaults to {}.
+
+    Returns:
+        pd.DataFrame: Statistics sorted by `abilityID`, `phase`, `type`, `castIndex`, with `abilityName`, `cv` (NaN when
+        the mean is 0), and `averageCastTime` (time since the previous cast of the same ability, phase, and type)
+        columns.
+    """
+    report = phaseTimeStatistics.copy()
+    report["type"] = report["type"].astype(str)
+    report = report.sort_values(GROUP_KEYS + ["castIndex"], kind="stable").reset_index(drop=True)
+    report.insert(1, "abilityName", report["abilityID"].map(abilityNames).fillna("").astype(str))
+    report["count"] = report["count"].astype(np.int64)
+    report["cv"] = (report["std"] / report["mean"]).where(report["mean"] != 0)
+    previousMean = report.groupby(GROUP_KEYS, sort=False)["mean"].shift()
+    report["averageCastTime"] = report["mean"] - previousMean.fillna(0.0)
+    return report
+
+
+def formatNumbers(values: pd.Series) -> pd.Series:
+    return values.map("{:.1f}".format)
+
+
+def getAbilityLabels(report: pd.DataFrame) -> pd.Series:
+    """Labels abilities like `formatAbility`."""
+    names = report["abilityName"]
+    return report["abilityID"].astype(str) + (" (" + names + ")").where(names != "", "")
+
+
+def getGroupStarts(report: pd.DataFrame, keys) -> pd.Series:
+    changed = pd.Series(False, index=report.index)
+    for key in keys:
+        changed |= report[key].ne(report[key].shift())
+    return changed
+
+
+@profiled()
+def formatAbilityUsage(report: pd.DataFrame) -> str:
+    """Formats the number of distinct casts of each ability and type across all phases."""
+    usage = report.assign(abilityLabel=getAbilityLabels(report))
+    usage = usage.groupby(["abilityID", "type"], sort=True).agg(
+        abilityLabel=("abilityLabel", "first"), uses=("castIndex", "nunique")
+    )
+    lines = "Ability " + usage["abilityLabel"] + " " + usage.index.get_level_values("type") + ": used "
+    return "\n".join(lines + usage["uses"].astype(str) + " times")
+
+
+@profiled()
+def formatDetailedCasts(report: pd.DataFrame) -> str:
+    """Formats every cast's statistics below ability, phase, and type headings."""
+    if report.empty:
+        return ""
+    newAbility = getGroupStarts(report, ["abilityID"])
+    newPhase = getGroupStarts(report, ["abilityID", "phase"])
+    newType = getGroupStarts(report, GROUP_KEYS)
+
+    abilityHeadings = ("\nAbility " + getAbilityLabels(report) + ":\n").where(newAbility, "")
+    phaseHeadings = ("  Phase " + report["phase"].astype(str) + ":\n").where(newPhase, "")
+    typeHeadings = ("    Type " + report["type"] + ":\n").where(newType, "")
+    castLines = (
+        "      Cast #"
+        + report["castIndex"].astype(str)
+        + ": count="
+        + report["count"].astype(str)
+        + ", avg="
+        + formatNumbers(report["mean"])
+        + ", std_dev="
+        + formatNumbers(report["std"])
+        + ", cv="
+        + formatNumbers(report["cv"])
+        + ", min="
+        + formatNumbers(report["min"])
+        + ", max="
+        + formatNumbers(report["max"])
+    )
+    return "\n".join(abilityHeadings + phaseHeadings + typeHeadings + castLines)
+
+
+@profiled()
+def formatAverageCastTimes(report: pd.DataFrame) -> str:
+    """Formats a table per ability, phase, and type with a column per cast. The average cast time row is comma
+    separated so it can be copied as a list."""
+    if report.empty:
+        return ""
+    cells = [formatNumbers(report[column].astype(float)) for column in ["count", "std", "averageCastTime"]]
+    widths = pd.concat([cell.str.len() for cell in cells], axis=1).max(axis=1)
+    columns = pd.DataFrame(
+        {
+            "separator": widths.map(lambda width: "-" * (width + 2)),
+            "count": [f" {cell:>{width}} " for cell, width in zip(cells[0], widths)],
+            "std": [f" {cell:>{width}} " for cell, width in zip(cells[1], widths)],
+            "averageCastTime": [f" {cell:>{width}} " for cell, width in zip(cells[2], widths)],
+            "abilityLabel": getAbilityLabels(report),
+        }
+    )
+    for key in GROUP_KEYS:
+        columns[key] = report[key]
+
+    grouped = columns.groupby(GROUP_KEYS, sort=False)
+    tables = grouped.agg(
+        abilityLabel=("abilityLabel", "first"),
+        separator=("separator", "|".join),
+        count=("count", "|".join),
+        std=("std", "|".join),
+        averageCastTime=("averageCastTime", ",".join),
+    ).reset_index()
+
+    def labelCell(label: str) -> str:
+        return f" {label:<{AVERAGE_CAST_TIMES_LABEL_WIDTH}} "
+
+    countLabel, stdLabel, averageCastTimeLabel = [labelCell(label) for label in AVERAGE_CAST_TIMES_LABELS]
+    text = (
+        "\n| Ability "
+        + tables["abilityLabel"]
+        + " - Phase "
+        + tables["phase"].astype(str)
+        + " - Type "
+        + tables["type"]
+        + " |\n|"
+        + "-" * (AVERAGE_CAST_TIMES_LABEL_WIDTH + 2)
+        + "|"
+        + tables["separator"]
+        + "|\n|"
+        + countLabel
+        + "|"
+        + tables["count"]
+        + "|\n|"
+        + stdLabel
+        + "|"
+        + tables["std"]
+        + "|\n|"
+        + averageCastTimeLabel
+        + ","
+        + tables["averageCastTime"]
+        + "|\n"
+    )
+    return "".join(text)
+
+
+@profiled()
+def savePhaseTimeReport(report: pd.DataFrame, path: Path):
+    """Saves a report from `buildPhaseTimeReport` with a row per cast, in the format given by the file extension.
+
+    Args:
+        report (pd.DataFrame): DataFrame returned by `buildPhaseTimeReport`.
+        path (Path): A .json (list of records), .csv, or .parquet file path. Parquet requires pyarrow or fastparquet.
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        contents = report.to_json(orient="records", indent=2).encode()
+    elif suffix == ".csv":
+        contents = report.to_csv(index=False).encode()
+    elif suffix == ".parquet":
+        buffer = io.BytesIO()
+        report.to_parquet(buffer, index=False)
+        contents = buffer.getvalue()
+    else:
+        raise ValueError(f"Unsupported report format {path.suffix}, use .json, .csv, or .parquet")
+    writeFileAtomic(path, contents)
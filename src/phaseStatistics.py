@@ -0,0 +1,423 @@
+import hashlib
+import io
+import json
+from dataclasses import asdict
+from pathlib import Path
+from typing import List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.confidenceIntervals import computeConfidenceBounds
+from src.enums import DifficultyType
+from src.eventsDecoder import EventFilter
+from src.eventsManifest import filterCompleteEventsFiles
+from src.processEvents import (
+    PhaseAbilityTransition,
+    compilePhaseTriggers,
+    createEventsCache,
+    finalizeEncounterDataFrame,
+    getFightEventsFiles,
+    loadEncounterFights,
+    loadFightEventsFiles,
+)
+from src.profiling import profiled
+from src.utility import getPhaseStatisticsFilePath, writeFileAtomic
+
+PHASE_STATISTICS_VERSION = 2
+STATISTICS_KEYS = ["abilityID", "phase", "type", "castIndex"]
+FIGHT_KEYS = ["fightCode", "fightID", "pullID"]
+# Fights per batch when aggregating out of core, a few hundred MB for typical raid fights
+DEFAULT_BATCH_FIGHTS = 50
+
+
+def createEmptyMoments() -> pd.DataFrame:
+    index = pd.MultiIndex.from_arrays(
+        [
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=object),
+            np.empty(0, dtype=np.int64),
+        ],
+        names=STATISTICS_KEYS,
+    )
+    return pd.DataFrame(
+        {
+            "count": np.empty(0, dtype=np.int64),
+            "sum": np.empty(0),
+            "mean": np.empty(0),
+            "m2": np.empty(0),
+            "min": np.empty(0),
+            "max": np.empty(0),
+        },
+        index=index,
+    )
+
+
+def computeMoments(dataFrame: pd.DataFrame) -> pd.DataFrame:
+    """Computes the count, sum, mean, sum of squared deviations from the mean (M2), minimum, and maximum phaseTime of
+    each (abilityID, phase, type, castIndex) group. Sums of float32 phaseTimes are exact in float64, so means computed
+    from merged sums don't depend on how fights were split.
+
+    Args:
+        dataFrame (pd.DataFrame): DataFrame returned by `createEncounterDataFrame`.
+
+    Returns:
+        pd.DataFrame: Moments indexed by `abilityID`, `phase`, `type`, `castIndex`.
+    """
+    if dataFrame.empty:
+        return createEmptyMoments()
+
+    keys = [
+        dataFrame[key].astype(str) if key == "type" else dataFrame[key].astype(np.int64) for key in STATISTICS_KEYS
+    ]
+    grouped = dataFrame["phaseTime"].astype(np.float64).groupby(keys, observed=True)
+    moments = grouped.agg(["count", "sum", "mean", "min", "max"])
+    moments["count"] = moments["count"].astype(np.int64)
+    moments["m2"] = grouped.var(ddof=0) * moments["count"]
+    return moments[["count", "sum", "mean", "m2", "min", "max"]]
+
+
+def mergeMoments(first: pd.DataFrame, second: pd.DataFrame) -> pd.DataFrame:
+    """Combines the moments of two disjoint sets of fights with Chan's parallel variant of Welford's algorithm, giving
+    the moments of their union without the underlying events.
+
+    Args:
+        first (pd.DataFrame): Moments from `computeMoments` or `mergeMoments`.
+        second (pd.DataFrame): Moments from `computeMoments` or `mergeMoments`.
+
+    Returns:
+        pd.DataFrame: Moments of groups in either DataFrame.
+    """
+    if first.empty:
+        return second.copy()
+    if second.empty:
+        return first.copy()
+
+    first, second = first.align(second, join="outer")
+    firstCount = first["count"].fillna(0)
+    secondCount = second["count"].fillna(0)
+    firstMean = first["mean"].fillna(0.0)
+    secondMean = second["mean"].fillna(0.0)
+    count = firstCount + secondCount
+    delta = secondMean - firstMean
+
+    merged = pd.DataFrame(index=first.index)
+    merged["count"] = count.astype(np.int64)
+    merged["sum"] = first["sum"].fillna(0.0) + second["sum"].fillna(0.0)
+    merged["mean"] = merged["sum"] / count
+    merged["m2"] = first["m2"].fillna(0.0) + second["m2"].fillna(0.0) + delta**2 * firstCount * secondCount / count
+    merged["min"] = np.fmin(first["min"], second["min"])
+    merged["max"] = np.fmax(first["max"], second["max"])
+    return merged
+
+
+class PhaseTimeStatisticsStore:
+    """Running phaseTime moments of an encounter, keyed by (abilityID, phase, type, castIndex), along with the fights
+    they include. Fights are only ever added, so refreshing the statistics only reads newly fetched fights, and stores
+    built from disjoint sets of fights with the same configuration can be merged. Since cast indices and phases depend
+    on the phase configuration, a store only holds fights processed with a single configuration."""
+
+    def __init__(self, configuration: str = ""):
+        self.configuration = configuration
+        self.moments = createEmptyMoments()
+        self.fights: Set[Tuple[str, int, int]] = set()
+
+    def add(self, dataFrame: pd.DataFrame, fights: Set[Tuple[str, int, int]] | None = None) -> int:
+        """Adds the events of fights not yet in the store.
+
+        Args:
+            dataFrame (pd.DataFrame): DataFrame returned by `createEncounterDataFrame`, rows of fights already in the
+                store are skipped.
+            fights (Set[Tuple[str, int, int]] | None, optional): (fightCode, fightID, pullID) of every fight the
+                DataFrame was created from, so fights without any events are recorded too. Defaults to the fights in the
+                DataFrame.
+
+        Returns:
+            int: Number of fights added.
+        """
+        if fights is None:
+            fights = set(dataFrame[FIGHT_KEYS].drop_duplicates().itertuples(index=False, name=None))
+        newFights = {(str(code), int(fightID), int(pullID)) for code, fightID, pullID in fights} - self.fights
+        if not newFights:
+            return 0
+
+        if not dataFrame.empty:
+            rowFights = pd.MultiIndex.from_frame(dataFrame[FIGHT_KEYS].astype({"fightCode": str}))
+            dataFrame = dataFrame[rowFights.isin(list(newFights))]
+        self.moments = mergeMoments(self.moments, computeMoments(dataFrame))
+        self.fights |= newFights
+        return len(newFights)
+
+    def merge(self, other: "PhaseTimeStatisticsStore"):
+        """Merges the statistics of another store, for example one built from a different partition of fights.
+
+        Args:
+            other (PhaseTimeStatisticsStore): Store with the same configuration and no fights in common.
+        """
+        if other.configuration != self.configuration:
+            raise ValueError("Cannot merge phase statistics created with different configurations")
+        overlap = self.fights & other.fights
+        if overlap:
+            raise ValueError(f"Cannot merge phase statistics sharing {len(overlap)} fights")
+        self.moments = mergeMoments(self.moments, other.moments)
+        self.fights |= other.fights
+
+    def toDataFrame(self, minCount: int = 0) -> pd.DataFrame:
+        """Gets the statistics in the layout of `aggregatePhaseTimeStatistics`.
+
+        Args:
+            minCount (int, optional): Throw out aggregated statistics where the count is less than this value.
+
+        Returns:
+            pd.DataFrame: `abilityID`, `phase`, `type`, `castIndex`, `count`, `mean`, `std`, `min`, and `max` columns.
+        """
+        moments = self.moments[self.moments["count"] >= minCount].sort_index()
+        count = moments["count"]
+        variance = (moments["m2"].clip(lower=0.0) / (count - 1)).where(count > 1, 0.0)
+        statistics = pd.DataFrame(
+            {
+                "count": count,
+                "mean": moments["mean"],
+                "std": np.sqrt(variance),
+                "min": moments["min"],
+                "max": moments["max"],
+            },
+            index=moments.index,
+        ).reset_index()
+        # Moments are accumulated in float64, statistics have the float32 dtype of phaseTime like aggregated ones
+        statistics = statistics.astype(
+            {
+                "abilityID": np.int32,
+                "phase": np.int32,
+                "castIndex": np.int32,
+                "mean": np.float32,
+                "std": np.float32,
+                "min": np.float32,
+                "max": np.float32,
+            }
+        )
+        statistics["type"] = statistics["type"].astype("category")
+        return statistics
+
+    def save(self, path: Path):
+        moments = self.moments.reset_index()
+        fights = sorted(self.fights)
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            version=np.int64(PHASE_STATISTICS_VERSION),
+            configuration=np.str_(self.configuration),
+            abilityIDs=moments["abilityID"].to_numpy(np.int64),
+            phases=moments["phase"].to_numpy(np.int64),
+            types=moments["type"].to_numpy(np.str_),
+            castIndices=moments["castIndex"].to_numpy(np.int64),
+            counts=moments["count"].to_numpy(np.int64),
+            sums=moments["sum"].to_numpy(np.float64),
+            means=moments["mean"].to_numpy(np.float64),
+            m2s=moments["m2"].to_numpy(np.float64),
+            mins=moments["min"].to_numpy(np.float64),
+            maxs=moments["max"].to_numpy(np.float64),
+            fightCodes=np.array([code for code, _, _ in fights], dtype=np.str_),
+            fightIDs=np.array([fightID for _, fightID, _ in fights], dtype=np.int64),
+            pullIDs=np.array([pullID for _, _, pullID in fights], dtype=np.int64),
+        )
+        writeFileAtomic(path, buffer.getvalue())
+
+    @classmethod
+    def load(cls, path: Path, configuration: str = "") -> "PhaseTimeStatisticsStore":
+        """Loads a saved store, or creates an empty one if the file doesn't exist or was saved with a different
+        version or configuration.
+
+        Args:
+            path (Path): File written by `save`.
+            configuration (str, optional): Configuration from `getStatisticsConfiguration`. Defaults to "".
+
+        Returns:
+            PhaseTimeStatisticsStore: The loaded store.
+        """
+        store = cls(configuration)
+        if not path.exists():
+            return store
+
+        with np.load(path) as arrays:
+            if int(arrays["version"]) != PHASE_STATISTICS_VERSION or str(arrays["configuration"]) != configuration:
+                print(f"Ignoring phase statistics {path} saved with a different version or configuration")
+                return store
+            index = pd.MultiIndex.from_arrays(
+                [arrays["abilityIDs"], arrays["phases"], arrays["types"].astype(object), arrays["castIndices"]],
+                names=STATISTICS_KEYS,
+            )
+            store.moments = pd.DataFrame(
+                {
+                    "count": arrays["counts"],
+                    "sum": arrays["sums"],
+                    "mean": arrays["means"],
+                    "m2": arrays["m2s"],
+                    "min": arrays["mins"],
+                    "max": arrays["maxs"],
+                },
+                index=index,
+            )
+            store.fights = set(
+                zip(arrays["fightCodes"].tolist(), arrays["fightIDs"].tolist(), arrays["pullIDs"].tolist())
+            )
+        return store
+
+
+def getStatisticsConfiguration(
+    dropAbilities: List[int] = [],
+    phaseAbilities: List[PhaseAbilityTransition] = [],
+    ignorePhaseTransitions: bool = False,
+    minPercentage: float = 100.0,
+    eventFilter: EventFilter | None = None,
+) -> str:
+    """Serializes the `createEncounterDataFrame` arguments that change which events a fight contributes and how they
+    are phased. Arguments match `createEncounterDataFrame`.
+
+    Returns:
+        str: Canonical JSON of the arguments.
+    """
+    configuration = {
+        "dropAbilities": sorted(dropAbilities),
+        "phaseAbilities": [asdict(phaseAbility) for phaseAbility in phaseAbilities],
+        "ignorePhaseTransitions": ignorePhaseTransitions,
+        "minPercentage": minPercentage,
+    }
+    # Only filtered configurations include the filter, so stores saved before filters existed stay valid
+    if eventFilter is not None:
+        configuration["eventFilter"] = asdict(eventFilter)
+    return json.dumps(configuration, sort_keys=True)
+
+
+@profiled()
+def updateEncounterStatistics(
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    dungeonEncounterID: int = 0,
+    dropAbilities: List[int] = [],
+    phaseAbilities: List[PhaseAbilityTransition] = [],
+    ignorePhaseTransitions: bool = False,
+    minPercentage: float = 100.0,
+    workers: int = 1,
+    eventFilter: EventFilter | None = None,
+) -> PhaseTimeStatisticsStore:
+    """Adds fights fetched since the last update to the encounter's saved phase statistics in `temp/phaseStatistics`.
+    Only the events files of new fights are read, so refreshing costs time proportional to the new fights. Each
+    configuration of the arguments has its own store. Arguments match `createEncounterDataFrame`.
+
+    Returns:
+        PhaseTimeStatisticsStore: The updated store, use `toDataFrame` to apply a `minCount`.
+    """
+    configuration = getStatisticsConfiguration(
+        dropAbilities, phaseAbilities, ignorePhaseTransitions, minPercentage, eventFilter
+    )
+    configurationHash = hashlib.sha256(configuration.encode()).hexdigest()[:12]
+    statisticsFilePath = getPhaseStatisticsFilePath(
+        zoneID, difficulty, encounterID, configurationHash, dungeonEncounterID
+    )
+    store = PhaseTimeStatisticsStore.load(statisticsFilePath, configuration)
+
+    fights = loadEncounterFights(zoneID, encounterID, difficulty, dungeonEncounterID)
+    eventsFiles = getFightEventsFiles(
+        zoneID,
+        encounterID,
+        difficulty,
+        fights,
+        dungeonEncounterID,
+        phaseAbilities,
+        ignorePhaseTransitions,
+        minPercentage,
+    )
+    eventsFiles = [
+        eventsFile
+        for eventsFile in eventsFiles
+        if (eventsFile.fightCode, eventsFile.fightID, eventsFile.pullID) not in store.fights
+    ]
+    completePaths = set(filterCompleteEventsFiles([eventsFile.path for eventsFile in eventsFiles]))
+    eventsFiles = [eventsFile for eventsFile in eventsFiles if eventsFile.path in completePaths]
+    print(f"Adding {len(eventsFiles)} new fights to {len(store.fights)} fights in the phase statistics")
+    if not eventsFiles:
+        return store
+
+    cache = createEventsCache(zoneID, encounterID, difficulty, dungeonEncounterID)
+    if dropAbilities:
+        eventFilter = (eventFilter or EventFilter()).withDroppedAbilities(dropAbilities)
+    allFightEvents = loadFightEventsFiles(eventsFiles, phaseAbilities, workers, cache, eventFilter)
+    dataFrame = finalizeEncounterDataFrame(allFightEvents)
+    store.add(dataFrame, {(eventsFile.fightCode, eventsFile.fightID, eventsFile.pullID) for eventsFile in eventsFiles})
+    store.save(statisticsFilePath)
+    return store
+
+
+@profiled()
+def aggregateEncounterStatisticsInBatches(
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    dungeonEncounterID: int = 0,
+    dropAbilities: List[int] = [],
+    phaseAbilities: List[PhaseAbilityTransition] = [],
+    ignorePhaseTransitions: bool = False,
+    minPercentage: float = 100.0,
+    minCount: int = 0,
+    confidence: float | None = None,
+    batchFights: int = DEFAULT_BATCH_FIGHTS,
+    workers: int = 1,
+    useCache: bool = True,
+    eventFilter: EventFilter | None = None,
+) -> pd.DataFrame:
+    """Computes the statistics of `aggregatePhaseTimeStatistics` for an encounter without creating its whole
+    DataFrame. Fights are processed in batches of `batchFights`, each batch is reduced to moments per (abilityID,
+    phase, type, castIndex) group and merged into the moments of the previous batches, so memory use is bounded by the
+    largest batch instead of growing with the encounter. The result is identical to `aggregatePhaseTimeStatistics` of
+    the whole DataFrame, with the same rows, values, dtypes, and categories: cast indices never span fights, means
+    come from exact float64 sums, and both accumulate in float64 and round to float32. `runBenchmarks` checks that the
+    two are equal. Other arguments match `createEncounterDataFrame` and `aggregatePhaseTimeStatistics`.
+
+    Args:
+        batchFights (int, optional): Number of fights whose events are in memory at once. Defaults to 50.
+
+    Returns:
+        pd.DataFrame: Statistics in the layout of `aggregatePhaseTimeStatistics`, with `lower` and `upper` columns if
+        `confidence` is specified. Empty if the fights file doesn't exist or if no fights were found.
+    """
+    if batchFights < 1:
+        raise ValueError(f"batchFights must be at least 1, got {batchFights}")
+
+    fights = loadEncounterFights(zoneID, encounterID, difficulty, dungeonEncounterID)
+    eventsFiles = getFightEventsFiles(
+        zoneID,
+        encounterID,
+        difficulty,
+        fights,
+        dungeonEncounterID,
+        phaseAbilities,
+        ignorePhaseTransitions,
+        minPercentage,
+    )
+    completePaths = set(filterCompleteEventsFiles([eventsFile.path for eventsFile in eventsFiles]))
+    eventsFiles = [eventsFile for eventsFile in eventsFiles if eventsFile.path in completePaths]
+    cache = createEventsCache(zoneID, encounterID, difficulty, dungeonEncounterID) if useCache else None
+    if dropAbilities:
+        eventFilter = (eventFilter or EventFilter()).withDroppedAbilities(dropAbilities)
+
+    phaseTriggers = compilePhaseTriggers(phaseAbilities)
+    store = PhaseTimeStatisticsStore()
+    for start in range(0, len(eventsFiles), batchFights):
+        batch = eventsFiles[start : start + batchFights]
+        allFightEvents = loadFightEventsFiles(batch, phaseTriggers, workers, cache, eventFilter)
+        store.moments = mergeMoments(store.moments, computeMoments(finalizeEncounterDataFrame(allFightEvents)))
+        del allFightEvents
+        print(f"Aggregated {start + len(batch)} of {len(eventsFiles)} fights")
+
+    phaseTimeStatistics = store.toDataFrame(minCount)
+    if confidence is not None:
+        phaseTimeStatistics["lower"], phaseTimeStatistics["upper"] = computeConfidenceBounds(
+            phaseTimeStatistics["count"].to_numpy(),
+            phaseTimeStatistics["mean"].to_numpy(),
+            phaseTimeStatistics["std"].to_numpy(),
+            confidence,
+        )
+    return phaseTimeStatistics
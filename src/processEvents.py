@@ -1,17 +1,44 @@
 import json
+import os
 import numpy as np
 import pandas as pd
 from collections import defaultdict
-from dataclasses import dataclass, asdict
-from scipy import stats
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, asdict, field
 from statistics import mean, stdev
-import matplotlib.pyplot as plt
 from pathlib import Path
-from tabulate import tabulate
 from typing import List, Dict, Any, Optional, Tuple
 
+from src.confidenceIntervals import bootstrapConfidenceBounds, computeConfidenceBounds
 from src.enums import DifficultyType
-from src.utility import getEventsFilePath, getEventsFilePathForDungeon, getFightsFilePath, getTempPath
+from src.eventsCache import EventsCache
+from src.eventsDecoder import DecodedEvents, EventFilter, decodeEventsFile
+from src.eventsManifest import filterCompleteEventsFiles
+from src.masterData import getAbilityNames
+from src.phaseReport import (
+    buildPhaseTimeReport,
+    formatAbilityUsage,
+    formatAverageCastTimes,
+    formatDetailedCasts,
+    savePhaseTimeReport,
+)
+from src.phasePlots import getAbilityCastTimesCharts, renderAbilityCastTimes
+from src.profiling import profileStage, profiled
+from src.utility import (
+    getEventsCachePath,
+    getEventsFilePath,
+    getEventsFilePathForDungeon,
+    getEventsPath,
+    getEventsPathForDungeon,
+    getFightsFilePath,
+    getPlotsPath,
+    getTempPath,
+    writeFileAtomic,
+)
+
+# Abilities never analyzed, dropped from every fight
+DROPPED_ABILITY_IDS = [145629]  # AMZ...
 
 
 @dataclass
@@ -22,9 +49,88 @@ class PhaseTransition:
 
 @dataclass
 class PhaseAbilityTransition:
+    """Starts a new phase when an ability event occurs.
+
+    Attributes:
+        abilityID (int): Ability ID of the event.
+        abilityType (str): Event type, e.g. "cast" or "removebuff".
+        castIndex (int): Zero-based occurrence of the event that starts the phase.
+        offset (int): Milliseconds from the event to the start of the phase, may be negative.
+        alternatives (List[Tuple[int, str]]): Other (abilityID, abilityType) pairs counted together with the ability,
+            so the phase starts at the castIndex-th occurrence of any of them.
+    """
+
     abilityID: int
     abilityType: str
     castIndex: int
+    offset: int = 0
+    alternatives: List[Tuple[int, str]] = field(default_factory=list)
+
+
+class PhaseTriggerMatcher:
+    """Phase ability transitions compiled into a lookup by (abilityID, type), so fights are matched in a single pass
+    that only counts events of trigger abilities. The matcher holds no per-fight state and can be reused."""
+
+    def __init__(self, phaseAbilities: List[PhaseAbilityTransition]):
+        self.phaseAbilities = list(phaseAbilities)
+        self.triggersByKey: Dict[Tuple[int, str], List[int]] = defaultdict(list)
+        for triggerIndex, phaseAbility in enumerate(self.phaseAbilities):
+            keys = [(phaseAbility.abilityID, phaseAbility.abilityType)]
+            keys.extend(tuple(key) for key in phaseAbility.alternatives)
+            for key in dict.fromkeys(keys):
+                self.triggersByKey[key].append(triggerIndex)
+        self.abilityIDs = np.array(sorted({abilityID for abilityID, _ in self.triggersByKey}), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.phaseAbilities)
+
+    def match(self, events: List[Dict[str, Any]], firstPhaseID: int) -> List[PhaseTransition]:
+        """Creates a phase transition for each trigger occurrence in a fight's events.
+
+        Args:
+            events (List[Dict[str, Any]]): Events from an events file, in file order.
+            firstPhaseID (int): ID of the first created phase, following IDs are consecutive.
+
+        Returns:
+            List[PhaseTransition]: Phase transitions in the order their events occurred, transitions from the same
+            event in the order of the phase abilities.
+        """
+        return self.matchColumns(
+            np.array([event.get("abilityGameID", -1) for event in events], dtype=np.int64),
+            np.array([event.get("type", "") for event in events], dtype=np.str_),
+            np.array([event.get("timestamp", 0) for event in events], dtype=np.int64),
+            firstPhaseID,
+        )
+
+    def matchColumns(
+        self, abilityIDs: np.ndarray, types: np.ndarray, timestamps: np.ndarray, firstPhaseID: int
+    ) -> List[PhaseTransition]:
+        """Same as `match` for decoded event columns. Only events of trigger abilities are visited."""
+        candidates = np.flatnonzero(np.isin(abilityIDs, self.abilityIDs))
+        counts = [-1] * len(self.phaseAbilities)
+        phaseTransitions: List[PhaseTransition] = []
+        for abilityID, eventType, timestamp in zip(
+            abilityIDs[candidates].tolist(), types[candidates].tolist(), timestamps[candidates].tolist()
+        ):
+            triggerIndices = self.triggersByKey.get((abilityID, eventType))
+            if triggerIndices is None:
+                continue
+            for triggerIndex in triggerIndices:
+                counts[triggerIndex] += 1
+                phaseAbility = self.phaseAbilities[triggerIndex]
+                if counts[triggerIndex] == phaseAbility.castIndex:
+                    id = firstPhaseID + len(phaseTransitions)
+                    phaseTransitions.append(PhaseTransition(id=id, startTime=timestamp + phaseAbility.offset))
+        return phaseTransitions
+
+
+def compilePhaseTriggers(
+    phaseAbilities: List[PhaseAbilityTransition] | PhaseTriggerMatcher,
+) -> PhaseTriggerMatcher:
+    """Compiles phase ability transitions, passing through ones that are already compiled."""
+    if isinstance(phaseAbilities, PhaseTriggerMatcher):
+        return phaseAbilities
+    return PhaseTriggerMatcher(phaseAbilities)
 
 
 @dataclass
@@ -36,163 +142,256 @@ class Fight:
     phaseTransitions: List[PhaseTransition] | None
 
 
-@dataclass
-class Event:
-    abilityID: int
-    type: str
-    fightCode: str
-    fightID: int
-    pullID: int
-    timestamp: int
-    sourceID: int
-    targetID: int
-    phase: int = 0
-    phaseTime: float = 0.0
-    totalTime: float = 0.0
+# Column order and dtypes of encounter DataFrames, `type` and `fightCode` are categorical
+EVENT_COLUMN_DTYPES: Dict[str, Any] = {
+    "abilityID": np.int32,
+    "type": "category",
+    "fightCode": "category",
+    "fightID": np.int32,
+    "pullID": np.int32,
+    "timestamp": np.int64,
+    "sourceID": np.int32,
+    "targetID": np.int32,
+    "phase": np.int32,
+    "phaseTime": np.float32,
+    "totalTime": np.float32,
+}
+
+
+class EventColumns:
+    """Typed column buffers for the events of an encounter. Each fight appends one array per column, and the
+    categorical columns are stored as codes into lists of categories, so no Python object is kept per event."""
+
+    def __init__(self):
+        self.chunks: Dict[str, List[np.ndarray]] = {column: [] for column in EVENT_COLUMN_DTYPES}
+        self.categories: Dict[str, Dict[str, int]] = {"type": {}, "fightCode": {}}
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks["timestamp"])
+
+    def encode(self, column: str, values: List[str] | np.ndarray) -> np.ndarray:
+        uniqueValues, inverse = np.unique(np.asarray(values, dtype=np.str_), return_inverse=True)
+        return self.encodeCodes(column, inverse.reshape(-1), uniqueValues)
+
+    def encodeCodes(self, column: str, codes: np.ndarray, categories: np.ndarray) -> np.ndarray:
+        """Maps codes into another list of categories to this column's codes, visiting each category once."""
+        columnCategories = self.categories[column]
+        mapping = np.array(
+            [columnCategories.setdefault(value, len(columnCategories)) for value in categories.tolist()], np.int32
+        )
+        return mapping[codes] if len(codes) else np.empty(0, dtype=np.int32)
+
+    def appendFight(
+        self,
+        events: DecodedEvents,
+        fightCode: str,
+        fightID: int,
+        pullID: int,
+        phaseIDs: np.ndarray,
+        phaseTimes: np.ndarray,
+        totalTimes: np.ndarray,
+    ):
+        count = len(events)
+        columns = self.chunks
+        columns["abilityID"].append(events.abilityIDs.astype(np.int32))
+        columns["type"].append(self.encodeCodes("type", events.typeCodes, events.typeCategories))
+        columns["fightCode"].append(np.full(count, self.encode("fightCode", [fightCode])[0], dtype=np.int32))
+        columns["fightID"].append(np.full(count, fightID, dtype=np.int32))
+        columns["pullID"].append(np.full(count, pullID, dtype=np.int32))
+        columns["timestamp"].append(events.timestamps.astype(np.int64))
+        columns["sourceID"].append(events.sourceIDs.astype(np.int32))
+        columns["targetID"].append(events.targetIDs.astype(np.int32))
+        columns["phase"].append(phaseIDs.astype(np.int32))
+        columns["phaseTime"].append(phaseTimes.astype(np.float32))
+        columns["totalTime"].append(totalTimes.astype(np.float32))
+
+    def toDataFrame(self) -> pd.DataFrame:
+        """Builds a DataFrame from the buffers. Categories are sorted so that sorting by a categorical column matches
+        sorting its strings.
+
+        Returns:
+            pd.DataFrame: DataFrame with `EVENT_COLUMN_DTYPES` columns, or an empty DataFrame if there are no events.
+        """
+        if len(self) == 0:
+            return pd.DataFrame()
+
+        data: Dict[str, Any] = {}
+        for column, dtype in EVENT_COLUMN_DTYPES.items():
+            values = np.concatenate(self.chunks[column])
+            if column in self.categories:
+                categories = list(self.categories[column])
+                data[column] = pd.Categorical.from_codes(values, categories).reorder_categories(sorted(categories))
+            else:
+                data[column] = values.astype(dtype, copy=False)
+        return pd.DataFrame(data)
+
+
+def assignPhases(
+    timestamps: np.ndarray,
+    fightStartTime: int,
+    phaseTransitions: List[PhaseTransition],
+    abilityPhaseTransitions: List[PhaseTransition] = [],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Assigns a phase to each event of a fight at once.
+
+    An event is in the last of the leading phase transitions that started at or before it, or in phase 1 starting at
+    the fight start if there is none. Ability phase transitions are then applied in order, each one only if it started
+    after the current phase start and at or before the event.
+
+    Args:
+        timestamps (np.ndarray): Event timestamps.
+        fightStartTime (int): Start time of the fight or dungeon pull.
+        phaseTransitions (List[PhaseTransition]): Phase transitions from the fights file.
+        abilityPhaseTransitions (List[PhaseTransition], optional): Phase transitions created from ability events.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Phase ID and phase start time of each event.
+    """
+    phaseIDs = np.ones(len(timestamps), dtype=np.int64)
+    phaseStartTimes = np.full(len(timestamps), fightStartTime)
+
+    if phaseTransitions:
+        # Transitions are only considered until the first one after the event. The running maximum of the start times
+        # is sorted, and the number of leading transitions at or before each event is its insertion point.
+        transitionIDs = np.array([phaseTransition.id for phaseTransition in phaseTransitions], dtype=np.int64)
+        transitionStartTimes = np.array([phaseTransition.startTime for phaseTransition in phaseTransitions])
+        boundaries = np.maximum.accumulate(transitionStartTimes)
+        counts = np.searchsorted(boundaries, timestamps, side="right")
+        inPhase = counts > 0
+        phaseIDs[inPhase] = transitionIDs[counts[inPhase] - 1]
+        phaseStartTimes[inPhase] = transitionStartTimes[counts[inPhase] - 1]
+
+    if abilityPhaseTransitions:
+        abilityIDs = np.array([phaseTransition.id for phaseTransition in abilityPhaseTransitions], dtype=np.int64)
+        abilityStartTimes = np.array([phaseTransition.startTime for phaseTransition in abilityPhaseTransitions])
+        if np.all(abilityStartTimes[1:] >= abilityStartTimes[:-1]):
+            # In start time order, the latest transition at or before an event wins unless it doesn't start after the
+            # current phase start. Of transitions starting at the same time, only the first applies.
+            counts = np.searchsorted(abilityStartTimes, timestamps, side="right")
+            latest = abilityStartTimes[np.maximum(counts, 1) - 1]
+            first = np.searchsorted(abilityStartTimes, latest, side="left")
+            inAbilityPhase = (counts > 0) & (latest > phaseStartTimes)
+            phaseIDs[inAbilityPhase] = abilityIDs[first[inAbilityPhase]]
+            phaseStartTimes[inAbilityPhase] = latest[inAbilityPhase]
+        else:
+            for abilityID, abilityStartTime in zip(abilityIDs, abilityStartTimes):
+                inAbilityPhase = (abilityStartTime > phaseStartTimes) & (timestamps >= abilityStartTime)
+                phaseIDs[inAbilityPhase] = abilityID
+                phaseStartTimes[inAbilityPhase] = abilityStartTime
+
+    return phaseIDs, phaseStartTimes
 
 
 def appendFightEvent(
     eventsFilePath: Path,
-    allFightEvents: List[Event],
+    allFightEvents: EventColumns,
     phaseTransitions: List[PhaseTransition],
     fightCode: str,
     fightID: int,
     pullID: int = -1,
-    phaseAbilities: List[PhaseAbilityTransition] = [],
+    phaseAbilities: List[PhaseAbilityTransition] | PhaseTriggerMatcher = [],
+    eventFilter: EventFilter | None = None,
 ):
     if eventsFilePath.exists():
-        with open(eventsFilePath) as eventsFile:
-            eventData = json.load(eventsFile)
-            fightStartTime = eventData["startTime"]
-
-            abilityPhaseTransitions: List[PhaseTransition] = []
-            if len(phaseAbilities) > 0:
-                abilityCounts = {}
-                for event in eventData["events"]:
-                    abilityID = event.get("abilityGameID")
-                    eventType = event.get("type")
-                    if abilityID not in abilityCounts:
-                        abilityCounts[abilityID] = {}
-                    if eventType not in abilityCounts[abilityID]:
-                        abilityCounts[abilityID][eventType] = -1
-                    abilityCounts[abilityID][eventType] += 1
-                    for phaseAbility in phaseAbilities:
-                        if (
-                            abilityID == phaseAbility.abilityID
-                            and eventType == phaseAbility.abilityType
-                            and abilityCounts[abilityID][eventType] == phaseAbility.castIndex
-                        ):
-                            id = len(phaseTransitions) + len(abilityPhaseTransitions) + 1
-                            startTime = event["timestamp"]
-                            abilityPhaseTransitions.append(PhaseTransition(id=id, startTime=startTime))
-
-            for event in eventData["events"]:
-                if event.get("melee"):
-                    continue
-
-                phaseID = 1
-                phaseStartTime = fightStartTime
-
-                timestamp = event["timestamp"]
-                for phaseTransition in phaseTransitions:
-                    if timestamp >= phaseTransition.startTime:
-                        phaseID = phaseTransition.id
-                        phaseStartTime = phaseTransition.startTime
-                    else:
-                        break
-                for abilityPhaseTransition in abilityPhaseTransitions:
-                    if abilityPhaseTransition.startTime > phaseStartTime:
-                        if timestamp >= abilityPhaseTransition.startTime:
-                            phaseID = abilityPhaseTransition.id
-                            phaseStartTime = abilityPhaseTransition.startTime
-
-                allFightEvents.append(
-                    Event(
-                        timestamp=timestamp,
-                        type=event["type"],
-                        sourceID=event["sourceID"],
-                        targetID=event["targetID"],
-                        abilityID=event["abilityGameID"],
-                        fightCode=fightCode,
-                        fightID=fightID,
-                        pullID=pullID,
-                        totalTime=(timestamp - fightStartTime) / 1000.0,
-                        phaseTime=(timestamp - phaseStartTime) / 1000.0,
-                        phase=phaseID,
-                    )
-                )
+        appendDecodedFightEvents(
+            decodeEventsFile(eventsFilePath),
+            allFightEvents,
+            phaseTransitions,
+            fightCode,
+            fightID,
+            pullID,
+            phaseAbilities,
+            eventFilter,
+        )
+
+
+def appendDecodedFightEvents(
+    decodedEvents: DecodedEvents,
+    allFightEvents: EventColumns,
+    phaseTransitions: List[PhaseTransition],
+    fightCode: str,
+    fightID: int,
+    pullID: int = -1,
+    phaseAbilities: List[PhaseAbilityTransition] | PhaseTriggerMatcher = [],
+    eventFilter: EventFilter | None = None,
+):
+    fightStartTime = decodedEvents.startTime
+
+    # Melee events still count towards phase ability occurrences
+    abilityPhaseTransitions: List[PhaseTransition] = []
+    if len(phaseAbilities) > 0:
+        phaseTriggers = compilePhaseTriggers(phaseAbilities)
+        triggerEvents = decodedEvents.select(np.isin(decodedEvents.abilityIDs, phaseTriggers.abilityIDs))
+        abilityPhaseTransitions = phaseTriggers.matchColumns(
+            triggerEvents.abilityIDs, triggerEvents.types, triggerEvents.timestamps, len(phaseTransitions) + 1
+        )
+
+    # Filter the decoded columns before phases are assigned, so dropped events never become rows
+    keep = ~decodedEvents.melee & ~np.isin(decodedEvents.abilityIDs, DROPPED_ABILITY_IDS)
+    if eventFilter is not None:
+        keep &= eventFilter.mask(decodedEvents)
+    events = decodedEvents if keep.all() else decodedEvents.select(keep)
+    phaseIDs, phaseStartTimes = assignPhases(
+        events.timestamps, fightStartTime, phaseTransitions, abilityPhaseTransitions
+    )
+    totalTimes = (events.timestamps - fightStartTime) / 1000.0
+    phaseTimes = (events.timestamps - phaseStartTimes) / 1000.0
+    allFightEvents.appendFight(events, fightCode, fightID, pullID, phaseIDs, phaseTimes, totalTimes)
 
 
 def computeConfidenceInterval(data: pd.Series, confidence: float = 0.95) -> Tuple[float, float]:
-    n = len(data)
-    mean = np.mean(data)
-    standardDeviation = np.std(data, ddof=1)  # sample std dev
-    stderr = standardDeviation / np.sqrt(n)
-
-    if n < 30:
-        # Use t-distribution for small sample sizes
-        tScore = stats.t.ppf((1.0 + confidence) / 2.0, df=n - 1)
-        margin = tScore * stderr
-    else:
-        # Use z-distribution
-        zScore = stats.norm.ppf((1.0 + confidence) / 2.0)
-        margin = zScore * stderr
+    """Computes the confidence interval of the mean of one sample, see `computeConfidenceBounds` for many samples."""
+    lower, upper = computeConfidenceBounds(
+        np.array([len(data)]), np.array([np.mean(data)]), np.array([np.std(data, ddof=1)]), confidence
+    )
+    return lower[0], upper[0]
 
-    return mean - margin, mean + margin
 
+def plotAbilityCastTimes(
+    phaseTimeStatistics: pd.DataFrame, abilityID: int, phase: int, type: str, chartFilePath: Path | None = None
+) -> Path:
+    """Renders the cast times chart of one ability, phase, and type, see `plotPhaseTimeStatistics` to render all of
+    them in parallel.
+
+    Args:
+        phaseTimeStatistics (pd.DataFrame): DataFrame returned by `aggregatePhaseTimeStatistics`.
+        abilityID (int): Ability ID.
+        phase (int): Phase.
+        type (str): Event type.
+        chartFilePath (Path | None, optional): Image path, the format is given by the extension. Defaults to
+        `temp/plots/{abilityID}_{phase}_{type}.png`.
 
-def plotAbilityCastTimes(phaseTimeStatistics: pd.DataFrame, abilityID: int, phase: int, type: str):
+    Returns:
+        Path: Path of the chart.
+    """
     subset = phaseTimeStatistics[
         (phaseTimeStatistics["phase"] == phase)
         & (phaseTimeStatistics["abilityID"] == abilityID)
         & (phaseTimeStatistics["type"] == type)
     ]
+    charts = getAbilityCastTimesCharts(subset)
+    if not charts:
+        raise LookupError(f"No statistics for ability {abilityID} in phase {phase} with type {type}")
 
-    plt.errorbar(
-        subset["mean"],
-        subset["castIndex"],
-        xerr=subset["std"],
-        fmt="o",  # circle marker
-        ecolor="gray",  # error bar color
-        elinewidth=2,
-        capsize=4,  # little bar on end of error line
-        label="Avg ± Std Dev",
-    )
+    chartFilePath = chartFilePath or getPlotsPath() / charts[0].getFileName()
+    chartFilePath.parent.mkdir(parents=True, exist_ok=True)
+    renderAbilityCastTimes(charts[0], chartFilePath)
+    return chartFilePath
 
-    plt.title(f"Ability: {abilityID} Phase: {phase} Type: {type}")
-    plt.xlabel("Avg Cast Time (s)")
-    plt.ylabel("Cast Index")
-    plt.grid(True)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("buh.png")
 
+@dataclass
+class FightEventsFile:
+    path: Path
+    fightCode: str
+    fightID: int
+    pullID: int
+    phaseTransitions: List[PhaseTransition]
 
-def createEncounterDataFrame(
-    zoneID: int,
-    encounterID: int,
-    difficulty: DifficultyType,
-    dungeonEncounterID: int = 0,
-    dropAbilities: List[int] = [],
-    phaseAbilities: List[PhaseAbilityTransition] = [],
-    ignorePhaseTransitions: bool = False,
-    minPercentage: float = 100.0,
-) -> pd.DataFrame:
-    """Creates a Pandas DataFrame for the given encounter using all events matching the specified criteria.
-
-    Args:
-        zoneID (int): ZoneID used when fetching data.
-        encounterID (int): Encounter ID of the boss encounter.
-        difficulty (DifficultyType): Difficulty used when fetching data.
-        dungeonEncounterID (int, optional): Encounter ID of the dungeon, if querying a dungeon boss.
-        dropAbilities (List[int], optional): Ability IDs to drop from the data frame.
-        phaseAbilities (List[PhaseAbilityTransition], optional): Replace phase transitions with transitions created at
-        each ability entry.
-        ignorePhaseTransitions (bool, optional): Whether to ignore phase transitions from WarcraftLogs API fights.
-    Returns:
-        pd.DataFrame: Empty if the fights file doesn't exist or if no fights were found.
-    """
 
+@profiled()
+def loadEncounterFights(
+    zoneID: int, encounterID: int, difficulty: DifficultyType, dungeonEncounterID: int = 0
+) -> List[Dict[str, Any]]:
     if difficulty == DifficultyType.Dungeon:
         fightsFilePath = getFightsFilePath(zoneID, difficulty, dungeonEncounterID)
     else:
@@ -207,8 +406,26 @@ def createEncounterDataFrame(
     if not fights:
         raise LookupError(f"The fights file {zoneID}_{encounterID}_{difficulty}.json has not fights")
 
-    allFightEvents: List[Event] = []
+    return fights
+
+
+def getFightEventsFiles(
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    fights: List[Dict[str, Any]],
+    dungeonEncounterID: int = 0,
+    phaseAbilities: List[PhaseAbilityTransition] = [],
+    ignorePhaseTransitions: bool = False,
+    minPercentage: float = 100.0,
+) -> List[FightEventsFile]:
+    """Finds the events files and initial phase transitions for each fight, or each matching dungeon pull, in a
+    fights file. Arguments match `createEncounterDataFrame`.
 
+    Returns:
+        List[FightEventsFile]: Events files in fights file order.
+    """
+    eventsFiles: List[FightEventsFile] = []
     for fightData in fights:
         startTime = fightData.get("startTime")
         if startTime == None:
@@ -224,7 +441,6 @@ def createEncounterDataFrame(
 
         phaseTransitions: List[PhaseTransition] = []
         if difficulty == DifficultyType.Dungeon:
-            filePaths = []
             dungeonPulls = fightData["dungeonPulls"]
             for pullID, pull in enumerate(dungeonPulls, start=1):
                 if pull.get("encounterID") == encounterID:
@@ -232,9 +448,7 @@ def createEncounterDataFrame(
                         zoneID, dungeonEncounterID, encounterID, fightCode, fightID, pullID
                     )
                     phaseTransitions: List[PhaseTransition] = [PhaseTransition(id=1, startTime=pull["startTime"])]
-                    appendFightEvent(
-                        eventsFilePath, allFightEvents, phaseTransitions, fightCode, fightID, pullID, phaseAbilities
-                    )
+                    eventsFiles.append(FightEventsFile(eventsFilePath, fightCode, fightID, pullID, phaseTransitions))
         else:
             if len(phaseAbilities) == 0 and ignorePhaseTransitions == False:
                 rawPhaseTransitions = fightData.get("phaseTransitions")
@@ -248,117 +462,314 @@ def createEncounterDataFrame(
             else:
                 phaseTransitions: List[PhaseTransition] = [PhaseTransition(id=1, startTime=fightData["startTime"])]
             eventsFilePath = getEventsFilePath(zoneID, difficulty, encounterID, fightCode, fightID)
-            appendFightEvent(eventsFilePath, allFightEvents, phaseTransitions, fightCode, fightID, -1, phaseAbilities)
+            eventsFiles.append(FightEventsFile(eventsFilePath, fightCode, fightID, -1, phaseTransitions))
+    return eventsFiles
+
+
+def decodeEventsFiles(eventsFilePaths: List[Path]) -> List[DecodedEvents]:
+    """Decodes events files in order. Runs in worker processes when decoding in parallel."""
+    return [decodeEventsFile(eventsFilePath) for eventsFilePath in eventsFilePaths]
 
-    df = pd.DataFrame(allFightEvents)
+
+@profiled()
+def decodeEventsFilesInParallel(eventsFilePaths: List[Path], workers: int = 1) -> List[DecodedEvents]:
+    """Decodes events files across a process pool. The files are split into contiguous chunks and the decoded events
+    are returned in file order, so the result does not depend on the number of workers.
+
+    Args:
+        eventsFilePaths (List[Path]): Events file paths.
+        workers (int, optional): Number of worker processes, 0 for one per CPU, 1 to decode in this process. Defaults
+            to 1.
+
+    Returns:
+        List[DecodedEvents]: Decoded events of each file.
+    """
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(eventsFilePaths) < 2:
+        return decodeEventsFiles(eventsFilePaths)
+
+    # Several chunks per worker keep workers busy when fights differ in size
+    chunkCount = min(len(eventsFilePaths), workers * 4)
+    chunks = [
+        eventsFilePaths[
+            chunkIndex * len(eventsFilePaths) // chunkCount : (chunkIndex + 1) * len(eventsFilePaths) // chunkCount
+        ]
+        for chunkIndex in range(chunkCount)
+    ]
+    decodedEvents: List[DecodedEvents] = []
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, chunkCount)) as executor:
+            for chunkEvents in executor.map(decodeEventsFiles, chunks):
+                decodedEvents.extend(chunkEvents)
+    except (OSError, BrokenProcessPool) as e:
+        print(f"Parallel decoding failed, decoding serially: {e}")
+        return decodeEventsFiles(eventsFilePaths)
+    return decodedEvents
+
+
+def loadFightEventsFiles(
+    eventsFiles: List[FightEventsFile],
+    phaseAbilities: List[PhaseAbilityTransition] | PhaseTriggerMatcher = [],
+    workers: int = 1,
+    cache: EventsCache | None = None,
+    eventFilter: EventFilter | None = None,
+) -> EventColumns:
+    """Decodes events files, reusing cached decoded events of unchanged files, and assigns phases to their events.
+    Only files missing from the cache are read, across a process pool when there are several workers.
+
+    Args:
+        eventsFiles (List[FightEventsFile]): Events files from `getFightEventsFiles`.
+        phaseAbilities (List[PhaseAbilityTransition] | PhaseTriggerMatcher, optional): See `createEncounterDataFrame`.
+        workers (int, optional): Number of worker processes, 0 for one per CPU, 1 to decode in this process. Defaults to
+            1.
+        cache (EventsCache | None, optional): Cache of decoded events, newly decoded files are added to it and saved.
+            Defaults to None.
+        eventFilter (EventFilter | None, optional): Events to keep, applied to each fight's decoded events before its
+            rows are created. The cache always holds all events. Defaults to None.
+
+    Returns:
+        EventColumns: Events of all files.
+    """
+    decodedEvents: List[DecodedEvents | None] = [None] * len(eventsFiles)
+    stats: Dict[int, os.stat_result] = {}
+    if cache is not None:
+        with profileStage("readEventsCache"):
+            for index, eventsFile in enumerate(eventsFiles):
+                stats[index] = eventsFile.path.stat()
+                decodedEvents[index] = cache.get(eventsFile.path, stats[index])
+
+    missing = [index for index, decoded in enumerate(decodedEvents) if decoded is None]
+    if cache is not None and eventsFiles:
+        print(f"{len(eventsFiles) - len(missing)} of {len(eventsFiles)} events files cached, decoding {len(missing)}")
+    for index, decoded in zip(
+        missing, decodeEventsFilesInParallel([eventsFiles[index].path for index in missing], workers)
+    ):
+        decodedEvents[index] = decoded
+        if cache is not None:
+            cache.put(eventsFiles[index].path, decoded, stats[index])
+    if cache is not None:
+        with profileStage("saveEventsCache"):
+            cache.save()
+
+    phaseTriggers = compilePhaseTriggers(phaseAbilities)
+    allFightEvents = EventColumns()
+    with profileStage("assignPhases"):
+        for eventsFile, decoded in zip(eventsFiles, decodedEvents):
+            appendDecodedFightEvents(
+                decoded,
+                allFightEvents,
+                eventsFile.phaseTransitions,
+                eventsFile.fightCode,
+                eventsFile.fightID,
+                eventsFile.pullID,
+                phaseTriggers,
+                eventFilter,
+            )
+    return allFightEvents
+
+
+def finalizeEncounterDataFrame(allFightEvents: EventColumns) -> pd.DataFrame:
+    """Creates a DataFrame from fight events, numbering each ability's casts within its fight and phase. Since cast
+    indices never span fights, DataFrames finalized from disjoint sets of fights can be concatenated.
+
+    Args:
+        allFightEvents (EventColumns): Events from `appendFightEvent`.
+
+    Returns:
+        pd.DataFrame: Sorted DataFrame with a `castIndex` column, or an empty DataFrame if there are no events.
+    """
+    with profileStage("createDataFrame"):
+        df = allFightEvents.toDataFrame()
 
     if df.empty:
-        print("Empty dataframe")
         return df
 
-    df.drop(df[df["abilityID"] == 145629].index, inplace=True)  # AMZ...
+    with profileStage("sortEvents"):
+        cleaned = df.sort_values(["fightCode", "fightID", "pullID", "abilityID", "phase", "type", "phaseTime"])
+    with profileStage("numberCasts"):
+        cleaned["castIndex"] = (
+            cleaned.groupby(["fightCode", "fightID", "pullID", "abilityID", "phase", "type"], observed=True).cumcount()
+            + 1
+        ).astype(np.int32)
 
-    cleaned = df.sort_values(["fightCode", "fightID", "pullID", "abilityID", "phase", "type", "phaseTime"])
-    cleaned["castIndex"] = (
-        cleaned.groupby(["fightCode", "fightID", "pullID", "abilityID", "phase", "type"]).cumcount() + 1
+    return cleaned
+
+
+def createEventsCache(
+    zoneID: int, encounterID: int, difficulty: DifficultyType, dungeonEncounterID: int = 0
+) -> EventsCache:
+    if difficulty == DifficultyType.Dungeon:
+        eventsPath = getEventsPathForDungeon(zoneID, dungeonEncounterID, encounterID)
+    else:
+        eventsPath = getEventsPath(zoneID, difficulty, encounterID)
+    return EventsCache(eventsPath, getEventsCachePath(zoneID, difficulty, encounterID, dungeonEncounterID))
+
+
+@profiled()
+def createEncounterDataFrame(
+    zoneID: int,
+    encounterID: int,
+    difficulty: DifficultyType,
+    dungeonEncounterID: int = 0,
+    dropAbilities: List[int] = [],
+    phaseAbilities: List[PhaseAbilityTransition] = [],
+    ignorePhaseTransitions: bool = False,
+    minPercentage: float = 100.0,
+    workers: int = 1,
+    useCache: bool = True,
+    eventFilter: EventFilter | None = None,
+) -> pd.DataFrame:
+    """Creates a Pandas DataFrame for the given encounter using all events matching the specified criteria.
+
+    Args:
+        zoneID (int): ZoneID used when fetching data.
+        encounterID (int): Encounter ID of the boss encounter.
+        difficulty (DifficultyType): Difficulty used when fetching data.
+        dungeonEncounterID (int, optional): Encounter ID of the dungeon, if querying a dungeon boss.
+        dropAbilities (List[int], optional): Ability IDs to drop from the data frame, added to the filter's dropped
+        abilities.
+        phaseAbilities (List[PhaseAbilityTransition], optional): Replace phase transitions with transitions created at
+        each ability entry. Compiled once into a `PhaseTriggerMatcher` shared by all fights.
+        ignorePhaseTransitions (bool, optional): Whether to ignore phase transitions from WarcraftLogs API fights.
+        minPercentage (float, optional): Skip fights where the boss had more health remaining than this percentage.
+        workers (int, optional): Number of processes to parse events files with, 0 for one per CPU. Defaults to 1.
+        useCache (bool, optional): Whether to read events from the encounter's memory-mapped columnar store of
+        decoded events in `temp/eventsCache`, so only new or changed events files are parsed and added to it. Defaults
+        to True.
+        eventFilter (EventFilter | None, optional): Events to keep, e.g. only some abilities, actors, or a time window
+        of each fight. Applied to decoded events before any row is created, phase abilities still see every event.
+        Cast indices count only the kept events. Defaults to None.
+    Returns:
+        pd.DataFrame: Empty if the fights file doesn't exist or if no fights were found.
+    """
+
+    fights = loadEncounterFights(zoneID, encounterID, difficulty, dungeonEncounterID)
+    eventsFiles = getFightEventsFiles(
+        zoneID,
+        encounterID,
+        difficulty,
+        fights,
+        dungeonEncounterID,
+        phaseAbilities,
+        ignorePhaseTransitions,
+        minPercentage,
     )
 
-    return cleaned
+    completePaths = set(filterCompleteEventsFiles([eventsFile.path for eventsFile in eventsFiles]))
+    eventsFiles = [eventsFile for eventsFile in eventsFiles if eventsFile.path in completePaths]
+    cache = createEventsCache(zoneID, encounterID, difficulty, dungeonEncounterID) if useCache else None
+    if dropAbilities:
+        eventFilter = (eventFilter or EventFilter()).withDroppedAbilities(dropAbilities)
+    allFightEvents = loadFightEventsFiles(eventsFiles, phaseAbilities, workers, cache, eventFilter)
+
+    df = finalizeEncounterDataFrame(allFightEvents)
+    if df.empty:
+        print("Empty dataframe")
+    return df
 
 
-def aggregatePhaseTimeStatistics(dataFrame: pd.DataFrame, minCount: int = 0) -> pd.DataFrame:
+@profiled()
+def aggregatePhaseTimeStatistics(
+    dataFrame: pd.DataFrame,
+    minCount: int = 0,
+    confidence: float | None = None,
+    bootstrapResamples: int = 0,
+    workers: int = 1,
+) -> pd.DataFrame:
     """Computes the count, mean, standard deviation, minimum, and maximum phaseTime values for a DataFrame describing
     an encounter.
 
     Args:
         dataFrame (pd.DataFrame): DataFrame returned by `createEncounterDataFrame`.
         minCount (int, optional): Throw out aggregated statistics where the count is less than this value.
+        confidence (float | None, optional): If specified, adds `lower` and `upper` columns with confidence intervals
+        of the mean at this level, NaN for groups with a single cast. Defaults to None.
+        bootstrapResamples (int, optional): Compute the confidence intervals with this many bootstrap resamples of
+        each group instead of the t-distribution, for skewed timings. Defaults to 0.
+        workers (int, optional): Number of processes to bootstrap with, 0 for one per CPU. Defaults to 1.
 
     Returns:
         pd.DataFrame: A new DataFrame grouped by `abilityID`, `phase`, `type`, `castIndex`, aggregated across
-        `phaseTime`.
+        `phaseTime`. `PhaseTimeStatisticsStore.toDataFrame` returns the same layout from saved running statistics, and
+        `aggregateEncounterStatisticsInBatches` the same statistics without creating the whole DataFrame.
     """
-    grouped = dataFrame.groupby(["abilityID", "phase", "type", "castIndex"])
-    filtered = grouped.filter(lambda g: len(g) >= minCount)
-
-    phaseTimeStatistics = (
-        filtered.groupby(["abilityID", "phase", "type", "castIndex"])["phaseTime"]
-        .agg(count="count", mean="mean", std="std", min="min", max="max")
-        .fillna(0)
-        .reset_index()
-    )
+    # Accumulate in float64 and round to the float32 dtype of phaseTime, like statistics merged from batches of fights
+    with profileStage("groupPhaseTimes"):
+        keys = [dataFrame[key] for key in ["abilityID", "phase", "type", "castIndex"]]
+        grouped = dataFrame["phaseTime"].astype(np.float64).groupby(keys, observed=True)
+        phaseTimeStatistics = grouped.agg(count="count", mean="mean", std="std", min="min", max="max").fillna(0)
+        phaseTimeStatistics = phaseTimeStatistics.astype(
+            {"mean": np.float32, "std": np.float32, "min": np.float32, "max": np.float32}
+        )
+
+    if confidence is not None:
+        if bootstrapResamples > 0:
+            lower, upper = bootstrapConfidenceBounds(
+                dataFrame["phaseTime"].to_numpy(),
+                grouped.ngroup().to_numpy(),
+                len(phaseTimeStatistics),
+                confidence,
+                bootstrapResamples,
+                workers,
+            )
+        else:
+            lower, upper = computeConfidenceBounds(
+                phaseTimeStatistics["count"].to_numpy(),
+                phaseTimeStatistics["mean"].to_numpy(),
+                phaseTimeStatistics["std"].to_numpy(),
+                confidence,
+            )
+        phaseTimeStatistics["lower"] = lower
+        phaseTimeStatistics["upper"] = upper
+
+    # phaseTime is never missing, so the count equals the group size
+    phaseTimeStatistics = phaseTimeStatistics[phaseTimeStatistics["count"] >= minCount].reset_index()
     return phaseTimeStatistics
 
 
+@profiled()
 def printPhaseTimeStatistics(
     dataFrame: pd.DataFrame,
     printAbilityUsage: bool = True,
     printDetailedCasts: bool = True,
     printAverageCastTimes: bool = True,
-) -> None:
-    """Prints various statistics using the passed DataFrame.
+    reportFilePath: Path | None = None,
+    confidence: float | None = None,
+) -> pd.DataFrame:
+    """Prints various statistics using the passed DataFrame. Abilities are labeled with their names when the master
+    data of the fights' reports has been fetched.
 
     Args:
         dataFrame (pd.DataFrame): DataFrame returned by `createEncounterDataFrame`.
         printAbilityUsage (bool, optional): Prints the total cast count of all abilities across all observed
         encounters. Defaults to True.
         printDetailedCasts (bool, optional): Prints aggregated phase time statistics. Defaults to True.
-        printAverageCastTimes (bool, optional): Prints average cast times for abilities. Defaults to True.
+        printAverageCastTimes (bool, optional): Writes average cast times for abilities to
+        `temp/AverageCastTimes.txt`. Defaults to True.
+        reportFilePath (Path | None, optional): Also saves the statistics with a row per cast as .json, .csv, or
+        .parquet, see `savePhaseTimeReport`. Defaults to None.
+        confidence (float | None, optional): If specified, the report includes confidence intervals of each cast's
+        mean, see `aggregatePhaseTimeStatistics`. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The report from `buildPhaseTimeReport`.
     """
 
-    phaseTimeStatistics = aggregatePhaseTimeStatistics(dataFrame)
+    abilityNames = getAbilityNames(dataFrame["fightCode"].unique()) if "fightCode" in dataFrame else {}
+    report = buildPhaseTimeReport(aggregatePhaseTimeStatistics(dataFrame, confidence=confidence), abilityNames)
 
     if printAbilityUsage:
         print("\n=== Ability Usage Across All Phases ===")
-        for (abilityID, type), group in phaseTimeStatistics.groupby(["abilityID", "type"]):
-            print(f"Ability {abilityID} {type}: used {group["castIndex"].nunique()} times")
+        print(formatAbilityUsage(report))
 
     if printDetailedCasts:
         print("\n=== Detailed Cast Stats ===")
-        for abilityID, abilityGroup in phaseTimeStatistics.groupby("abilityID"):
-            print(f"\nAbility {abilityID}:")
-            for phase, phaseGroup in abilityGroup.groupby("phase"):
-                print(f"  Phase {phase}:")
-                for type, typeGroup in phaseGroup.groupby("type"):
-                    print(f"    Type {type}:")
-                    if printDetailedCasts:
-                        for _, row in typeGroup.iterrows():
-                            print(
-                                f"      Cast #{int(row['castIndex'])}: "
-                                f"count={int(row['count'])}, "
-                                f"avg={row['mean']:.1f}, "
-                                f"std_dev={row['std']:.1f}, "
-                                f"cv={row['std']/row['mean']:.1f}, "
-                                f"min={row['min']:.1f}, "
-                                f"max={row['max']:.1f}, "
-                                f"max={row['max']:.1f}"
-                            )
+        print(formatDetailedCasts(report))
 
     if printAverageCastTimes:
-        with open(getTempPath() / "AverageCastTimes.txt", "w") as averageCastTimesFile:
-            for abilityID, abilityGroup in phaseTimeStatistics.groupby("abilityID"):
-                for phase, phaseGroup in abilityGroup.groupby("phase"):
-                    for cast_type, typeGroup in phaseGroup.groupby("type"):
-                        typeGroupSorted = typeGroup.sort_values("castIndex")
-                        df = pd.DataFrame(
-                            {
-                                "Count": typeGroupSorted["count"].astype(int).values,
-                                "Mean": typeGroupSorted["mean"].values,
-                                "Std Dev": typeGroupSorted["std"].values,
-                            }
-                        )
-                        df["Avg Cast Time"] = df["Mean"].diff().fillna(df["Mean"])
-                        df.drop(columns="Mean", inplace=True)
-                        df.reset_index(drop=True, inplace=True)
-                        averageCastTimesFile.write(f"\n| Ability {abilityID} - Phase {phase} - Type {cast_type} |\n")
-                        data = [[row_name] + list(row) for row_name, row in df.T.iterrows()]
-                        table_str = tabulate(data, tablefmt="github", showindex=False, floatfmt=".1f")
-                        lines = table_str.splitlines()
-
-                        # Replace Average Cast Time '|' with ","
-                        averageCastTimeIndex = 3
-                        lines[averageCastTimeIndex] = lines[averageCastTimeIndex].replace("|", ",")
-                        lines[averageCastTimeIndex] = "|" + lines[averageCastTimeIndex].removeprefix(",")
-                        lines[averageCastTimeIndex] = lines[averageCastTimeIndex].removesuffix(",") + "|"
-
-                        averageCastTimesFile.write("\n".join(lines) + "\n")
+        writeFileAtomic(getTempPath() / "AverageCastTimes.txt", formatAverageCastTimes(report).encode())
+
+    if reportFilePath is not None:
+        savePhaseTimeReport(report, reportFilePath)
+    return report
@@ -0,0 +1,382 @@
+import contextlib
+import cProfile
+import functools
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Tuple, TypeVar
+
+from tabulate import tabulate
+
+from src.utility import getProfilesPath, writeJsonAtomic
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MEMORY_MODES = ["rss", "tracemalloc", "none"]
+DEFAULT_SAMPLE_INTERVAL = 0.01
+SUMMARY_FILE_NAME = "summary.json"
+TRACE_FILE_NAME = "trace.json"
+# Returned for every stage while profiling is disabled, entering and exiting it does nothing
+DISABLED_STAGE = contextlib.nullcontext()
+
+FunctionType = TypeVar("FunctionType", bound=Callable[..., Any])
+
+
+def getResidentBytes() -> int:
+    """Gets the resident set size of this process. Without /proc, only the peak resident set size is available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        if resource is None:
+            return 0
+        maxResident = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in kilobytes elsewhere
+        return maxResident if sys.platform == "darwin" else maxResident * 1024
+
+
+@dataclass
+class StageRecord:
+    """One run of a stage.
+
+    Attributes:
+        name (str): Name of the stage.
+        threadID (int): Thread the stage ran in.
+        depth (int): Number of enclosing stages in the same thread.
+        startSeconds (float): Start time since profiling started.
+        wallSeconds (float): Elapsed time.
+        cpuSeconds (float): CPU time of the process, including other threads.
+        childSeconds (float): Elapsed time of the stages directly nested in this one.
+        startBytes (int): Memory in use when the stage started, resident or traced depending on the memory mode.
+        peakBytes (int): Peak memory in use during the stage.
+        profileFile (str): Name of the cProfile stats file of the stage, empty if it wasn't captured.
+    """
+
+    name: str
+    threadID: int
+    depth: int
+    startSeconds: float
+    wallSeconds: float = 0.0
+    cpuSeconds: float = 0.0
+    childSeconds: float = 0.0
+    startBytes: int = 0
+    peakBytes: int = 0
+    profileFile: str = ""
+
+
+class StageProfiler:
+    """Records wall time, CPU time, and peak memory of every stage entered while it is active, and optionally a
+    cProfile capture of each outermost stage. Memory is either the resident set size, sampled by a background thread
+    and at every stage boundary, or the peak of Python allocations traced by `tracemalloc`, which is exact but slows
+    allocation heavy stages down considerably.
+
+    Only stages in the process that started profiling are recorded, stages run in worker processes are not."""
+
+    def __init__(
+        self,
+        outputPath: Path,
+        memory: str = "rss",
+        captureProfiles: bool = False,
+        sampleInterval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        if memory not in MEMORY_MODES:
+            raise ValueError(f"Unknown memory mode {memory}, use one of {', '.join(MEMORY_MODES)}")
+        self.outputPath = outputPath
+        self.memory = memory
+        self.captureProfiles = captureProfiles
+        self.sampleInterval = sampleInterval
+        self.processID = os.getpid()
+        self.records: List[StageRecord] = []
+        self.openRecords: List[StageRecord] = []
+        self.memorySamples: List[Tuple[float, int]] = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # cProfile can only profile one stage of the process at a time
+        self.profileActive = False
+        self.profileFiles = 0
+        self.stopSampling = threading.Event()
+        self.sampler: threading.Thread | None = None
+        self.startedTracing = False
+        self.startTime = 0.0
+        self.startCpuTime = 0.0
+
+    def start(self):
+        self.outputPath.mkdir(parents=True, exist_ok=True)
+        if self.memory == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.startedTracing = True
+        self.startTime = time.perf_counter()
+        self.startCpuTime = time.process_time()
+        if self.memory == "rss":
+            self.sampler = threading.Thread(target=self.sampleMemory, name="StageProfilerSampler", daemon=True)
+            self.sampler.start()
+
+    def stop(self) -> Tuple[float, float]:
+        """Stops sampling and tracing memory.
+
+        Returns:
+            Tuple[float, float]: Wall and CPU time since profiling started.
+        """
+        wallSeconds = time.perf_counter() - self.startTime
+        cpuSeconds = time.process_time() - self.startCpuTime
+        self.stopSampling.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        if self.startedTracing:
+            tracemalloc.stop()
+        return wallSeconds, cpuSeconds
+
+    def sampleMemory(self):
+        while not self.stopSampling.wait(self.sampleInterval):
+            with self.lock:
+                self.memorySamples.append((time.perf_counter() - self.startTime, self.updatePeaks()))
+
+    def updatePeaks(self) -> int:
+        """Raises the peak of every open stage to the memory in use, or to the traced peak since the last update.
+        Called with the lock held.
+
+        Returns:
+            int: Memory in use.
+        """
+        if self.memory == "rss":
+            current = peak = getResidentBytes()
+        elif self.memory == "tracemalloc":
+            current, peak = tracemalloc.get_traced_memory()
+            # Enclosing stages took the peak so far, so nested stages only see their own
+            tracemalloc.reset_peak()
+        else:
+            return 0
+        for record in self.openRecords:
+            record.peakBytes = max(record.peakBytes, peak)
+        return current
+
+    def stage(self, name: str) -> ContextManager:
+        if os.getpid() != self.processID:
+            # Forked worker processes inherit the profiler, but nothing would save their records
+            return DISABLED_STAGE
+        return self.recordStage(name)
+
+    @contextlib.contextmanager
+    def recordStage(self, name: str) -> Iterator[StageRecord]:
+        stack: List[StageRecord] = self.local.__dict__.setdefault("stack", [])
+        record = StageRecord(name, threading.get_ident(), len(stack), time.perf_counter() - self.startTime)
+        with self.lock:
+            record.startBytes = record.peakBytes = self.updatePeaks()
+            self.openRecords.append(record)
+            profile = None
+            if self.captureProfiles and not self.profileActive:
+                self.profileActive = True
+                profile = cProfile.Profile()
+        stack.append(record)
+
+        if profile is not None:
+            profile.enable()
+        startCpuTime = time.process_time()
+        startTime = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.wallSeconds = time.perf_counter() - startTime
+            record.cpuSeconds = time.process_time() - startCpuTime
+            if profile is not None:
+                profile.disable()
+            stack.pop()
+            if stack:
+                stack[-1].childSeconds += record.wallSeconds
+            with self.lock:
+                self.updatePeaks()
+                self.openRecords.remove(record)
+                self.records.append(record)
+                if profile is not None:
+                    self.profileFiles += 1
+                    record.profileFile = f"{self.profileFiles:03d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.prof"
+                    self.profileActive = False
+            if profile is not None:
+                profile.dump_stats(self.outputPath / record.profileFile)
+
+    def summarize(self) -> List[Dict[str, Any]]:
+        """Totals the records of each stage name.
+
+        Returns:
+            List[Dict[str, Any]]: Totals by stage, in order of their first run.
+        """
+        stages: Dict[str, Dict[str, Any]] = {}
+        for record in sorted(self.records, key=lambda record: record.startSeconds):
+            stage = stages.setdefault(
+                record.name,
+                {
+                    "stage": record.name,
+                    "calls": 0,
+                    "wallSeconds": 0.0,
+                    "selfSeconds": 0.0,
+                    "cpuSeconds": 0.0,
+                    "peakIncreaseBytes": 0,
+                },
+            )
+            stage["calls"] += 1
+            stage["wallSeconds"] += record.wallSeconds
+            stage["selfSeconds"] += record.wallSeconds - record.childSeconds
+            stage["cpuSeconds"] += record.cpuSeconds
+            stage["peakIncreaseBytes"] = max(stage["peakIncreaseBytes"], record.peakBytes - record.startBytes)
+        return list(stages.values())
+
+    def formatTrace(self) -> Dict[str, Any]:
+        """Formats the records in the Trace Event Format, which Perfetto, chrome://tracing, and speedscope open as a
+        timeline and flame graph of the stages of each thread, along with the sampled resident set size."""
+        events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": self.processID, "args": {"name": "src.main"}}
+        ]
+        for record in sorted(self.records, key=lambda record: (record.startSeconds, record.depth)):
+            events.append(
+                {
+                    "name": record.name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": record.startSeconds * 1e6,
+                    "dur": record.wallSeconds * 1e6,
+                    "pid": self.processID,
+                    "tid": record.threadID,
+                    "args": {
+                        "cpuSeconds": record.cpuSeconds,
+                        "startBytes": record.startBytes,
+                        "peakBytes": record.peakBytes,
+                        "profileFile": record.profileFile,
+                    },
+                }
+            )
+        for sampleSeconds, residentBytes in self.memorySamples:
+            events.append(
+                {
+                    "name": "memory",
+                    "ph": "C",
+                    "ts": sampleSeconds * 1e6,
+                    "pid": self.processID,
+                    "args": {"residentMegabytes": residentBytes / 2**20},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, wallSeconds: float, cpuSeconds: float) -> Path:
+        """Writes the summary and the trace, and prints the summary.
+
+        Returns:
+            Path: Path of the trace file.
+        """
+        stages = self.summarize()
+        writeJsonAtomic(
+            self.outputPath / SUMMARY_FILE_NAME,
+            {
+                "wallSeconds": wallSeconds,
+                "cpuSeconds": cpuSeconds,
+                "memory": self.memory,
+                "peakBytes": max([record.peakBytes for record in self.records], default=0),
+                "stages": stages,
+                "records": [asdict(record) for record in self.records],
+            },
+        )
+        traceFilePath = self.outputPath / TRACE_FILE_NAME
+        writeJsonAtomic(traceFilePath, self.formatTrace(), indent=None)
+
+        print(
+            tabulate(
+                [
+                    [
+                        stage["stage"],
+                        stage["calls"],
+                        stage["wallSeconds"],
+                        stage["selfSeconds"],
+                        stage["cpuSeconds"],
+                        stage["peakIncreaseBytes"] / 2**20,
+                    ]
+                    for stage in stages
+                ],
+                headers=["Stage", "Calls", "Wall (s)", "Self (s)", "CPU (s)", "Peak +MB"],
+                floatfmt=".3f",
+            )
+        )
+        print(f"Profiled {len(self.records)} stages in {wallSeconds:.1f} seconds, trace in {traceFilePath}")
+        return traceFilePath
+
+
+# The active profiler, None while profiling is disabled
+PROFILER: StageProfiler | None = None
+
+
+def profileStage(name: str) -> ContextManager:
+    """Records the enclosed block as a stage while profiling is enabled, e.g. `with profileStage("sortEvents"):`.
+    Stages can be nested. While profiling is disabled this returns a shared context manager that does nothing."""
+    if PROFILER is None:
+        return DISABLED_STAGE
+    return PROFILER.stage(name)
+
+
+def profiled(name: str | None = None) -> Callable[[FunctionType], FunctionType]:
+    """Decorates a function to record each call as a stage while profiling is enabled, named after the function unless
+    a name is given. While profiling is disabled the function is called directly."""
+
+    def decorator(function: FunctionType) -> FunctionType:
+        stageName = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if PROFILER is None:
+                return function(*args, **kwargs)
+            with PROFILER.stage(stageName):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def profiling(
+    enabled: bool = True,
+    outputPath: Path | None = None,
+    memory: str = "rss",
+    captureProfiles: bool = False,
+    sampleInterval: float = DEFAULT_SAMPLE_INTERVAL,
+) -> Iterator[StageProfiler | None]:
+    """Profiles every stage run in the enclosed block, then prints a summary per stage and writes `summary.json` and a
+    `trace.json` in the Trace Event Format, which Perfetto (https://ui.perfetto.dev), chrome://tracing, and speedscope
+    open as a timeline and flame graph.
+
+    Args:
+        enabled (bool, optional): Whether to profile, otherwise the block runs as if it weren't wrapped. Defaults to
+            True.
+        outputPath (Path | None, optional): Directory to write the results to. Defaults to a directory named after the
+            start time in `temp/profiles`.
+        memory (str, optional): "rss" to sample the resident set size, "tracemalloc" to trace the peak of Python
+            allocations exactly at the cost of slower stages, or "none". Defaults to "rss".
+        captureProfiles (bool, optional): Whether to also capture each outermost stage with cProfile into a `.prof`
+            file, e.g. for `python -m pstats` or snakeviz. Defaults to False.
+        sampleInterval (float, optional): Seconds between resident set size samples. Defaults to 0.01.
+
+    Returns:
+        Iterator[StageProfiler | None]: The profiler, or None if profiling is disabled.
+    """
+    global PROFILER
+    if not enabled:
+        yield None
+        return
+    if PROFILER is not None:
+        raise ValueError("Profiling is already enabled")
+
+    outputPath = outputPath or getProfilesPath() / datetime.now().strftime("%Y%m%d-%H%M%S")
+    profiler = StageProfiler(outputPath, memory, captureProfiles, sampleInterval)
+    profiler.start()
+    PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        PROFILER = None
+        profiler.save(*profiler.stop())
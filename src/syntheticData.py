@@ -0,0 +1,204 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.enums import DifficultyType
+from src.eventsManifest import getEventsManifest
+from src.utility import (
+    createDirectoriesIfNecessary,
+    getEventsFilePath,
+    getFightsFilePath,
+    getProjectRoot,
+    writeJsonAtomic,
+)
+
+BOSS_ID = 1
+FIRST_PLAYER_ID = 2
+FIRST_BOSS_ABILITY_ID = 1200000
+FIRST_FILLER_ABILITY_ID = 400000
+MELEE_ABILITY_ID = 1
+# Share of filler events of each type, most events of real fights are damage and healing
+FILLER_TYPES = ["damage", "heal", "cast", "applybuff", "removebuff"]
+FILLER_TYPE_WEIGHTS = [0.62, 0.26, 0.06, 0.03, 0.03]
+
+
+@dataclass
+class SyntheticEncounter:
+    """Shape of a generated encounter, written in the layout of fetched fights and events files. The same attributes
+    always generate the same files.
+
+    Attributes:
+        zoneID (int): Zone ID of the generated files.
+        encounterID (int): Encounter ID of the generated files.
+        difficulty (DifficultyType): Difficulty of the generated files, dungeons are not supported.
+        fights (int): Number of fights.
+        eventsPerFight (int): Number of events of a full length fight, wipes have proportionally fewer.
+        phases (int): Number of phases, 1 for fights without phase transitions.
+        bossAbilities (int): Number of boss abilities, each cast on a timer in one phase.
+        fillerAbilities (int): Number of player abilities of the damage, heal, and buff events filling the fights.
+        players (int): Number of players.
+        durationSeconds (float): Length of a kill.
+        wipeFraction (float): Share of fights that are wipes, which end early.
+        meleeFraction (float): Share of filler events that are boss melee swings.
+        fightsPerReport (int): Number of fights in each report.
+        seed (int): Seed of the random generator.
+    """
+
+    zoneID: int = 9999
+    encounterID: int = 1
+    difficulty: DifficultyType = DifficultyType.Mythic
+    fights: int = 20
+    eventsPerFight: int = 5000
+    phases: int = 3
+    bossAbilities: int = 12
+    fillerAbilities: int = 200
+    players: int = 20
+    durationSeconds: float = 360.0
+    wipeFraction: float = 0.3
+    meleeFraction: float = 0.05
+    fightsPerReport: int = 8
+    seed: int = 0
+
+
+def getBossAbilityEvents(
+    encounter: SyntheticEncounter, random: np.random.Generator, phaseStartTimes: List[int], endTime: int
+) -> List[Dict[str, Any]]:
+    """Casts every boss ability on its timer within its phase, skipping phases the fight didn't reach. Each cast has
+    a begincast and a cast event, and every third ability also debuffs a few players."""
+    events: List[Dict[str, Any]] = []
+    phaseEndTimes = phaseStartTimes[1:] + [endTime]
+    for abilityIndex in range(encounter.bossAbilities):
+        abilityID = FIRST_BOSS_ABILITY_ID + abilityIndex
+        phase = abilityIndex % encounter.phases
+        if phase >= len(phaseStartTimes):
+            continue
+        # Abilities have a fixed timer per encounter, so only the jitter of each cast depends on the fight
+        timer = np.random.default_rng((encounter.seed, abilityIndex))
+        periodTime = int(timer.integers(20000, 60000))
+        castTime = int(timer.integers(0, 3000))
+        time = phaseStartTimes[phase] + int(timer.integers(5000, 15000))
+        while time < phaseEndTimes[phase]:
+            time += int(random.integers(-1500, 1500))
+            events.append(createEvent(time, "begincast", BOSS_ID, -1, abilityID))
+            events.append(createEvent(time + castTime, "cast", BOSS_ID, -1, abilityID))
+            if abilityIndex % 3 == 0:
+                targets = random.choice(encounter.players, size=min(3, encounter.players), replace=False)
+                for target in targets.tolist():
+                    targetID = FIRST_PLAYER_ID + target
+                    events.append(createEvent(time + castTime + 100, "applydebuff", BOSS_ID, targetID, abilityID))
+                    events.append(createEvent(time + castTime + 6100, "removedebuff", BOSS_ID, targetID, abilityID))
+            time += periodTime
+    return events
+
+
+def createEvent(timestamp: int, type: str, sourceID: int, targetID: int, abilityID: int) -> Dict[str, Any]:
+    # Fields are in the order the API returns them, which the fast path of `decodeEventsFile` relies on
+    return {
+        "timestamp": timestamp,
+        "type": type,
+        "sourceID": sourceID,
+        "targetID": targetID,
+        "abilityGameID": abilityID,
+        "fight": 1,
+    }
+
+
+def getFillerEvents(
+    encounter: SyntheticEncounter, random: np.random.Generator, startTime: int, endTime: int, count: int
+) -> List[Dict[str, Any]]:
+    """Spreads damage, heal, buff, and melee events uniformly over a fight."""
+    timestamps = random.integers(startTime, endTime, size=count)
+    types = random.choice(len(FILLER_TYPES), size=count, p=FILLER_TYPE_WEIGHTS)
+    sourceIDs = FIRST_PLAYER_ID + random.integers(0, encounter.players, size=count)
+    abilityIDs = FIRST_FILLER_ABILITY_ID + random.integers(0, encounter.fillerAbilities, size=count)
+    amounts = random.integers(1000, 500000, size=count)
+    melee = random.random(size=count) < encounter.meleeFraction
+
+    events = []
+    for timestamp, typeIndex, sourceID, abilityID, amount, isMelee in zip(
+        timestamps.tolist(), types.tolist(), sourceIDs.tolist(), abilityIDs.tolist(), amounts.tolist(), melee.tolist()
+    ):
+        if isMelee:
+            event = createEvent(timestamp, "damage", BOSS_ID, sourceID, MELEE_ABILITY_ID)
+            event.update({"hitType": 1, "amount": amount, "melee": True})
+        else:
+            type = FILLER_TYPES[typeIndex]
+            targetID = BOSS_ID if type == "damage" else sourceID
+            event = createEvent(timestamp, type, sourceID, targetID, abilityID)
+            if type in ["damage", "heal"]:
+                event.update({"hitType": 1, "amount": amount})
+        events.append(event)
+    return events
+
+
+def generateSyntheticEncounter(encounter: SyntheticEncounter) -> List[Path]:
+    """Writes a fights file and an events file per fight for a generated encounter, at the paths of
+    `getFightsFilePath` and `getEventsFilePath` below the project root, and records the events files in their
+    manifest. Use `setProjectRoot` to generate them outside the fetched data.
+
+    Args:
+        encounter (SyntheticEncounter): Shape of the encounter.
+
+    Returns:
+        List[Path]: Paths of the events files in fights file order.
+    """
+    if encounter.difficulty == DifficultyType.Dungeon:
+        raise ValueError("Synthetic dungeon encounters are not supported")
+    getProjectRoot().mkdir(parents=True, exist_ok=True)
+    createDirectoriesIfNecessary()
+
+    random = np.random.default_rng(encounter.seed)
+    fights: List[Dict[str, Any]] = []
+    eventsFilePaths: List[Path] = []
+    manifest = None
+    for fightIndex in range(encounter.fights):
+        code = f"Synthetic{encounter.seed:04d}R{fightIndex // encounter.fightsPerReport:04d}"
+        fightID = fightIndex % encounter.fightsPerReport + 1
+        reportStartTime = 1750000000000 + fightIndex // encounter.fightsPerReport * 86400000
+        startTime = (fightID - 1) * 900000 + int(random.integers(60000, 120000))
+
+        kill = random.random() >= encounter.wipeFraction
+        progress = 1.0 if kill else float(random.uniform(0.15, 0.95))
+        duration = int(encounter.durationSeconds * 1000 * progress * random.uniform(0.95, 1.05))
+        endTime = startTime + duration
+        phaseStartTimes = [
+            startTime + int(encounter.durationSeconds * 1000 * phase / encounter.phases + random.integers(-5000, 5000))
+            for phase in range(encounter.phases)
+        ]
+        phaseStartTimes[0] = startTime
+        phaseStartTimes = [phaseStartTime for phaseStartTime in phaseStartTimes if phaseStartTime < endTime]
+        phaseTransitions = [
+            {"id": phase + 1, "startTime": phaseStartTime} for phase, phaseStartTime in enumerate(phaseStartTimes)
+        ]
+
+        events = getBossAbilityEvents(encounter, random, phaseStartTimes, endTime)
+        fillerCount = max(0, int(encounter.eventsPerFight * progress) - len(events))
+        events.extend(getFillerEvents(encounter, random, startTime, endTime, fillerCount))
+        events.sort(key=lambda event: event["timestamp"])
+
+        fights.append(
+            {
+                "code": code,
+                "id": fightID,
+                "startTime": startTime,
+                "reportStartTime": reportStartTime,
+                "kill": kill,
+                "fightPercentage": 0.0 if kill else round(100.0 * (1.0 - progress), 2),
+                "phaseTransitions": phaseTransitions if encounter.phases > 1 else None,
+            }
+        )
+
+        eventsFilePath = getEventsFilePath(encounter.zoneID, encounter.difficulty, encounter.encounterID, code, fightID)
+        eventData = {"startTime": startTime, "events": events}
+        contents = writeJsonAtomic(eventsFilePath, eventData)
+        manifest = manifest or getEventsManifest(eventsFilePath.parent)
+        manifest.record(eventsFilePath, eventData, contents)
+        eventsFilePaths.append(eventsFilePath)
+
+    if manifest is not None:
+        manifest.save()
+    writeJsonAtomic(getFightsFilePath(encounter.zoneID, encounter.difficulty, encounter.encounterID), fights)
+    print(f"Generated {encounter.fights} fights of encounter {encounter.encounterID} below {getProjectRoot()}")
+    return eventsFilePaths
@@ -2,15 +2,21 @@ from dotenv import load_dotenv
 import json
 import os
 import requests
+import tempfile
 import time
 from pathlib import Path
+from typing import Any
 
 from src.enums import DifficultyType
 
 load_dotenv()
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# The PROJECT_ROOT environment variable moves every data directory, e.g. to generate synthetic data for benchmarks
+PROJECT_ROOT = Path(os.getenv("PROJECT_ROOT") or Path(__file__).resolve().parent.parent)
+# The umask can only be read by setting it, which affects every thread, so it is read once at import
+UMASK = os.umask(0)
+os.umask(UMASK)
 
 
 def createDirectoriesIfNecessary():
@@ -20,6 +26,8 @@ def createDirectoriesIfNecessary():
         os.mkdir(getFightsPath())
     if not os.path.isdir(getTempPath()):
         os.mkdir(getTempPath())
+    if not os.path.isdir(getMasterDataPath()):
+        os.mkdir(getMasterDataPath())
     if not os.path.isdir(PROJECT_ROOT / "events"):
         os.mkdir(PROJECT_ROOT / "events")
 
@@ -28,6 +36,22 @@ def getProjectRoot() -> Path:
     return PROJECT_ROOT
 
 
+def setProjectRoot(projectRoot: Path) -> Path:
+    """Moves every data directory below another root, including in worker processes started afterwards.
+
+    Args:
+        projectRoot (Path): New root directory.
+
+    Returns:
+        Path: The previous root, to restore it with.
+    """
+    global PROJECT_ROOT
+    previousRoot = PROJECT_ROOT
+    PROJECT_ROOT = projectRoot.resolve()
+    os.environ["PROJECT_ROOT"] = str(PROJECT_ROOT)
+    return previousRoot
+
+
 def getEventsPath(zoneID: int, difficulty: DifficultyType, encounterID: int) -> Path:
     return PROJECT_ROOT / "events" / str(zoneID) / str(difficulty) / str(encounterID)
 
@@ -45,12 +69,15 @@ def getEventsFilePath(zoneID: int, difficulty: DifficultyType, encounterID: int,
     return getEventsPath(zoneID, difficulty, encounterID) / f"{zoneID}_{encounterID}_{difficulty}_{code}_{fightID}.json"
 
 
+def getEventsPathForDungeon(zoneID: int, dungeonEncounterID: int, encounterID: int) -> Path:
+    return getEventsPath(zoneID, DifficultyType.Dungeon, dungeonEncounterID) / str(encounterID)
+
+
 def getEventsFilePathForDungeon(
     zoneID: int, dungeonEncounterID: int, encounterID: int, code: str, fightID: int, pullID: int
 ) -> Path:
     return (
-        getEventsPath(zoneID, DifficultyType.Dungeon, dungeonEncounterID)
-        / str(encounterID)
+        getEventsPathForDungeon(zoneID, dungeonEncounterID, encounterID)
         / f"{zoneID}_{encounterID}_{DifficultyType.Dungeon}_{code}_{fightID}_{pullID}.json"
     )
 
@@ -71,10 +98,98 @@ def getFightsFilePath(zoneID: int, difficulty: DifficultyType, encounterID: int)
     return getFightsPath() / f"{zoneID}_{encounterID}_{difficulty}.json"
 
 
+def getFightsCheckedFilePath(zoneID: int, difficulty: DifficultyType, encounterID: int) -> Path:
+    return getFightsPath() / f"{zoneID}_{encounterID}_{difficulty}.checked.json"
+
+
+def getMasterDataPath() -> Path:
+    return PROJECT_ROOT / "masterData"
+
+
+def getMasterDataFilePath(code: str) -> Path:
+    return getMasterDataPath() / f"{code}.json"
+
+
 def getTempPath() -> Path:
     return PROJECT_ROOT / "temp"
 
 
+def getQueryComplexityFilePath() -> Path:
+    return getTempPath() / "queryComplexity.json"
+
+
+def getEventsCachePath(zoneID: int, difficulty: DifficultyType, encounterID: int, dungeonEncounterID: int = 0) -> Path:
+    if difficulty == DifficultyType.Dungeon:
+        return getTempPath() / "eventsCache" / f"{zoneID}_{dungeonEncounterID}_{encounterID}_{difficulty}"
+    return getTempPath() / "eventsCache" / f"{zoneID}_{encounterID}_{difficulty}"
+
+
+def getAnalysisPath() -> Path:
+    return getTempPath() / "analysis"
+
+
+def getPlotsPath() -> Path:
+    return getTempPath() / "plots"
+
+
+def getBenchmarksPath() -> Path:
+    return getTempPath() / "benchmarks"
+
+
+def getProfilesPath() -> Path:
+    return getTempPath() / "profiles"
+
+
+def getPhaseStatisticsFilePath(
+    zoneID: int, difficulty: DifficultyType, encounterID: int, configurationHash: str, dungeonEncounterID: int = 0
+) -> Path:
+    if difficulty == DifficultyType.Dungeon:
+        name = f"{zoneID}_{dungeonEncounterID}_{encounterID}_{difficulty}_{configurationHash}.npz"
+    else:
+        name = f"{zoneID}_{encounterID}_{difficulty}_{configurationHash}.npz"
+    return getTempPath() / "phaseStatistics" / name
+
+
+def writeFileAtomic(path: Path, contents: bytes):
+    """Writes to a temporary file in the destination directory and renames it over the destination, so a process
+    killed mid-write never leaves a truncated file behind.
+
+    Args:
+        path (Path): Destination file path.
+        contents (bytes): File contents.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tempPath = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tempFile:
+            tempFile.write(contents)
+            tempFile.flush()
+            os.fsync(tempFile.fileno())
+        # mkstemp creates files readable only by the owner, use the permissions a regular open would
+        os.chmod(tempPath, 0o666 & ~UMASK)
+        os.replace(tempPath, path)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+
+def writeJsonAtomic(path: Path, data: Any, indent: int | None = 2) -> bytes:
+    """Writes JSON atomically with `writeFileAtomic`.
+
+    Args:
+        path (Path): Destination file path.
+        data (Any): JSON serializable data.
+        indent (int | None, optional): Indent passed to `json.dumps`. Defaults to 2.
+
+    Returns:
+        bytes: The written file contents.
+    """
+    contents = json.dumps(data, indent=indent).encode()
+    writeFileAtomic(path, contents)
+    return contents
+
+
 def getAccessToken() -> str:
     tokenPath = getProjectRoot() / "token.json"
     token = None
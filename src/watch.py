@@ -0,0 +1,92 @@
+import time
+from typing import List, Set
+
+from src.enums import DifficultyType, KillType
+from src.fetchQueue import EncounterTarget, FetchPriority, FetchQueue
+from src.fetchReports import (
+    fetchAndSaveFights,
+    fetchAndSaveFightsForDungeon,
+    fetchAndSaveReports,
+    fetchRateLimitData,
+)
+from src.utility import getAccessToken
+
+
+def getPointsRemaining(accessToken: str) -> float:
+    rateLimitData = fetchRateLimitData(accessToken)
+    return rateLimitData["limitPerHour"] - rateLimitData["pointsSpentThisHour"]
+
+
+def watchReports(
+    zoneID: int,
+    targets: List[EncounterTarget],
+    killType: KillType = KillType.Kills,
+    pollInterval: float = 600.0,
+    reportLimit: int = 100,
+    maxPages: int = 5,
+    pointsReserve: float = 500.0,
+    maxFightsPerPoll: int = 50,
+    priority: FetchPriority = FetchPriority(),
+    maxPolls: int = 0,
+):
+    """Continuously fetches new reports for a zone and pushes only newly seen report codes, and reports that were still
+    being logged, through fight discovery and event fetching for the targets. Reports are fetched from the start time
+    saved in the reports file, so each poll only pages through recently uploaded reports. Fights that could not be
+    fetched within a poll's points budget are carried over to the next poll.
+
+    Args:
+        zoneID (int): WarcraftLogs API zone ID for the raid or dungeon.
+        targets (List[EncounterTarget]): Encounters in the zone to keep up to date.
+        killType (KillType, optional): Kill type to filter raid fights by. Defaults to KillType.Kills.
+        pollInterval (float, optional): Seconds between polls. Defaults to 600.0.
+        reportLimit (int, optional): Upper limit on the number of reports per page. Defaults to 100.
+        maxPages (int, optional): Upper limit on the number of report pages per poll. Defaults to 5.
+        pointsReserve (float, optional): Event fetching stops for the poll when fewer points than this remain this
+            hour, leaving points for discovery and other work. Checked every 10 fights. Defaults to 500.0.
+        maxFightsPerPoll (int, optional): Upper limit on the number of fights to fetch events for per poll, 0 for no
+            limit. Defaults to 50.
+        priority (FetchPriority, optional): Order to fetch fights in. Defaults to FetchPriority().
+        maxPolls (int, optional): Number of polls before returning, 0 to poll until interrupted. Defaults to 0.
+    """
+    pendingCodes: Set[str] = set()
+    polls = 0
+
+    while True:
+        polls += 1
+        print(f"Polling reports for zoneID: {zoneID}...")
+        newCodes = fetchAndSaveReports(zoneID, reportLimit, maxPages)
+        print(f"Found {len(newCodes)} new reports")
+
+        # Fight discovery only queries new reports and reports whose end time advanced since their fights were found
+        dungeonEncounterIDs = set()
+        for target in targets:
+            if target.difficulty == DifficultyType.Dungeon:
+                if target.dungeonEncounterID not in dungeonEncounterIDs:
+                    dungeonEncounterIDs.add(target.dungeonEncounterID)
+                    pendingCodes.update(fetchAndSaveFightsForDungeon(zoneID, target.dungeonEncounterID))
+            else:
+                pendingCodes.update(fetchAndSaveFights(zoneID, target.encounterID, target.difficulty, killType))
+
+        if pendingCodes:
+            token = getAccessToken()
+            queue = FetchQueue(targets, priority, codes=pendingCodes)
+            print(f"Queued {len(queue)} fights from {len(pendingCodes)} new or updated reports")
+            fetched = 0
+            attempted = 0
+            while len(queue) > 0:
+                if 0 < maxFightsPerPoll <= fetched:
+                    break
+                if attempted % 10 == 0 and getPointsRemaining(token) < pointsReserve:
+                    print(f"Fewer than {pointsReserve} points remaining, continuing next poll")
+                    break
+                task = queue.pop()
+                attempted += 1
+                if task is not None and task.fetch(token):
+                    fetched += 1
+            if len(queue) == 0:
+                pendingCodes.clear()
+
+        if 0 < maxPolls <= polls:
+            return
+        print(f"Sleeping for {pollInterval:.0f} seconds...")
+        time.sleep(pollInterval)